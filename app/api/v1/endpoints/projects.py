@@ -1,21 +1,23 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query
 from fastapi.responses import FileResponse
 from typing import List, Optional
 import uuid
 import json
+import time
 from pathlib import Path
 import pandas as pd
 
 from app.models.schemas import (
     ProjectCreate, Project, ImportResult, AnalysisResult, 
-    ClusterInfo, ProximityItem, ExportRequest
+    ClusterInfo, ProximityItem, ExportRequest, EmbeddingItem
 )
 from app.services.ingest import IngestService
 from app.services.embeddings import EmbeddingsService
-from app.services.index import VectorIndexService
-from app.services.clustering import ClusteringService
+from app.services.index import VectorIndexService, index_cache
+from app.services.clustering import CLUSTERING_MODES, ClusteringService, condensed_tree_cache
 from app.services.scoring import ScoringService
 from app.services.database import DatabaseService
+from app.services.upload import UploadService, UploadTooLarge, is_csv_filename
 from app.core.config import settings
 
 router = APIRouter()
@@ -26,18 +28,28 @@ index_service = VectorIndexService()
 clustering_service = ClusteringService()
 scoring_service = ScoringService()
 db_service = DatabaseService()
+upload_service = UploadService()
 
 projects_db = {}
 
+# Combinaisons (min_cluster_size, epsilon) ré-extraites par requête de /clusters/sweep
+MAX_CLUSTER_SWEEP = 50
+
 @router.post("/", response_model=Project)
 async def create_project(project: ProjectCreate):
     project_id = str(uuid.uuid4())
     
+    # Mode d'exécution du clustering : parameters.clustering_mode, sinon CLUSTERING_MODE
+    clustering_mode = (project.parameters or {}).get("clustering_mode")
+    if clustering_mode is not None and clustering_mode not in CLUSTERING_MODES:
+        raise HTTPException(status_code=400, detail=f"clustering_mode invalide (attendu: {', '.join(CLUSTERING_MODES)})")
+    
     # Créer en base de données
     db_project = db_service.create_project(
         project_id=project_id,
         name=project.name,
-        description=project.description
+        description=project.description,
+        clustering_mode=clustering_mode
     )
     
     # Maintenir compatibilité avec projects_db
@@ -80,67 +92,97 @@ async def list_projects():
                 "description": project.description,
                 "created_at": project.created_at.isoformat(),
                 "status": project.status,
-                "parameters": {}
+                "parameters": project_parameters(project)
             }
         
         api_projects.append(Project(
             id=project.id,
             name=project.name,
             description=project.description,
-            parameters={},
+            parameters=project_parameters(project),
             created_at=project.created_at.isoformat(),
             status=project.status
         ))
     
     return api_projects
 
+def project_parameters(project) -> dict:
+    return {"clustering_mode": project.clustering_mode} if project.clustering_mode else {}
+
+def project_clustering_mode(project_id: str) -> str:
+    """Mode du projet en base, sinon CLUSTERING_MODE"""
+    project = db_service.get_project(project_id)
+    return (project.clustering_mode if project else None) or clustering_service.mode
+
+@router.put("/{project_id}/clustering-mode")
+async def set_clustering_mode(project_id: str, mode: str = Query(..., description="reproducible ou fast")):
+    """Mode d'exécution du clustering pour les analyses suivantes du projet"""
+    if mode not in CLUSTERING_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode invalide (attendu: {', '.join(CLUSTERING_MODES)})")
+    if not db_service.update_project_clustering_mode(project_id, mode):
+        raise HTTPException(status_code=404, detail="Projet non trouvé")
+    
+    if project_id in projects_db:
+        projects_db[project_id].setdefault("parameters", {})["clustering_mode"] = mode
+    return {"project_id": project_id, "clustering_mode": mode}
+
+@router.post("/{project_id}/import-chunk/init")
+async def init_chunked_import(
+    project_id: str,
+    file_type: str = Form(..., description="Type de fichier: pages ou links"),
+    file_size: int = Form(..., description="Taille totale du fichier en octets"),
+    chunk_size: Optional[int] = Form(None, description="Taille des chunks en octets (plafonnée par le serveur)")
+):
+    """Préalloue le fichier et renvoie le découpage à suivre (reprend un upload identique en cours)"""
+    if project_id not in projects_db:
+        raise HTTPException(status_code=404, detail="Projet non trouvé")
+    
+    try:
+        return {
+            "project_id": project_id,
+            **upload_service.init_upload(project_id, file_type, file_size, chunk_size)
+        }
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{project_id}/import-chunk/status")
+async def get_chunked_import_status(project_id: str, file_type: str = Query(...)):
+    """Chunks reçus / manquants, pour reprendre un upload interrompu"""
+    if project_id not in projects_db:
+        raise HTTPException(status_code=404, detail="Projet non trouvé")
+    
+    try:
+        return {"project_id": project_id, **upload_service.get_status(project_id, file_type)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/{project_id}/import-chunk")
 async def import_chunk(
     project_id: str,
-    chunk_data: UploadFile = File(..., description="Données du chunk CSV"),
-    file_type: str = File(..., description="Type de fichier: pages ou links"), 
-    chunk_index: int = File(..., description="Index du chunk"),
-    total_chunks: int = File(..., description="Nombre total de chunks"),
-    is_first_chunk: bool = File(..., description="Premier chunk"),
-    is_last_chunk: bool = File(..., description="Dernier chunk")
+    chunk_data: UploadFile = File(..., description="Octets bruts du chunk"),
+    file_type: str = Form(..., description="Type de fichier: pages ou links"),
+    chunk_index: int = Form(..., description="Index du chunk (offset = index * chunk_size)"),
+    checksum: Optional[str] = Form(None, description="SHA-256 hexadécimal du chunk, vérifié s'il est fourni")
 ):
     if project_id not in projects_db:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
     
     try:
-        project_dir = Path(settings.DATA_DIR) / project_id
-        project_dir.mkdir(exist_ok=True)
-        
-        # Nom du fichier temporaire pour ce type
-        temp_filename = f"temp_{file_type}.csv"
-        temp_path = project_dir / temp_filename
-        
-        # Lire le contenu du chunk
-        chunk_content = await chunk_data.read()
-        chunk_text = chunk_content.decode('utf-8')
-        
-        if is_first_chunk:
-            # Premier chunk : créer le fichier avec header
-            with open(temp_path, 'w', encoding='utf-8') as f:
-                f.write(chunk_text)
-            print(f"🗂️ CHUNK: Premier chunk {file_type} créé: {temp_path}")
-        else:
-            # Chunks suivants : append sans header
-            lines = chunk_text.split('\n')
-            data_lines = lines[1:]  # Supprimer header
-            
-            with open(temp_path, 'a', encoding='utf-8') as f:
-                f.write('\n' + '\n'.join(data_lines))
-            print(f"📎 CHUNK: Chunk {chunk_index + 1}/{total_chunks} ajouté à {file_type}")
+        # Aucun décodage : les octets sont écrits tels quels à leur offset, par blocs
+        result = await upload_service.write_chunk(project_id, file_type, chunk_index, chunk_data, checksum)
         
         return {
             "project_id": project_id,
-            "chunk_index": chunk_index,
-            "total_chunks": total_chunks,
             "file_type": file_type,
+            **result,
             "status": "chunk_uploaded"
         }
         
+    except ValueError as e:
+        print(f"❌ CHUNK ERROR: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ CHUNK ERROR: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur upload chunk: {str(e)}")
@@ -150,23 +192,27 @@ async def finalize_import(project_id: str):
     if project_id not in projects_db:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
     
+    project_dir = Path(settings.DATA_DIR) / project_id
+    
+    # Vérifier la complétude de tous les uploads avant de toucher aux fichiers
+    if not upload_service.is_initialized(project_id, "pages"):
+        raise HTTPException(status_code=400, detail="Aucun fichier pages uploadé")
+    
+    for file_type in upload_service.FILE_TYPES:
+        if upload_service.is_initialized(project_id, file_type):
+            missing = upload_service.missing_chunks(project_id, file_type)
+            if missing:
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": f"Upload {file_type} incomplet", "file_type": file_type, "missing_chunks": missing}
+                )
+    
     try:
-        project_dir = Path(settings.DATA_DIR) / project_id
-        temp_pages = project_dir / "temp_pages.csv"
-        temp_links = project_dir / "temp_links.csv"
-        
-        # Traiter le fichier pages (obligatoire)
-        if not temp_pages.exists():
-            raise HTTPException(status_code=400, detail="Aucun fichier pages uploadé")
-        
-        # Renommer et traiter comme avant
-        final_pages = project_dir / "pages.csv"
-        temp_pages.rename(final_pages)
+        final_pages = upload_service.complete_upload(project_id, "pages", project_dir / "pages.csv")
         
         final_links = None
-        if temp_links.exists():
-            final_links = project_dir / "links.csv" 
-            temp_links.rename(final_links)
+        if upload_service.is_initialized(project_id, "links"):
+            final_links = upload_service.complete_upload(project_id, "links", project_dir / "links.csv")
         
         # Traitement avec ingest_service comme avant
         result = ingest_service.process_csv(
@@ -175,8 +221,10 @@ async def finalize_import(project_id: str):
             str(final_links) if final_links else None
         )
         
-        if result["valid"]:
-            projects_db[project_id]["status"] = "imported"
+        if not result["valid"]:
+            raise HTTPException(status_code=400, detail=result["message"])
+        
+        projects_db[project_id]["status"] = "imported"
         
         print(f"🎯 FINALIZE: Import terminé - {result['pages_rows']} pages")
         
@@ -187,6 +235,10 @@ async def finalize_import(project_id: str):
             message=f"Import finalisé: {result['pages_rows']} pages"
         )
         
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"❌ FINALIZE ERROR: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur finalisation: {str(e)}")
@@ -200,29 +252,25 @@ async def import_csv(
     if project_id not in projects_db:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
     
-    if not pages_file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Le fichier pages doit être un CSV")
+    if not is_csv_filename(pages_file.filename):
+        raise HTTPException(status_code=400, detail="Le fichier pages doit être un CSV (éventuellement .gz ou .zst)")
     
-    if edges_file and not edges_file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Le fichier liens doit être un CSV")
+    if edges_file and not is_csv_filename(edges_file.filename):
+        raise HTTPException(status_code=400, detail="Le fichier liens doit être un CSV (éventuellement .gz ou .zst)")
     
     try:
         project_dir = Path(settings.DATA_DIR) / project_id
         project_dir.mkdir(exist_ok=True)
         
-        # Sauvegarder le fichier des pages
-        pages_upload_path = project_dir / f"upload_pages_{pages_file.filename}"
-        with open(pages_upload_path, "wb") as buffer:
-            content = await pages_file.read()
-            buffer.write(content)
+        # Sauvegarder le fichier des pages (copie par blocs, décompression gzip/zstd à la volée)
+        pages_upload_path = project_dir / "upload_pages.csv"
+        await upload_service.save_upload(pages_file, pages_upload_path)
         
         # Sauvegarder le fichier des liens si fourni
         edges_upload_path = None
         if edges_file:
-            edges_upload_path = project_dir / f"upload_edges_{edges_file.filename}"
-            with open(edges_upload_path, "wb") as buffer:
-                content = await edges_file.read()
-                buffer.write(content)
+            edges_upload_path = project_dir / "upload_edges.csv"
+            await upload_service.save_upload(edges_file, edges_upload_path)
         
         # Traiter les fichiers
         result = ingest_service.process_csv(
@@ -241,6 +289,8 @@ async def import_csv(
             message=result["message"]
         )
         
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'import: {str(e)}")
 
@@ -272,7 +322,8 @@ async def analyze_simple(project_id: str):
     if project_id not in projects_db:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
     
-    if projects_db[project_id]["status"] != "imported":
+    # Après un échec, relancer l'analyse reprend les embeddings depuis leur checkpoint
+    if projects_db[project_id]["status"] not in ("imported", "error"):
         raise HTTPException(status_code=400, detail="Le projet doit être importé")
     
     # Marquer comme en cours d'analyse
@@ -298,10 +349,12 @@ async def run_analysis_background(project_id: str):
         print(f"🎪 BACKGROUND: Starting analysis for project {project_id}")
         
         # Créer l'analyse en base
+        clustering_mode = project_clustering_mode(project_id)
         analysis = db_service.create_analysis(
             project_id=project_id,
             analysis_type="full",
-            clustering_method="hdbscan"
+            clustering_method="hdbscan",
+            clustering_mode=clustering_mode
         )
         print(f"🎪 BACKGROUND: Created analysis #{analysis.id}")
         
@@ -319,7 +372,21 @@ async def run_analysis_background(project_id: str):
             "analysis_id": analysis.id
         }
         
-        embeddings_result = await embeddings_service.embed_pages(project_id)
+        def embeddings_progress(state, meta):
+            resumed = meta.get("resumed_pages", 0)
+            message = meta["status"]
+            if resumed:
+                message = f"{message} (reprise: {resumed} pages déjà calculées)"
+            projects_db[project_id]["progress"] = {
+                "step": 1,
+                "total_steps": 4,
+                "step_name": "Génération des embeddings",
+                "progress_percentage": int(25 * meta["pages_processed"] / max(1, meta["total_pages"])),
+                "message": message,
+                "analysis_id": analysis.id
+            }
+        
+        embeddings_result = await embeddings_service.embed_pages_with_progress(project_id, embeddings_progress)
         vectors = embeddings_result["vectors_array"]
         node_ids = embeddings_result["node_ids"]
         urls = embeddings_result["urls"]
@@ -335,8 +402,31 @@ async def run_analysis_background(project_id: str):
             "message": f"Calcul des similarités pour {len(vectors)} pages..."
         }
         
-        semantic_neighbors = index_service.find_semantic_neighbors(vectors, node_ids)
-        print(f"🎪 BACKGROUND: Similarities done")
+        # Index choisi selon la taille du site (exact, HNSW, IVF), recall@k contrôlé sur un échantillon.
+        # Après un ré-import, l'index et le graphe de voisins de l'analyse précédente sont mis à jour
+        # (pages ajoutées, retirées ou modifiées) plutôt que reconstruits
+        index, graph, index_update = None, None, {"mode": "full"}
+        previous = db_service.get_latest_indexed_analysis(project_id)
+        if previous and index_service.neighbor_search == "knn" and Path(previous.faiss_index_path).exists():
+            update = index_service.update_index(previous.faiss_index_path, vectors, node_ids)
+            if update is not None:
+                index, graph, index_update = update
+                index_update["previous_analysis_id"] = previous.id
+        if index is None:
+            index = index_service.build_index(vectors)
+            if index_service.neighbor_search == "knn":
+                graph = index_service.build_neighbor_graph(index, vectors)
+        
+        index_info = index_service.describe_index(index, vectors)
+        index_info["update"] = index_update
+        if graph is not None:
+            semantic_neighbors = graph.to_pairs(settings.SIM_THRESHOLD)
+        else:
+            semantic_neighbors = index_service.find_semantic_neighbors(vectors, node_ids, index=index)
+        # Index et graphe gardés avec l'analyse : pages similaires, mise à jour au prochain import
+        faiss_index_path = index_service.save_index(index, project_id, analysis.id, node_ids, urls, graph)
+        del index
+        print(f"🎪 BACKGROUND: Similarities done ({index_info['type']}, recall@{index_info['recall_k']}={index_info['recall_at_k']})")
         
         # 3. Clustering  
         print(f"🎪 BACKGROUND: Step 3/4 - Clustering...")
@@ -348,7 +438,13 @@ async def run_analysis_background(project_id: str):
             "message": "Analyse des clusters thématiques..."
         }
         
-        clustering_results = clustering_service.full_clustering_analysis(vectors, node_ids, urls)
+        # Les voisins FAISS de l'étape 2 servent de graphe de voisins à UMAP (pas de NNDescent)
+        clustering_results = clustering_service.full_clustering_analysis(
+            vectors, node_ids, urls, manifold_path=clustering_service.manifold_path(project_id, analysis.id),
+            knn_graph=graph, mode=clustering_mode,
+            hierarchy_path=clustering_service.hierarchy_path(project_id, analysis.id)
+        )
+        del graph
         print(f"🎪 BACKGROUND: Clustering done - {len(clustering_results['clusters'])} clusters")
         
         # 4. Proximité
@@ -375,7 +471,15 @@ async def run_analysis_background(project_id: str):
             "clusters": clustering_results["clusters"],
             "proximities": proximity_analysis["proximity_anomalies"],
             "projection_2d": clustering_results["projection_2d"],
-            "summary": proximity_analysis.get("summary", {}),
+            "summary": {
+                **proximity_analysis.get("summary", {}),
+                "embedding_dedup": embeddings_result.get("dedup")
+            },
+            "embedding_cache": embeddings_result.get("cache"),
+            "embedding_latency": embeddings_result.get("latency"),
+            "index": index_info,
+            "manifold": clustering_results.get("manifold"),
+            "faiss_index_path": faiss_index_path,
             "embeddings_path": embeddings_result.get("embeddings_path"),
             "clustering_results_path": clustering_service.save_clustering_results(project_id, clustering_results)
         }
@@ -674,7 +778,7 @@ async def analyze_project_sync(project_id: str):
         semantic_neighbors = index_service.find_semantic_neighbors(vectors, node_ids)
         
         clustering_results = clustering_service.full_clustering_analysis(
-            vectors, node_ids, urls
+            vectors, node_ids, urls, mode=project_clustering_mode(project_id)
         )
         
         proximity_analysis = scoring_service.full_proximity_analysis(
@@ -775,6 +879,53 @@ async def get_proximities(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
+@router.get("/{project_id}/similar")
+async def get_similar_pages(
+    project_id: str,
+    url: Optional[str] = Query(None, description="URL d'une page analysée"),
+    text: Optional[str] = Query(None, description="Texte libre, embeddé à la volée"),
+    k: int = Query(10, ge=1, le=1000),
+    analysis_id: Optional[int] = Query(None, description="Défaut : dernière analyse terminée")
+):
+    """Pages les plus proches d'une URL ou d'un texte, depuis l'index persisté de l'analyse"""
+    if (url is None) == (text is None):
+        raise HTTPException(status_code=400, detail="Préciser soit url, soit text")
+    
+    if analysis_id is not None:
+        analysis = db_service.get_analysis(analysis_id)
+        if not analysis or analysis.project_id != project_id:
+            raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    else:
+        analysis = db_service.get_latest_indexed_analysis(project_id)
+    
+    if not analysis or not analysis.faiss_index_path or not Path(analysis.faiss_index_path).exists():
+        raise HTTPException(status_code=404, detail="Aucun index enregistré pour cette analyse")
+    
+    start = time.perf_counter()
+    loaded = index_service.open_analysis_index(analysis.faiss_index_path)
+    
+    query_vector = None
+    if text is not None:
+        query_vector = (await embeddings_service.embed_batch([EmbeddingItem(type="text", value=text)]))[0]
+        if len(query_vector) != loaded.index.d:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Le modèle renvoie {len(query_vector)} dimensions, l'index en attend {loaded.index.d}"
+            )
+    
+    try:
+        results = index_service.query_similar_pages(loaded, k, url=url, query_vector=query_vector)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"URL absente de l'analyse #{analysis.id}")
+    
+    return {
+        "project_id": project_id,
+        "analysis_id": analysis.id,
+        "query": {"url": url} if url is not None else {"text": text},
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
 @router.get("/{project_id}/export/{format}")
 async def export_results(project_id: str, format: str):
     if project_id not in projects_db:
@@ -884,10 +1035,14 @@ async def list_project_analyses(project_id: str):
         "embedding_model": analysis.embedding_model,
         "clustering_method": analysis.clustering_method,
         "min_cluster_size": analysis.min_cluster_size,
+        "clustering_mode": analysis.clustering_mode,
         "total_embeddings": analysis.total_embeddings,
         "embedding_dimensions": analysis.embedding_dimensions,
         "total_clusters": analysis.total_clusters,
         "total_anomalies": analysis.total_anomalies,
+        "index_type": analysis.index_type,
+        "index_params": analysis.index_params,
+        "index_recall": analysis.index_recall,
         "error_message": analysis.error_message
     } for analysis in analyses]
 
@@ -922,7 +1077,11 @@ async def get_analysis_results(project_id: str, analysis_id: int):
             "total_embeddings": analysis.total_embeddings,
             "embedding_dimensions": analysis.embedding_dimensions,
             "total_clusters": analysis.total_clusters,
-            "total_anomalies": analysis.total_anomalies
+            "total_anomalies": analysis.total_anomalies,
+            "index_type": analysis.index_type,
+            "index_params": analysis.index_params,
+            "index_recall": analysis.index_recall,
+            "clustering_mode": analysis.clustering_mode
         },
         "results": {
             "clusters": analysis.clusters_data or [],
@@ -931,6 +1090,137 @@ async def get_analysis_results(project_id: str, analysis_id: int):
         }
     }
 
+@router.get("/{project_id}/analyses/{analysis_id}/clusters/sweep")
+def sweep_cluster_granularity(
+    project_id: str,
+    analysis_id: int,
+    min_cluster_size: List[int] = Query(..., description="Tailles minimales de cluster à essayer (paramètre répétable)"),
+    epsilon: List[float] = Query([0.0], description="Valeurs de cluster_selection_epsilon à essayer (paramètre répétable)"),
+    include_labels: bool = Query(True, description="Renvoyer le cluster de chaque page")
+):
+    """Clusters HDBSCAN de l'analyse ré-extraits de son arbre enregistré, pour chaque couple
+    (min_cluster_size, epsilon) : sans refaire embeddings, UMAP ni HDBSCAN.
+    Endpoint synchrone : l'extraction, liée au CPU, tourne dans le pool de threads et ne bloque pas la boucle"""
+    analysis = db_service.get_analysis(analysis_id)
+    if not analysis or analysis.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    hierarchy_path = clustering_service.hierarchy_path(project_id, analysis_id)
+    if not hierarchy_path.exists():
+        raise HTTPException(status_code=404, detail="Pas d'arbre HDBSCAN pour cette analyse (clustering K-means ou analyse antérieure)")
+    
+    if min(min_cluster_size) < 2 or min(epsilon) < 0:
+        raise HTTPException(status_code=400, detail="min_cluster_size doit être >= 2 et epsilon >= 0")
+    if len(min_cluster_size) * len(epsilon) > MAX_CLUSTER_SWEEP:
+        raise HTTPException(status_code=400, detail=f"Au plus {MAX_CLUSTER_SWEEP} combinaisons par requête")
+    
+    start = time.perf_counter()
+    tree_info, results = clustering_service.extract_clusters(hierarchy_path, min_cluster_size, epsilon)
+    took_ms = round((time.perf_counter() - start) * 1000, 2)
+    
+    for result in results:
+        labels = result.pop("labels")
+        if include_labels:
+            result["labels"] = labels.tolist()
+    
+    return {
+        "project_id": project_id,
+        "analysis_id": analysis_id,
+        "tree": tree_info,
+        "results": results,
+        "took_ms": took_ms
+    }
+
+@router.post("/{project_id}/analyses/{analysis_id}/recluster")
+def recluster_analysis(
+    project_id: str,
+    analysis_id: int,
+    min_cluster_size: Optional[int] = Query(None, ge=2, description="Taille minimale de cluster HDBSCAN (défaut : pages / 15, au moins 10)"),
+    epsilon: float = Query(0.3, ge=0, description="cluster_selection_epsilon de HDBSCAN")
+):
+    """Nouvelle analyse clustering_only : clusters de l'analyse recalculés avec d'autres paramètres
+    à partir de sa variété UMAP enregistrée, sans refaire embeddings, index ni UMAP"""
+    source = db_service.get_analysis(analysis_id)
+    if not source or source.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    if source.status != "completed":
+        raise HTTPException(status_code=400, detail=f"Analyse non terminée (statut: {source.status})")
+    
+    if not clustering_service.manifold_path(project_id, analysis_id).exists():
+        raise HTTPException(status_code=404, detail="Pas de variété UMAP pour cette analyse (site de moins de 10 pages ou analyse antérieure)")
+    
+    # La variété est alignée sur les pages de l'analyse : les embeddings ne doivent pas avoir changé depuis
+    embeddings = embeddings_service.load_embeddings(project_id)
+    node_ids, urls = embeddings["node_ids"], embeddings["urls"]
+    if [point["node_id"] for point in source.projection_data or []] != node_ids:
+        raise HTTPException(status_code=409, detail="Les embeddings du projet ont changé depuis cette analyse : relancer une analyse complète")
+    
+    analysis = db_service.create_analysis(
+        project_id=project_id,
+        analysis_type="clustering_only",
+        clustering_method="hdbscan",
+        min_cluster_size=min_cluster_size or source.min_cluster_size,
+        clustering_mode=source.clustering_mode
+    )
+    print(f"🎪 RECLUSTER: analyse #{analysis.id} depuis la variété de l'analyse #{analysis_id}")
+    
+    manifold_path = clustering_service.manifold_path(project_id, analysis.id)
+    hierarchy_path = clustering_service.hierarchy_path(project_id, analysis.id)
+    try:
+        start = time.perf_counter()
+        vectors = embeddings["vectors_array"]
+        clustering_results = clustering_service.full_clustering_analysis(
+            vectors, node_ids, urls,
+            manifold_path=clustering_service.link_manifold(project_id, analysis_id, analysis.id),
+            mode=source.clustering_mode, reuse_manifold=True, hierarchy_path=hierarchy_path,
+            min_cluster_size=min_cluster_size, cluster_selection_epsilon=epsilon
+        )
+        
+        # Voisins sémantiques de l'analyse d'origine (graphe ou index enregistré) : anomalies
+        # de proximité et cohérence des nouveaux clusters recalculées comme dans le pipeline
+        semantic_neighbors = index_service.analysis_semantic_neighbors(source.faiss_index_path, vectors, node_ids)
+        proximity_analysis = scoring_service.full_proximity_analysis(
+            project_id, vectors, node_ids, urls, semantic_neighbors, clustering_results["clusters"]
+        )
+        summary = proximity_analysis["summary"]
+        
+        final_result = {
+            "project_id": project_id,
+            "total_pages": len(node_ids),
+            "total_embeddings": source.total_embeddings,
+            "dimensions": source.embedding_dimensions,
+            "clusters": clustering_results["clusters"],
+            "proximities": proximity_analysis["proximity_anomalies"],
+            "summary": summary,
+            "projection_2d": clustering_results["projection_2d"],
+            "faiss_index_path": source.faiss_index_path,
+            "embeddings_path": embeddings["embeddings_path"]
+        }
+        if source.index_type:
+            final_result["index"] = {"type": source.index_type, "params": source.index_params, "recall_at_k": source.index_recall}
+        db_service.update_analysis_results(analysis.id, final_result, status="completed")
+    except Exception as e:
+        print(f"❌ RECLUSTER ERROR: {type(e).__name__}: {str(e)}")
+        # Pas de variété ni d'arbre orphelins pour une analyse en échec
+        manifold_path.unlink(missing_ok=True)
+        hierarchy_path.unlink(missing_ok=True)
+        db_service.update_analysis_results(analysis.id, {}, status="failed", error_message=str(e))
+        raise HTTPException(status_code=500, detail=f"Erreur lors du re-clustering: {str(e)}")
+    
+    return {
+        "project_id": project_id,
+        "analysis_id": analysis.id,
+        "source_analysis_id": analysis_id,
+        "n_clusters": clustering_results["n_clusters"],
+        "noise_points": clustering_results["noise_points"],
+        "method_used": clustering_results["method_used"],
+        "manifold": clustering_results["manifold"],
+        "summary": summary,
+        "proximities": len(proximity_analysis["proximity_anomalies"]),
+        "took_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
 @router.delete("/{project_id}")
 async def delete_project(project_id: str):
     """Supprimer un projet et toutes ses analyses"""
@@ -945,6 +1235,8 @@ async def delete_project(project_id: str):
     
     # Supprimer les fichiers
     project_dir = Path(settings.DATA_DIR) / project_id
+    index_cache.discard(project_dir)
+    condensed_tree_cache.discard(project_dir)
     if project_dir.exists():
         import shutil
         shutil.rmtree(project_dir)
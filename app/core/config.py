@@ -3,13 +3,59 @@ from typing import Optional
 
 class Settings(BaseSettings):
     EMBEDDINGS_ENDPOINT: str = "https://outils.agence-slashr.fr/embedding"
-    EMBED_BATCH: int = 250
+    EMBEDDING_MODEL: str = "BAAI/bge-m3"
+    EMBED_BATCH: int = 250  # Nombre max de textes par batch
+    EMBED_BATCH_CHARS: int = 200_000  # Budget de caractères initial par batch (~tokens x 4)
+    EMBED_TARGET_BATCH_SECONDS: float = 10.0  # Latence visée pour l'ajustement du budget
+    EMBED_CONCURRENCY: int = 4  # Batches en vol au démarrage
+    EMBED_MAX_CONCURRENCY: int = 16  # Plafond de la concurrence adaptative
+    EMBED_ENCODING: str = "auto"  # Transport des vecteurs : auto (raw > base64 > json), raw, base64 ou json
+    EMBED_HEDGE: bool = True  # Requête dupliquée quand un batch dépasse son délai
+    EMBED_HEDGE_PERCENTILE: float = 95.0  # Percentile des latences observées servant de délai
+    EMBED_HEDGE_MIN_SECONDS: float = 2.0  # Délai minimal avant duplication
+    EMBED_HEDGE_INITIAL_SECONDS: float = 30.0  # Délai de duplication tant que moins de 10 latences sont connues
+    EMBED_REQUEST_TIMEOUT_SECONDS: float = 300.0  # Plafond du délai d'une requête (4 x le délai de duplication)
+    EMBED_RETRIES: int = 5  # Tentatives par batch sur erreur transitoire (timeout, 429, 5xx)
+    EMBED_BACKOFF_SECONDS: float = 1.0  # Attente de base, doublée à chaque tentative
+    EMBED_BACKOFF_MAX_SECONDS: float = 60.0
+    EMBED_BREAKER_FAILURES: int = 5  # Échecs consécutifs avant suspension des envois
+    EMBED_BREAKER_COOLDOWN_SECONDS: float = 30.0
     KNN_K: int = 20
+    INDEX_TYPE: str = "auto"  # auto, flat, hnsw, ivf_flat ou ivf_pq
+    INDEX_HNSW_MIN_VECTORS: int = 50_000  # auto : HNSW à partir de ce nombre de pages
+    INDEX_IVF_MIN_VECTORS: int = 1_000_000  # auto : IVF-Flat
+    INDEX_IVF_PQ_MIN_VECTORS: int = 5_000_000  # auto : IVF-PQ
+    INDEX_HNSW_M: int = 32
+    INDEX_HNSW_EF_CONSTRUCTION: int = 100
+    INDEX_HNSW_EF_SEARCH: int = 128
+    INDEX_IVF_NLIST: int = 0  # 0 : 4·√n listes
+    INDEX_IVF_NPROBE: int = 16
+    INDEX_PQ_M: int = 64  # Sous-vecteurs PQ (ramené à un diviseur de la dimension)
+    INDEX_TRAIN_SAMPLE: int = 100_000  # Vecteurs d'entraînement (IVF, PQ, quantification scalaire)
+    INDEX_RECALL_SAMPLE: int = 1000  # Requêtes du contrôle de recall@k (0 : désactivé)
+    INDEX_CACHE_MAX_BYTES: int = 2 * 1024 ** 3  # Index d'analyses gardés ouverts pour /similar (octets)
+    NEIGHBOR_SEARCH: str = "knn"  # knn (KNN_K voisins par page) ou range (toutes les paires >= SIM_THRESHOLD)
+    RANGE_MAX_NEIGHBORS: int = 0  # range : voisins gardés par page, les plus proches (0 : sans limite)
+    CLUSTERING_MODE: str = "reproducible"  # Défaut des projets : reproducible (graine fixe, UMAP sur un cœur) ou fast (multi-cœur, non déterministe)
+    CLUSTERING_WORKERS: int = 0  # fast : threads numba de UMAP et core_dist_n_jobs de HDBSCAN (0 : tous les cœurs)
+    PCA_DIMENSIONS: int = 0  # NEIGHBOR_SEARCH=range uniquement : PCA avant NNDescent et UMAP (0 : désactivée ; 64 à 128 pour bge-m3)
+    CLUSTER_TREE_CACHE_MAX_BYTES: int = 256 * 1024 ** 2  # Arbres HDBSCAN condensés gardés pour /clusters/sweep (octets)
     DMAX: int = 8
     SIM_THRESHOLD: float = 0.80
     HOPS_THRESHOLD: int = 3
-    CHUNKING: bool = False
+    CHUNKING: bool = False  # Découpe des textes longs en segments, regroupés en un vecteur par page
+    CHUNK_SIZE: int = 2000  # Caractères max par segment
+    CHUNK_OVERLAP: int = 200  # Caractères communs à deux segments consécutifs
+    CHUNK_POOLING: str = "mean"  # mean ou weighted (pondéré par la longueur des segments)
+    CHUNK_KEEP_VECTORS: bool = False  # Conserver les vecteurs des segments (embeddings_chunks.npy)
     DATA_DIR: str = "./data"
+    VECTOR_STORAGE: str = "float32"  # float32, float16 ou int8 (stockage + index FAISS quantifiés)
+    EMBEDDING_CACHE: bool = True
+    EMBEDDING_CACHE_DIR: Optional[str] = None  # Défaut: {DATA_DIR}/embedding_cache
+    EMBEDDING_CACHE_MAX_SIZE: int = 10 * 1024 ** 3  # Éviction au-delà (octets)
+    EMBEDDING_CACHE_DTYPE: str = "float32"  # float32 ou float16
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # Taille max d'un chunk d'upload (octets)
+    UPLOAD_MAX_SIZE: int = 20 * 1024 ** 3  # Plafond par fichier uploadé, après décompression (octets)
     
     class Config:
         env_file = ".env"
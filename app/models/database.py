@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, JSON, Boolean
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, DateTime, Text, JSON, Boolean, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from datetime import datetime
@@ -28,6 +28,9 @@ class Project(Base):
     # Status
     status = Column(String, default="created")  # created, analyzing, analyzed, error
     
+    # Mode d'exécution du clustering (reproducible, fast) ; NULL : CLUSTERING_MODE
+    clustering_mode = Column(String, nullable=True)
+    
 class Analysis(Base):
     __tablename__ = "analyses"
     
@@ -42,6 +45,7 @@ class Analysis(Base):
     embedding_model = Column(String, default="BAAI/bge-m3")
     clustering_method = Column(String, default="hdbscan")
     min_cluster_size = Column(Integer, default=10)
+    clustering_mode = Column(String, nullable=True)  # reproducible ou fast
     
     # Résultats
     total_embeddings = Column(Integer, default=0)
@@ -49,6 +53,11 @@ class Analysis(Base):
     total_clusters = Column(Integer, default=0)
     total_anomalies = Column(Integer, default=0)
     
+    # Index de voisinage utilisé (flat, hnsw, ivf_flat, ivf_pq), paramètres et recall@k mesuré
+    index_type = Column(String, nullable=True)
+    index_params = Column(JSON, nullable=True)
+    index_recall = Column(Float, nullable=True)
+    
     # Données complètes (JSON)
     clusters_data = Column(JSON, nullable=True)
     projection_data = Column(JSON, nullable=True)
@@ -70,6 +79,20 @@ def create_tables():
     data_dir.mkdir(exist_ok=True)
     
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+def add_missing_columns():
+    """Colonnes ajoutées aux modèles après la création de la base (create_all ne modifie
+    pas les tables existantes) : ALTER TABLE ADD COLUMN, valeurs NULL pour les lignes existantes"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"🗃️ DATABASE: Colonne {table.name}.{column.name} ajoutée")
 
 def get_db() -> Session:
     """Dependency pour obtenir une session de base de données"""
@@ -47,6 +47,8 @@ class ProximityItem(BaseModel):
     url_j: HttpUrl
     cosine: float
     hops: Optional[int]
+    hops_ij: Optional[int] = None
+    hops_ji: Optional[int] = None
     anomaly_score: float
 
 class AnalysisResult(BaseModel):
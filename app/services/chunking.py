@@ -0,0 +1,69 @@
+import numpy as np
+from typing import List, Tuple
+
+# Modes de regroupement des segments en un vecteur par page
+POOLING_MODES = ("mean", "weighted")
+# Pages regroupées à la fois : seuls leurs segments sont lus depuis la matrice mappée
+POOL_BLOCK_PAGES = 8192
+
+def split_text(text: str, size: int, overlap: int) -> List[str]:
+    """Fenêtres de `size` caractères se recouvrant de `overlap` ; au moins un segment par texte.
+
+    La coupure recule jusqu'au dernier espace de la fenêtre quand il y en a un
+    dans sa seconde moitié, pour ne pas trancher les mots.
+    """
+    if len(text) <= size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start + size // 2, end)
+            if space > start:
+                end = space
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
+
+def split_texts(texts: List[str], size: int, overlap: int) -> Tuple[List[str], np.ndarray]:
+    """Segments de tous les textes, à plat, et offsets (n + 1) : segments de la page i = offsets[i]:offsets[i + 1]"""
+    chunks = []
+    counts = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        text_chunks = split_text(text, size, overlap)
+        chunks.extend(text_chunks)
+        counts[i] = len(text_chunks)
+
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return chunks, offsets
+
+def pool_chunks(
+    chunk_vectors: np.ndarray,
+    offsets: np.ndarray,
+    weights: np.ndarray,
+    target: np.ndarray,
+    block_pages: int = POOL_BLOCK_PAGES
+):
+    """Un vecteur par page : moyenne pondérée de ses segments, renormalisée.
+
+    Réduction par segments (np.add.reduceat sur les offsets), bloc de pages par bloc de pages :
+    la mémoire reste bornée quelle que soit la taille de la matrice des segments.
+    """
+    n_pages = len(offsets) - 1
+    for start in range(0, n_pages, block_pages):
+        stop = min(start + block_pages, n_pages)
+        low, high = offsets[start], offsets[stop]
+        starts = offsets[start:stop] - low
+
+        block_weights = weights[low:high, np.newaxis].astype(np.float32)
+        block = np.asarray(chunk_vectors[low:high], dtype=np.float32) * block_weights
+        pooled = np.add.reduceat(block, starts, axis=0) / np.add.reduceat(block_weights, starts, axis=0)
+
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        target[start:stop] = pooled / np.maximum(norms, 1e-12)
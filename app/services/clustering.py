@@ -1,16 +1,287 @@
+import os
+import shutil
+import threading
+import time
+import numba
 import numpy as np
 import pandas as pd
+import scipy.sparse
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
+from sklearn.utils import check_random_state
 import umap
 import hdbscan
+from hdbscan._hdbscan_tree import compute_stability, condense_tree
+from umap import distances as umap_distances
+from umap.umap_ import find_ab_params, fuzzy_simplicial_set, nearest_neighbors, simplicial_set_embedding
 from app.core.config import settings
+from app.services.index import NeighborGraph
+from app.services.quantization import VectorStore, to_float32
+
+# Variété UMAP (plongements 50-D / 2D) gardée par analyse : re-clustering sans refaire UMAP
+MANIFOLDS_DIRNAME = "manifolds"
+# Arbre single linkage de HDBSCAN gardé par analyse : ré-extraction des clusters à d'autres granularités
+HIERARCHIES_DIRNAME = "hierarchies"
+# reproducible : graine fixe, optimisation UMAP sur un cœur ; fast : sans graine, UMAP et HDBSCAN multi-cœurs
+CLUSTERING_MODES = ("reproducible", "fast")
+RANDOM_STATE = 42
+# Pré-réduction PCA : ajustée sur un échantillon de pages, appliquée à toutes par blocs
+PCA_FIT_SAMPLE = 100_000
+PCA_BLOCK_ROWS = 65_536
+
+class CondensedTreeCache:
+    """LRU des arbres HDBSCAN condensés et de leurs stabilités par (arbre d'analyse, min_cluster_size),
+    commun au processus et borné en octets : déplacer le curseur de granularité sur des valeurs déjà
+    vues ne recondense pas l'arbre. Le plus récent est toujours gardé, même s'il dépasse seul la borne."""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int, int], Tuple[np.ndarray, Dict[int, float], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, hierarchy_path: Path, min_cluster_size: int, loader) -> Tuple[np.ndarray, Dict[int, float]]:
+        # mtime : un arbre réécrit (nouvelle analyse au même identifiant) invalide ses entrées
+        key = (str(hierarchy_path), hierarchy_path.stat().st_mtime_ns, min_cluster_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0], entry[1]
+        
+        condensed_tree, stability = loader()
+        # Stabilités : un dict Python d'environ 100 octets par cluster
+        nbytes = condensed_tree.nbytes + 100 * len(stability)
+        with self._lock:
+            self._entries[key] = (condensed_tree, stability, nbytes)
+            self._entries.move_to_end(key)
+            while len(self._entries) > 1 and self.total_bytes() > self.max_bytes:
+                self._entries.popitem(last=False)
+        return condensed_tree, stability
+    
+    def total_bytes(self) -> int:
+        return sum(entry[2] for entry in self._entries.values())
+    
+    def discard(self, directory: Path):
+        """Oublie les arbres situés sous directory (projet supprimé)"""
+        with self._lock:
+            for key in [key for key in self._entries if Path(key[0]).is_relative_to(directory)]:
+                del self._entries[key]
+
+condensed_tree_cache = CondensedTreeCache(settings.CLUSTER_TREE_CACHE_MAX_BYTES)
 
 class ClusteringService:
     def __init__(self):
         self.data_dir = Path(settings.DATA_DIR)
+        self.mode = settings.CLUSTERING_MODE
+        if self.mode not in CLUSTERING_MODES:
+            raise ValueError(f"CLUSTERING_MODE invalide: {self.mode} (attendu: {', '.join(CLUSTERING_MODES)})")
+        self.workers = settings.CLUSTERING_WORKERS
+        self.pca_dimensions = settings.PCA_DIMENSIONS
+    
+    def n_jobs(self, random_state: Optional[int]) -> int:
+        """Cœurs de UMAP / NNDescent : un seul avec une graine (résultat reproductible), sinon CLUSTERING_WORKERS"""
+        if random_state is not None:
+            return 1
+        return self.workers if self.workers > 0 else -1
+    
+    @contextmanager
+    def parallelism(self, mode: str):
+        """fast : limite les threads numba (optimisation UMAP) à CLUSTERING_WORKERS le temps de UMAP"""
+        previous = numba.get_num_threads()
+        if mode == "fast" and self.workers > 0:
+            numba.set_num_threads(min(self.workers, numba.config.NUMBA_NUM_THREADS))
+        try:
+            yield
+        finally:
+            numba.set_num_threads(previous)
+    
+    def manifold_path(self, project_id: str, analysis_id: int) -> Path:
+        return self.data_dir / project_id / MANIFOLDS_DIRNAME / f"analysis_{analysis_id}.npz"
+    
+    def link_manifold(self, project_id: str, source_analysis_id: int, analysis_id: int) -> Path:
+        """Variété d'une analyse partagée avec son re-clustering (lien physique, copie à défaut) :
+        la nouvelle analyse peut à son tour être re-clusterisée"""
+        source = self.manifold_path(project_id, source_analysis_id)
+        target = self.manifold_path(project_id, analysis_id)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+        return target
+    
+    def hierarchy_path(self, project_id: str, analysis_id: int) -> Path:
+        return self.data_dir / project_id / HIERARCHIES_DIRNAME / f"analysis_{analysis_id}.npz"
+    
+    def pre_reduce(
+        self,
+        vectors: np.ndarray,
+        n_components: int,
+        random_state: Optional[int] = RANDOM_STATE
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """PCA randomisée des vecteurs normalisés, avant le graphe de voisins et UMAP.
+        
+        Sur des vecteurs unitaires, la distance euclidienne suit l'ordre de la distance cosinus :
+        les vecteurs réduits s'utilisent donc en euclidien. Ajustée sur au plus PCA_FIT_SAMPLE pages.
+        """
+        start = time.perf_counter()
+        n_samples = len(vectors)
+        
+        def normalized(rows: np.ndarray) -> np.ndarray:
+            rows = np.asarray(rows, dtype=np.float32)
+            return rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+        
+        rng = np.random.default_rng(random_state)
+        sample = np.sort(rng.choice(n_samples, PCA_FIT_SAMPLE, replace=False)) if n_samples > PCA_FIT_SAMPLE else slice(None)
+        pca = PCA(n_components=n_components, svd_solver="randomized", random_state=random_state)
+        pca.fit(normalized(vectors[sample]))
+        
+        reduced = np.empty((n_samples, n_components), dtype=np.float32)
+        for block_start in range(0, n_samples, PCA_BLOCK_ROWS):
+            block = vectors[block_start:block_start + PCA_BLOCK_ROWS]
+            reduced[block_start:block_start + len(block)] = pca.transform(normalized(block))
+        
+        info = {
+            "dimensions": n_components,
+            "explained_variance": round(float(pca.explained_variance_ratio_.sum()), 4),
+            "seconds": round(time.perf_counter() - start, 2)
+        }
+        print(f"📉 PCA: {vectors.shape[1]} -> {n_components} dimensions, variance expliquée {info['explained_variance']:.1%} en {info['seconds']}s")
+        return reduced, info
+    
+    def build_fuzzy_graph(
+        self,
+        vectors: np.ndarray,
+        n_neighbors: int = 15,
+        random_state: Optional[int] = RANDOM_STATE,
+        knn_graph: Optional[NeighborGraph] = None,
+        metric: str = "cosine"
+    ) -> Tuple[scipy.sparse.coo_matrix, int]:
+        """Graphe flou de UMAP : calculé une fois pour les deux plongements.
+        
+        Avec knn_graph (voisins FAISS de l'étape 2), UMAP reçoit ces voisins tout faits au lieu
+        de refaire une recherche NNDescent ; n_neighbors (soi-même compris) est alors ramené à
+        KNN_K + 1 si besoin. Renvoie le graphe et le nombre de voisins réellement utilisé.
+        """
+        n_neighbors = max(2, min(n_neighbors, len(vectors) - 1))
+        
+        if knn_graph is not None:
+            knn_indices, knn_dists = knn_graph.to_umap_knn(n_neighbors)
+            n_neighbors = knn_indices.shape[1]
+        else:
+            knn_indices, knn_dists, _ = nearest_neighbors(
+                vectors, n_neighbors, metric, {}, False, check_random_state(random_state),
+                n_jobs=self.n_jobs(random_state)
+            )
+        graph, _, _ = fuzzy_simplicial_set(
+            vectors, n_neighbors, check_random_state(random_state), metric,
+            knn_indices=knn_indices, knn_dists=knn_dists
+        )
+        return graph.tocoo(), n_neighbors
+    
+    def embed_fuzzy_graph(
+        self,
+        vectors: np.ndarray,
+        graph: scipy.sparse.coo_matrix,
+        n_components: int,
+        min_dist: float = 0.1,
+        random_state: Optional[int] = RANDOM_STATE,
+        metric: str = "cosine"
+    ) -> np.ndarray:
+        """Plongement du graphe flou en n_components dimensions (étape d'optimisation de UMAP.fit) ;
+        sans graine, la descente de gradient est parallélisée par numba"""
+        n_components = max(2, min(n_components, len(vectors) - 1))
+        a, b = find_ab_params(1.0, min_dist)
+        
+        # simplicial_set_embedding élague le graphe sur place : copie pour le plongement suivant
+        embedding, _ = simplicial_set_embedding(
+            vectors, graph.copy(), n_components,
+            initial_alpha=1.0, a=a, b=b, gamma=1.0, negative_sample_rate=5, n_epochs=None,
+            init="spectral", random_state=check_random_state(random_state),
+            metric=umap_distances.named_distances[metric], metric_kwds={},
+            densmap=False, densmap_kwds={}, output_dens=False,
+            output_metric=umap_distances.named_distances_with_gradients["euclidean"],
+            output_metric_kwds={}, euclidean_output=True, parallel=random_state is None
+        )
+        return embedding
+    
+    def reduce_and_project(
+        self,
+        vectors: np.ndarray,
+        manifold_path: Optional[Path] = None,
+        n_neighbors: int = 15,
+        min_dist: float = 0.1,
+        n_components: int = 50,
+        random_state: Optional[int] = RANDOM_STATE,
+        knn_graph: Optional[NeighborGraph] = None,
+        pca_dimensions: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """Réduction 50-D (clustering) et projection 2D tirées d'un même graphe flou.
+        
+        Avec pca_dimensions et sans knn_graph, les vecteurs sont d'abord réduits une fois par PCA :
+        la recherche de voisins NNDescent et UMAP travaillent sur ces vecteurs réduits. Les voisins
+        FAISS, eux, rendent la PCA inutile (UMAP n'utilise plus les vecteurs que pour la mise en page).
+        Avec manifold_path, les deux plongements sont gardés sur disque (voir load_manifold).
+        """
+        # PCA demandée mais non appliquée : signalée, et absente des paramètres de la variété
+        pca_skipped = None
+        if pca_dimensions and knn_graph is not None:
+            pca_skipped = "voisins FAISS (NEIGHBOR_SEARCH=knn) : la PCA n'accélérerait rien"
+        elif pca_dimensions and not 0 < pca_dimensions < min(vectors.shape):
+            pca_skipped = f"{pca_dimensions} composantes pour des vecteurs de {vectors.shape[1]} dimensions"
+        if pca_skipped:
+            print(f"⚠️ UMAP: PCA_DIMENSIONS={pca_dimensions} ignoré ({pca_skipped})")
+            pca_dimensions = 0
+        # random_state -1 : mode fast, sans graine
+        params = {"n_samples": len(vectors), "n_neighbors": n_neighbors, "min_dist": min_dist,
+                  "n_components": n_components, "random_state": -1 if random_state is None else random_state,
+                  "knn": "faiss" if knn_graph is not None else "nndescent", "pca_dimensions": pca_dimensions}
+        
+        start = time.perf_counter()
+        metric, pca_info = "cosine", None
+        if pca_dimensions:
+            vectors, pca_info = self.pre_reduce(vectors, pca_dimensions, random_state)
+            metric = "euclidean"
+        graph_start = time.perf_counter()
+        graph, graph_neighbors = self.build_fuzzy_graph(vectors, n_neighbors, random_state, knn_graph, metric)
+        graph_seconds = time.perf_counter() - graph_start
+        reduced = self.embed_fuzzy_graph(vectors, graph, n_components, min_dist, random_state, metric)
+        projection_2d = self.embed_fuzzy_graph(vectors, graph, 2, min_dist, random_state, metric)
+        seconds = time.perf_counter() - start
+        print(f"🗺️ UMAP: graphe flou ({params['knn']}, {graph_neighbors} voisins) {graph_seconds:.1f}s, plongements 50-D et 2D en {seconds:.1f}s")
+        
+        if manifold_path is not None:
+            manifold_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(manifold_path, "wb") as f:
+                np.savez(
+                    f, reduced=reduced, projection_2d=projection_2d,
+                    explained_variance=np.asarray(pca_info["explained_variance"] if pca_info else np.nan),
+                    **{key: np.asarray(value) for key, value in params.items()}
+                )
+        
+        info = {
+            "cached": False, "knn": params["knn"], "n_neighbors": graph_neighbors, "pca": pca_info,
+            "seconds": round(seconds, 2), "graph_seconds": round(graph_seconds, 2)
+        }
+        if pca_skipped:
+            info["pca_skipped"] = pca_skipped
+        return reduced, projection_2d, info
+    
+    def load_manifold(self, manifold_path: Path, n_samples: int) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """Plongements 50-D et 2D enregistrés par reduce_and_project, pour re-clusteriser une analyse
+        avec d'autres paramètres sans refaire UMAP"""
+        with np.load(manifold_path) as cached:
+            if cached["n_samples"].item() != n_samples:
+                raise ValueError(f"Variété de {cached['n_samples'].item()} pages pour {n_samples} vecteurs : embeddings modifiés depuis l'analyse")
+            pca_dimensions = cached["pca_dimensions"].item()
+            pca_info = {"dimensions": pca_dimensions, "explained_variance": cached["explained_variance"].item()} if pca_dimensions else None
+            print(f"♻️ UMAP: variété réutilisée ({manifold_path.name})")
+            return cached["reduced"], cached["projection_2d"], {
+                "cached": True, "knn": cached["knn"].item(), "pca": pca_info, "seconds": 0.0
+            }
     
     def reduce_dimensions_umap(
         self, 
@@ -18,7 +289,7 @@ class ClusteringService:
         n_neighbors: int = 15,
         min_dist: float = 0.1,
         n_components: int = 50,
-        random_state: int = 42
+        random_state: Optional[int] = RANDOM_STATE
     ) -> np.ndarray:
         n_samples = len(vectors)
         n_neighbors = min(n_neighbors, n_samples - 1)
@@ -34,6 +305,7 @@ class ClusteringService:
             min_dist=min_dist,
             n_components=n_components,
             random_state=random_state,
+            n_jobs=self.n_jobs(random_state),
             metric='cosine'
         )
         
@@ -44,7 +316,9 @@ class ClusteringService:
         reduced_vectors: np.ndarray,
         min_cluster_size: int = 10,  # Augmenté de 5 à 10 pour moins de clusters
         min_samples: Optional[int] = None,
-        cluster_selection_epsilon: float = 0.2  # Nouveau paramètre pour fusionner clusters proches
+        cluster_selection_epsilon: float = 0.2,  # Nouveau paramètre pour fusionner clusters proches
+        core_dist_n_jobs: int = 4,  # Défaut de hdbscan ; -1 : tous les cœurs
+        hierarchy_path: Optional[Path] = None
     ) -> np.ndarray:
         n_samples = len(reduced_vectors)
         min_cluster_size = min(min_cluster_size, max(3, n_samples // 3))  # Plus conservateur
@@ -53,12 +327,158 @@ class ClusteringService:
             min_cluster_size=min_cluster_size,
             min_samples=min_samples,
             cluster_selection_epsilon=cluster_selection_epsilon,
+            core_dist_n_jobs=core_dist_n_jobs,
             metric='euclidean'
         )
         
         cluster_labels = clusterer.fit_predict(reduced_vectors)
+        
+        if hierarchy_path is not None:
+            # L'arbre ne dépend que de min_samples : min_cluster_size et epsilon se changent sans refaire HDBSCAN
+            hierarchy_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(hierarchy_path, "wb") as f:
+                np.savez(
+                    f, single_linkage_tree=clusterer.single_linkage_tree_.to_numpy(),
+                    min_cluster_size=min_cluster_size,
+                    min_samples=min_samples if min_samples is not None else min_cluster_size,
+                    cluster_selection_epsilon=cluster_selection_epsilon
+                )
+        
         return cluster_labels
     
+    def extract_clusters(
+        self,
+        hierarchy_path: Path,
+        min_cluster_sizes: List[int],
+        epsilons: List[float]
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Clusters plats de l'arbre HDBSCAN d'une analyse pour chaque couple (min_cluster_size, epsilon).
+        
+        L'arbre est condensé une fois par min_cluster_size (gardé dans condensed_tree_cache), puis les
+        clusters sont sélectionnés (EOM) pour chaque epsilon : ni UMAP ni le calcul des distances de
+        cœur ne sont refaits. min_samples reste celui de l'analyse. Les labels suivent l'ordre des
+        pages de l'analyse (-1 : bruit).
+        """
+        with np.load(hierarchy_path) as data:
+            tree_info = {
+                "min_samples": int(data["min_samples"]),
+                "min_cluster_size": int(data["min_cluster_size"]),
+                "cluster_selection_epsilon": float(data["cluster_selection_epsilon"])
+            }
+        
+        single_linkage_tree = None
+        
+        def condensed(min_cluster_size: int):
+            nonlocal single_linkage_tree
+            if single_linkage_tree is None:
+                with np.load(hierarchy_path) as data:
+                    single_linkage_tree = data["single_linkage_tree"]
+            condensed_tree = condense_tree(single_linkage_tree, min_cluster_size)
+            return condensed_tree, compute_stability(condensed_tree)
+        
+        results = []
+        for min_cluster_size in min_cluster_sizes:
+            condensed_tree, stability = condensed_tree_cache.get(
+                hierarchy_path, min_cluster_size, lambda: condensed(min_cluster_size)
+            )
+            # Racine de l'arbre condensé : son identifiant est le nombre de pages
+            tree_info["n_samples"] = int(condensed_tree["parent"].min())
+            for epsilon in epsilons:
+                labels = self._label_points(condensed_tree, self._select_clusters(condensed_tree, stability, epsilon))
+                sizes = np.bincount(labels[labels >= 0]) if (labels >= 0).any() else np.zeros(0, dtype=np.int64)
+                results.append({
+                    "min_cluster_size": min_cluster_size,
+                    "cluster_selection_epsilon": epsilon,
+                    "n_clusters": len(sizes),
+                    "noise_points": int(np.sum(labels == -1)),
+                    "cluster_sizes": sorted(sizes.tolist(), reverse=True),
+                    "labels": labels
+                })
+        
+        return tree_info, results
+    
+    def _select_clusters(self, condensed_tree: np.ndarray, stability: Dict[int, float], epsilon: float) -> List[int]:
+        """Clusters retenus par hdbscan (get_clusters : EOM, puis recherche epsilon), sans le
+        calcul des probabilités et du label de chaque point qui en font l'essentiel du coût.
+        Seul l'arbre des clusters (quelques centaines de nœuds) est parcouru."""
+        cluster_tree = condensed_tree[condensed_tree["child_size"] > 1]
+        if len(cluster_tree) == 0:
+            return []
+        
+        root = int(cluster_tree["parent"].min())
+        children: Dict[int, List[int]] = {}
+        birth: Dict[int, Tuple[int, float]] = {}
+        for parent, child, lambda_val in zip(cluster_tree["parent"].tolist(), cluster_tree["child"].tolist(), cluster_tree["lambda_val"].tolist()):
+            children.setdefault(parent, []).append(child)
+            birth[child] = (parent, lambda_val)
+        
+        def subtree(node: int) -> List[int]:
+            nodes, level = [], [node]
+            while level:
+                nodes.extend(level)
+                level = [child for parent in level for child in children.get(parent, [])]
+            return nodes
+        
+        # Excess of Mass, racine exclue ; stabilité des sous-arbres cumulée en float32 comme hdbscan
+        stability = dict(stability)
+        node_list = sorted(stability, reverse=True)[:-1]
+        is_cluster = {node: True for node in node_list}
+        for node in node_list:
+            subtree_stability = np.float32(0.0)
+            for child in children.get(node, []):
+                subtree_stability = np.float32(float(subtree_stability) + stability[child])
+            if subtree_stability > stability[node]:
+                is_cluster[node] = False
+                stability[node] = float(subtree_stability)
+            else:
+                for sub_node in subtree(node)[1:]:
+                    is_cluster[sub_node] = False
+        selected = [node for node in is_cluster if is_cluster[node]]
+        
+        if epsilon != 0.0:
+            if len(selected) == 1 and selected[0] == root:
+                return []
+            
+            def traverse_upwards(leaf: int) -> int:
+                while True:
+                    parent = birth[leaf][0]
+                    if parent == root:
+                        return leaf
+                    if 1.0 / birth[parent][1] > epsilon:
+                        return parent
+                    leaf = parent
+            
+            epsilon_selected, processed = [], set()
+            for leaf in set(selected):
+                if 1.0 / birth[leaf][1] < epsilon:
+                    if leaf not in processed:
+                        epsilon_child = traverse_upwards(leaf)
+                        epsilon_selected.append(epsilon_child)
+                        processed.update(subtree(epsilon_child)[1:])
+                else:
+                    epsilon_selected.append(leaf)
+            selected = list(set(epsilon_selected))
+        
+        return sorted(selected)
+    
+    def _label_points(self, condensed_tree: np.ndarray, selected: List[int]) -> np.ndarray:
+        """Label de chaque point : le cluster retenu le plus proche parmi ses ancêtres, -1 sinon
+        (même résultat que l'union-find de hdbscan, vectorisé sur les points)"""
+        points = condensed_tree[condensed_tree["child_size"] == 1]
+        cluster_tree = condensed_tree[condensed_tree["child_size"] > 1]
+        root = int(condensed_tree["parent"].min())
+        
+        node_labels = np.full(int(condensed_tree["parent"].max()) + 1, -1, dtype=np.int64)
+        cluster_labels = {cluster: label for label, cluster in enumerate(selected)}
+        # Identifiants des clusters croissants de la racine vers les feuilles : parent traité avant enfant
+        order = np.argsort(cluster_tree["child"])
+        for parent, child in zip(cluster_tree["parent"][order].tolist(), cluster_tree["child"][order].tolist()):
+            node_labels[child] = cluster_labels.get(child, node_labels[parent])
+        
+        labels = np.full(root, -1, dtype=np.int64)
+        labels[points["child"]] = node_labels[points["parent"]]
+        return labels
+    
     def cluster_kmeans(
         self,
         vectors: np.ndarray,
@@ -78,7 +498,7 @@ class ClusteringService:
         self,
         vectors: np.ndarray,
         method: str = "umap",
-        random_state: int = 42
+        random_state: Optional[int] = RANDOM_STATE
     ) -> np.ndarray:
         n_samples = len(vectors)
         
@@ -92,6 +512,7 @@ class ClusteringService:
                 min_dist=0.1,
                 n_components=2,
                 random_state=random_state,
+                n_jobs=self.n_jobs(random_state),
                 metric='cosine'
             )
         elif method == "pca":
@@ -145,26 +566,60 @@ class ClusteringService:
     
     def full_clustering_analysis(
         self,
-        vectors: np.ndarray,
+        vectors: VectorStore,
         node_ids: List[str],
         urls: List[str],
         clustering_method: str = "auto",
-        n_clusters: Optional[int] = None
+        n_clusters: Optional[int] = None,
+        manifold_path: Optional[Path] = None,
+        knn_graph: Optional[NeighborGraph] = None,
+        mode: Optional[str] = None,
+        hierarchy_path: Optional[Path] = None,
+        reuse_manifold: bool = False,
+        min_cluster_size: Optional[int] = None,
+        cluster_selection_epsilon: float = 0.3
     ) -> Dict[str, Any]:
+        mode = mode or self.mode
+        if mode not in CLUSTERING_MODES:
+            raise ValueError(f"Mode de clustering invalide: {mode} (attendu: {', '.join(CLUSTERING_MODES)})")
+        
+        # UMAP, HDBSCAN et K-means travaillent en float32 : déquantification par blocs si besoin
+        vectors = to_float32(vectors)
         n_samples = len(vectors)
+        # fast : pas de graine (UMAP parallèle), distances de cœur HDBSCAN sur CLUSTERING_WORKERS cœurs
+        random_state = RANDOM_STATE if mode == "reproducible" else None
         
         # Pour les petits datasets, utiliser K-means
         if clustering_method == "auto":
             clustering_method = "kmeans" if n_samples < 10 else "hdbscan"
         
-        if clustering_method == "hdbscan" and n_samples >= 10:
+        # Un seul graphe de voisins UMAP pour la réduction 50-D et la projection 2D
+        projection_2d = None
+        manifold_info = None
+        if n_samples >= 10 and reuse_manifold:
+            # Re-clustering d'une analyse : sa variété enregistrée remplace UMAP
+            reduced_vectors, projection_2d, manifold_info = self.load_manifold(manifold_path, n_samples)
+        elif n_samples >= 10:
+            try:
+                with self.parallelism(mode):
+                    reduced_vectors, projection_2d, manifold_info = self.reduce_and_project(
+                        vectors, manifold_path, random_state=random_state, knn_graph=knn_graph,
+                        pca_dimensions=self.pca_dimensions
+                    )
+            except Exception as e:
+                print(f"UMAP failed: {e}")
+                if clustering_method == "hdbscan":
+                    clustering_method = "kmeans"
+        
+        if clustering_method == "hdbscan" and projection_2d is not None:
             try:
-                reduced_vectors = self.reduce_dimensions_umap(vectors)
                 # Paramètres ajustés pour moins de clusters
                 cluster_labels = self.cluster_hdbscan(
                     reduced_vectors,
-                    min_cluster_size=max(10, n_samples // 15),  # Taille min adaptée
-                    cluster_selection_epsilon=0.3  # Plus de fusion
+                    min_cluster_size=min_cluster_size or max(10, n_samples // 15),  # Taille min adaptée
+                    cluster_selection_epsilon=cluster_selection_epsilon,  # 0.3 par défaut : plus de fusion
+                    core_dist_n_jobs=self.n_jobs(random_state) if mode == "fast" else 4,
+                    hierarchy_path=hierarchy_path
                 )
             except Exception as e:
                 print(f"HDBSCAN failed, falling back to K-means: {e}")
@@ -181,11 +636,8 @@ class ClusteringService:
             vectors, node_ids, urls, cluster_labels, min_size_threshold
         )
         
-        # Projection 2D avec gestion des petits datasets
-        try:
-            projection_2d = self.project_2d(vectors, method="umap")
-        except Exception as e:
-            print(f"UMAP failed, falling back to PCA: {e}")
+        # Projection 2D : PCA pour les petits datasets ou si UMAP a échoué
+        if projection_2d is None:
             projection_2d = self.project_2d(vectors, method="pca")
         
         projection_data = []
@@ -204,7 +656,9 @@ class ClusteringService:
             "projection_2d": projection_data,
             "n_clusters": len([c for c in clusters if c["cluster_id"] != -1]),
             "noise_points": int(np.sum(cluster_labels == -1)),
-            "method_used": clustering_method
+            "method_used": clustering_method,
+            "clustering_mode": mode,
+            "manifold": manifold_info
         }
     
     def save_clustering_results(self, project_id: str, results: Dict[str, Any]) -> str:
@@ -15,7 +15,8 @@ class DatabaseService:
         name: str, 
         description: str = None,
         total_pages: int = 0,
-        total_links: int = 0
+        total_links: int = 0,
+        clustering_mode: Optional[str] = None
     ) -> Project:
         """Créer un nouveau projet"""
         db = get_db_session()
@@ -26,6 +27,7 @@ class DatabaseService:
                 description=description,
                 total_pages=total_pages,
                 total_links=total_links,
+                clustering_mode=clustering_mode,
                 status="created"
             )
             db.add(project)
@@ -63,13 +65,28 @@ class DatabaseService:
         finally:
             db.close()
     
+    def update_project_clustering_mode(self, project_id: str, clustering_mode: str) -> bool:
+        """Changer le mode d'exécution du clustering d'un projet (analyses suivantes)"""
+        db = get_db_session()
+        try:
+            project = db.query(Project).filter(Project.id == project_id).first()
+            if not project:
+                return False
+            project.clustering_mode = clustering_mode
+            project.updated_at = datetime.utcnow()
+            db.commit()
+            return True
+        finally:
+            db.close()
+    
     def create_analysis(
         self,
         project_id: str,
         analysis_type: str = "full",
         embedding_model: str = "BAAI/bge-m3",
         clustering_method: str = "hdbscan",
-        min_cluster_size: int = 10
+        min_cluster_size: int = 10,
+        clustering_mode: Optional[str] = None
     ) -> Analysis:
         """Créer une nouvelle analyse"""
         db = get_db_session()
@@ -80,6 +97,7 @@ class DatabaseService:
                 embedding_model=embedding_model,
                 clustering_method=clustering_method,
                 min_cluster_size=min_cluster_size,
+                clustering_mode=clustering_mode,
                 status="pending"
             )
             db.add(analysis)
@@ -107,6 +125,18 @@ class DatabaseService:
         finally:
             db.close()
     
+    def get_latest_indexed_analysis(self, project_id: str) -> Optional[Analysis]:
+        """Dernière analyse terminée d'un projet dont l'index FAISS a été enregistré"""
+        db = get_db_session()
+        try:
+            return db.query(Analysis).filter(
+                Analysis.project_id == project_id,
+                Analysis.status == "completed",
+                Analysis.faiss_index_path.isnot(None)
+            ).order_by(Analysis.created_at.desc()).first()
+        finally:
+            db.close()
+    
     def list_analyses(self, project_id: str = None) -> List[Analysis]:
         """Lister les analyses (optionnel: pour un projet spécifique)"""
         db = get_db_session()
@@ -140,9 +170,15 @@ class DatabaseService:
                     analysis.clusters_data = results["clusters"]
                 if "projection_2d" in results:
                     analysis.projection_data = results["projection_2d"]
-                if "anomalies" in results:
-                    analysis.total_anomalies = len(results["anomalies"])
-                    analysis.anomalies_data = results["anomalies"]
+                if "index" in results:
+                    analysis.index_type = results["index"]["type"]
+                    analysis.index_params = results["index"]["params"]
+                    analysis.index_recall = results["index"].get("recall_at_k")
+                # "proximities" : clé des résultats du pipeline
+                anomalies = results.get("anomalies", results.get("proximities"))
+                if anomalies is not None:
+                    analysis.total_anomalies = len(anomalies)
+                    analysis.anomalies_data = anomalies
                 
                 # Chemins des fichiers
                 if "embeddings_path" in results:
@@ -175,6 +211,7 @@ class DatabaseService:
                 "updated_at": project.updated_at.isoformat(),
                 "total_pages": project.total_pages,
                 "total_links": project.total_links,
+                "clustering_mode": project.clustering_mode,
                 "status": project.status
             },
             "latest_analysis": {
@@ -184,10 +221,14 @@ class DatabaseService:
                 "embedding_model": latest_analysis.embedding_model,
                 "clustering_method": latest_analysis.clustering_method,
                 "min_cluster_size": latest_analysis.min_cluster_size,
+                "clustering_mode": latest_analysis.clustering_mode,
                 "total_embeddings": latest_analysis.total_embeddings,
                 "embedding_dimensions": latest_analysis.embedding_dimensions,
                 "total_clusters": latest_analysis.total_clusters,
                 "total_anomalies": latest_analysis.total_anomalies,
+                "index_type": latest_analysis.index_type,
+                "index_params": latest_analysis.index_params,
+                "index_recall": latest_analysis.index_recall,
                 "status": latest_analysis.status,
                 "error_message": latest_analysis.error_message,
                 "clusters_data": latest_analysis.clusters_data,
@@ -0,0 +1,227 @@
+import argparse
+import hashlib
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+
+WHITESPACE_RE = re.compile(r"\s+")
+# Limite de paramètres d'une requête SQLite
+SQL_BATCH = 900
+
+def normalize_text(text: str) -> str:
+    """Normalisation avant hachage : Unicode NFKC et espaces fusionnés"""
+    return WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+def text_key(model: str, text: str) -> bytes:
+    """Clé de cache adressée par contenu : (modèle, texte normalisé)"""
+    payload = f"{model}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+def parse_size(value: str) -> int:
+    """'500M', '10G' ou un nombre d'octets"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+class EmbeddingCache:
+    """Cache local d'embeddings partagé entre projets et analyses.
+    
+    Les vecteurs sont stockés par shards .npy (un par lot de vecteurs ajoutés) et
+    un index SQLite associe chaque clé de contenu à (shard, ligne). L'éviction
+    supprime des shards entiers, du moins récemment utilisé au plus récent.
+    """
+    
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_size: Optional[int] = None,
+        dtype: Optional[str] = None
+    ):
+        self.cache_dir = Path(cache_dir or settings.EMBEDDING_CACHE_DIR or Path(settings.DATA_DIR) / "embedding_cache")
+        self.max_size = settings.EMBEDDING_CACHE_MAX_SIZE if max_size is None else max_size
+        self.dtype = np.dtype(dtype or settings.EMBEDDING_CACHE_DTYPE)
+        self.shards_dir = self.cache_dir / "shards"
+        self.shards_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / "index.db"
+        self._init_index()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=30)
+    
+    def _init_index(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shards ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, rows INTEGER, bytes INTEGER, last_used REAL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, shard_id INTEGER, row INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_shard ON entries (shard_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+    
+    def get(self, keys: List[bytes]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Renvoie (masque des hits, vecteurs float32 des hits dans l'ordre des clés)"""
+        locations = {}
+        with closing(self._connect()) as conn:
+            for start in range(0, len(keys), SQL_BATCH):
+                batch = keys[start:start + SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, shard_id, row FROM entries WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                locations.update((key, (shard_id, row)) for key, shard_id, row in rows)
+            
+            shard_files = dict(conn.execute("SELECT id, filename FROM shards").fetchall())
+        
+        hit_mask = np.array([key in locations for key in keys], dtype=bool)
+        hit_keys = [key for key in keys if key in locations]
+        
+        vectors = None
+        if hit_keys:
+            shard_ids = np.array([locations[key][0] for key in hit_keys])
+            rows = np.array([locations[key][1] for key in hit_keys])
+            
+            for shard_id in np.unique(shard_ids):
+                shard = np.load(self.shards_dir / shard_files[shard_id], mmap_mode="r")
+                if vectors is None:
+                    vectors = np.empty((len(hit_keys), shard.shape[1]), dtype=np.float32)
+                selected = shard_ids == shard_id
+                vectors[selected] = shard[rows[selected]]
+        
+        with closing(self._connect()) as conn, conn:
+            if hit_keys:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE shards SET last_used = ? WHERE id = ?",
+                    [(now, int(shard_id)) for shard_id in np.unique(shard_ids)]
+                )
+            self._increment_stats(conn, hits=len(hit_keys), misses=len(keys) - len(hit_keys))
+        
+        return hit_mask, vectors
+    
+    def put(self, keys: List[bytes], vectors: np.ndarray):
+        """Ajouter un lot de vecteurs dans un nouveau shard, puis appliquer la limite de taille"""
+        if not keys:
+            return
+        
+        # Une seule ligne par clé, même si un texte revient plusieurs fois dans le lot
+        first_rows = {}
+        for row, key in enumerate(keys):
+            first_rows.setdefault(key, row)
+        keys = list(first_rows)
+        
+        shard = np.ascontiguousarray(vectors[list(first_rows.values())], dtype=self.dtype)
+        filename = f"{time.time_ns()}.npy"
+        tmp_path = self.shards_dir / f"{filename}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, shard)
+        tmp_path.replace(self.shards_dir / filename)
+        
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO shards (filename, rows, bytes, last_used) VALUES (?, ?, ?, ?)",
+                (filename, len(shard), (self.shards_dir / filename).stat().st_size, time.time())
+            )
+            shard_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO entries (key, shard_id, row) VALUES (?, ?, ?)",
+                [(key, shard_id, row) for row, key in enumerate(keys)]
+            )
+        
+        if self.max_size:
+            self.evict(self.max_size)
+    
+    def evict(self, max_size: int) -> Dict[str, int]:
+        """Supprimer les shards les moins récemment utilisés jusqu'à repasser sous max_size octets"""
+        evicted_shards = 0
+        evicted_bytes = 0
+        
+        with closing(self._connect()) as conn, conn:
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM shards").fetchone()[0]
+            if total <= max_size:
+                return {"evicted_shards": 0, "evicted_bytes": 0}
+            
+            for shard_id, filename, size in conn.execute(
+                "SELECT id, filename, bytes FROM shards ORDER BY last_used ASC"
+            ).fetchall():
+                if total <= max_size:
+                    break
+                
+                conn.execute("DELETE FROM entries WHERE shard_id = ?", (shard_id,))
+                conn.execute("DELETE FROM shards WHERE id = ?", (shard_id,))
+                (self.shards_dir / filename).unlink(missing_ok=True)
+                
+                total -= size
+                evicted_shards += 1
+                evicted_bytes += size
+        
+        print(f"🧹 EMBEDDING_CACHE: {evicted_shards} shards évincés ({evicted_bytes} octets)")
+        
+        return {"evicted_shards": evicted_shards, "evicted_bytes": evicted_bytes}
+    
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM shards")
+            conn.execute("DELETE FROM stats")
+        
+        for path in self.shards_dir.glob("*.npy*"):
+            path.unlink()
+    
+    def _increment_stats(self, conn: sqlite3.Connection, **counters: int):
+        conn.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(counters.items())
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            shards, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM shards").fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": entries,
+            "shards": shards,
+            "bytes": total_bytes,
+            "max_size": self.max_size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestion du cache local d'embeddings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Afficher taille et statistiques hit/miss")
+    prune_parser = subparsers.add_parser("prune", help="Évincer les shards les plus anciens")
+    prune_parser.add_argument("--max-size", type=parse_size, default=None, help="Taille cible, ex: 5G (défaut: EMBEDDING_CACHE_MAX_SIZE)")
+    subparsers.add_parser("clear", help="Vider entièrement le cache")
+    args = parser.parse_args()
+    
+    cache = EmbeddingCache()
+    
+    if args.command == "prune":
+        max_size = cache.max_size if args.max_size is None else args.max_size
+        print(cache.evict(max_size))
+    elif args.command == "clear":
+        cache.clear()
+    
+    for name, value in cache.stats().items():
+        print(f"{name}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,427 @@
 import httpx
 import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+from collections import deque
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+from numpy.lib.format import open_memmap
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from app.core.config import settings
 from app.models.schemas import EmbeddingItem, EmbeddingBatch
+from app.services.embedding_cache import EmbeddingCache, text_key
+from app.services.chunking import POOLING_MODES, pool_chunks, split_texts
+from app.services.quantization import STORAGE_MODES, open_vectors, quantize_file
+
+# Matrice (n, dim) float32 / float16 / int8 et fichier compagnon des identifiants, ligne à ligne
+EMBEDDINGS_FILENAME = "embeddings.npy"
+EMBEDDINGS_IDS_FILENAME = "embeddings_ids.parquet"
+# Échelles par dimension du stockage int8
+EMBEDDINGS_SCALE_FILENAME = "embeddings_scale.npy"
+# Mode CHUNKING : vecteurs des segments (float32) et offsets des segments de chaque page
+EMBEDDINGS_CHUNKS_FILENAME = "embeddings_chunks.npy"
+EMBEDDINGS_CHUNK_OFFSETS_FILENAME = "embeddings_chunk_offsets.npy"
+# Formats de transport des vecteurs, du plus compact au plus universel
+EMBED_ENCODINGS = ("raw", "base64", "json")
+RAW_CONTENT_TYPE = "application/octet-stream"
+# Bornes (secondes) de l'histogramme des latences par requête
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Latences récentes servant au calcul du délai de duplication, et minimum avant de dupliquer
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 10
+# Délai d'une requête : multiple du délai de duplication, plafonné par EMBED_REQUEST_TIMEOUT_SECONDS
+REQUEST_TIMEOUT_FACTOR = 4
+
+def decode_embeddings(body: bytes, content_type: str, n_items: int) -> Tuple[np.ndarray, str]:
+    """Vecteurs float32 (n, dim) d'une réponse /v1/embeddings, et le format reçu.
+    
+    raw : corps float32 little-endian ; base64 : champ embedding encodé (encoding_format
+    OpenAI) ; json : listes de floats. Les deux premiers sont lus sans objets Python par valeur.
+    """
+    if content_type.startswith(RAW_CONTENT_TYPE):
+        values = np.frombuffer(body, dtype="<f4")
+        if n_items == 0 or len(values) % n_items:
+            raise Exception(f"API returned {len(values)} floats for {n_items} items")
+        return values.reshape(n_items, -1), "raw"
+    
+    # Format OpenAI : result["data"][i]["embedding"]
+    data = json.loads(body).get("data", [])
+    if len(data) != n_items:
+        raise Exception(f"API returned {len(data)} vectors for {n_items} items")
+    
+    if data and isinstance(data[0]["embedding"], str):
+        buffer = b"".join(base64.b64decode(item["embedding"]) for item in data)
+        return np.frombuffer(buffer, dtype="<f4").reshape(n_items, -1), "base64"
+    
+    return np.array([item["embedding"] for item in data], dtype=np.float32).reshape(n_items, -1), "json"
+
+class EmbeddingTransientError(Exception):
+    """Erreur passagère (timeout, connexion, 5xx) : le batch peut être renvoyé"""
+
+class EmbeddingServiceBusy(EmbeddingTransientError):
+    """Réponse 429/503 : le service demande de ralentir"""
+    
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"API Error {status_code}: service saturé")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdaptiveConcurrency:
+    """Nombre de batches en vol ajusté en AIMD : hausse additive tant que la latence
+    reste proche de la meilleure observée, division par deux sur 429/503"""
+    
+    def __init__(self, initial: int, maximum: int):
+        self.limit = float(max(1, min(initial, maximum)))
+        self.maximum = maximum
+        self.in_flight = 0
+        self.best_latency = None
+        self._condition = asyncio.Condition()
+    
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+    
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+    
+    def on_success(self, latency: float):
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+        
+        if latency > 2 * self.best_latency:
+            # Les requêtes font la queue côté serveur : inutile d'en ajouter
+            self.limit = max(1.0, self.limit - 1)
+        else:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+    
+    def on_overload(self):
+        self.limit = max(1.0, self.limit / 2)
+
+class LatencyTracker:
+    """Latences des requêtes réussies : histogramme cumulé, et percentile glissant
+    servant de délai au-delà duquel un batch est dupliqué, puis abandonné"""
+    
+    def __init__(self, percentile: float, min_deadline: float, initial_deadline: float, max_timeout: float):
+        self.percentile = percentile
+        self.min_deadline = min_deadline
+        self.initial_deadline = initial_deadline
+        self.max_timeout = max_timeout
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+        self.counts = np.zeros(len(LATENCY_BUCKETS) + 1, dtype=np.int64)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+    
+    def record(self, latency: float):
+        self.recent.append(latency)
+        self.counts[np.searchsorted(LATENCY_BUCKETS, latency)] += 1
+    
+    def deadline(self) -> float:
+        """Délai de duplication ; délai initial tant que les latences observées sont trop peu nombreuses"""
+        if len(self.recent) < HEDGE_MIN_SAMPLES:
+            return max(self.min_deadline, self.initial_deadline)
+        return max(self.min_deadline, float(np.percentile(self.recent, self.percentile)))
+    
+    def request_timeout(self) -> float:
+        return min(self.max_timeout, REQUEST_TIMEOUT_FACTOR * self.deadline())
+    
+    def summary(self) -> Dict[str, Any]:
+        deadline = self.deadline()
+        bounds = [*LATENCY_BUCKETS, "+Inf"]
+        
+        return {
+            "requests": int(self.counts.sum()),
+            "histogram": [{"le": bound, "count": int(count)} for bound, count in zip(bounds, self.counts)],
+            "deadline_seconds": round(deadline, 3),
+            "request_timeout_seconds": round(self.request_timeout(), 3),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries
+        }
+
+class CircuitBreaker:
+    """Suspend les envois après N échecs transitoires consécutifs.
+    
+    Après la pause, un seul nouvel échec suffit à rouvrir le circuit ; un succès le referme.
+    """
+    
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.opened = 0
+    
+    async def wait(self):
+        delay = self.open_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def on_success(self):
+        self.failures = 0
+    
+    def on_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown
+            self.opened += 1
+            self.failures = self.failure_threshold - 1
+            print(f"🔌 EMBED_BATCH: Service instable, envois suspendus {self.cooldown:.0f}s")
+
+class BatchPlanner:
+    """Forme les batches à la demande selon un budget de caractères (approximation des tokens).
+    
+    Les textes sont triés par longueur décroissante : chaque batch regroupe des textes
+    de taille proche (moins de padding côté serveur) et les plus lourds partent en premier.
+    Le budget est réajusté après chaque batch pour viser une latence cible.
+    """
+    
+    def __init__(
+        self,
+        positions: np.ndarray,
+        lengths: np.ndarray,
+        char_budget: int,
+        max_items: int,
+        target_seconds: float
+    ):
+        order = np.argsort(-lengths[positions], kind="stable")
+        self.positions = positions[order]
+        self.lengths = lengths[self.positions]
+        self.cursor = 0
+        self.char_budget = char_budget
+        self.min_budget = max(1, char_budget // 16)
+        self.max_budget = char_budget * 4
+        self.max_items = max_items
+        self.target_seconds = target_seconds
+        self.batches_planned = 0
+        self.timings = []
+    
+    def next_batch(self) -> Optional[np.ndarray]:
+        if self.cursor >= len(self.positions):
+            return None
+        
+        window = np.cumsum(self.lengths[self.cursor:self.cursor + self.max_items])
+        # Au moins un texte, même s'il dépasse le budget à lui seul
+        size = max(1, int(np.searchsorted(window, self.char_budget, side="right")))
+        
+        batch = self.positions[self.cursor:self.cursor + size]
+        self.cursor += size
+        self.batches_planned += 1
+        return batch
+    
+    def estimated_total_batches(self) -> int:
+        remaining_chars = int(self.lengths[self.cursor:].sum())
+        remaining_items = len(self.positions) - self.cursor
+        remaining = max(-(-remaining_chars // self.char_budget), -(-remaining_items // self.max_items))
+        return self.batches_planned + remaining
+    
+    def record(self, items: int, chars: int, seconds: float, concurrency: int):
+        self.timings.append({
+            "batch": len(self.timings) + 1,
+            "items": items,
+            "chars": chars,
+            "seconds": round(seconds, 4),
+            "chars_per_second": round(chars / seconds, 1) if seconds > 0 else None,
+            "char_budget": self.char_budget,
+            "concurrency": concurrency
+        })
+        
+        # Correction amortie (racine du ratio) vers la latence cible
+        ratio = min(2.0, max(0.5, self.target_seconds / max(seconds, 1e-3)))
+        new_budget = int(self.char_budget * ratio ** 0.5)
+        self.char_budget = min(self.max_budget, max(self.min_budget, new_budget))
+    
+    def timing_summary(self) -> Dict[str, Any]:
+        if not self.timings:
+            return {"batches": 0}
+        
+        seconds = np.array([t["seconds"] for t in self.timings])
+        chars = sum(t["chars"] for t in self.timings)
+        
+        return {
+            "batches": len(self.timings),
+            "mean_seconds": round(float(seconds.mean()), 3),
+            "p50_seconds": round(float(np.percentile(seconds, 50)), 3),
+            "p95_seconds": round(float(np.percentile(seconds, 95)), 3),
+            "max_seconds": round(float(seconds.max()), 3),
+            "chars_per_second": round(chars / float(seconds.sum()), 1) if seconds.sum() > 0 else None,
+            "final_char_budget": self.char_budget
+        }
+
+class EmbeddingCheckpoint:
+    """Points de reprise d'un job d'embeddings.
+    
+    Chaque batch terminé est écrit dans la matrice partielle (.npy mappé) puis marqué
+    dans un fichier d'un octet par ligne, comme les chunks d'upload. Le manifeste
+    identifie le job (modèle + empreinte des textes) : relancé sur les mêmes pages,
+    le job ne redemande que les lignes manquantes.
+    """
+    
+    def __init__(self, project_dir: Path, model: str, keys: List[bytes]):
+        self.vectors_path = project_dir / "embeddings.partial.npy"
+        self.done_path = project_dir / "embeddings.partial.done"
+        self.manifest_path = project_dir / "embeddings.partial.json"
+        self.model = model
+        self.total = len(keys)
+        self.fingerprint = hashlib.blake2b(b"".join(keys), digest_size=16).hexdigest()
+        self.vectors = None
+        self.done = None
+    
+    def resume(self) -> np.ndarray:
+        """Masque des lignes déjà calculées ; un checkpoint d'un autre job est supprimé"""
+        manifest = None
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        
+        resumable = (
+            manifest is not None
+            and manifest["model"] == self.model
+            and manifest["fingerprint"] == self.fingerprint
+            and manifest["total"] == self.total
+            and self.vectors_path.exists()
+            and self.done_path.exists()
+        )
+        
+        if not resumable:
+            self.discard()
+            return np.zeros(self.total, dtype=bool)
+        
+        self.vectors = open_memmap(self.vectors_path, mode="r+")
+        self.done = np.memmap(self.done_path, dtype=np.uint8, mode="r+", shape=(self.total,))
+        return self.done.astype(bool)
+    
+    def write(self, positions: np.ndarray, vectors: np.ndarray):
+        """Écrire un batch, puis le marquer terminé une fois les vecteurs sur disque"""
+        if self.vectors is None:
+            self._allocate(vectors.shape[1])
+        
+        self.vectors[positions] = vectors
+        self.vectors.flush()
+        self.done[positions] = 1
+        self.done.flush()
+    
+    def _allocate(self, dimensions: int):
+        self.vectors = open_memmap(self.vectors_path, mode="w+", dtype=np.float32, shape=(self.total, dimensions))
+        with open(self.done_path, "wb") as f:
+            f.truncate(self.total)
+        self.done = np.memmap(self.done_path, dtype=np.uint8, mode="r+", shape=(self.total,))
+        
+        # Manifeste écrit en dernier : il n'existe que si les fichiers sont utilisables
+        with open(self.manifest_path, "w") as f:
+            json.dump({
+                "model": self.model,
+                "fingerprint": self.fingerprint,
+                "total": self.total,
+                "dimensions": dimensions
+            }, f)
+    
+    def fan_out(self, rows: np.ndarray, sources: np.ndarray, block_rows: int = 65536):
+        """Recopier le vecteur de la ligne sources[i] sur la ligne rows[i], par blocs"""
+        for start in range(0, len(rows), block_rows):
+            self.vectors[rows[start:start + block_rows]] = self.vectors[sources[start:start + block_rows]]
+    
+    def finalize(self, target_path: Path):
+        """Publier la matrice complète sous son nom final et supprimer le checkpoint"""
+        if self.vectors is None:
+            np.save(self.vectors_path, np.empty((0, 384), dtype=np.float32))
+        else:
+            self.vectors.flush()
+        self.vectors = None
+        self.done = None
+        
+        self.vectors_path.replace(target_path)
+        self.done_path.unlink(missing_ok=True)
+        self.manifest_path.unlink(missing_ok=True)
+    
+    def discard(self):
+        self.vectors = None
+        self.done = None
+        for path in (self.manifest_path, self.done_path, self.vectors_path):
+            path.unlink(missing_ok=True)
 
 class EmbeddingsService:
     def __init__(self):
         self.endpoint = settings.EMBEDDINGS_ENDPOINT
+        self.model = settings.EMBEDDING_MODEL
         self.batch_size = settings.EMBED_BATCH
+        self.batch_chars = settings.EMBED_BATCH_CHARS
+        self.target_batch_seconds = settings.EMBED_TARGET_BATCH_SECONDS
+        self.concurrency = settings.EMBED_CONCURRENCY
+        self.max_concurrency = settings.EMBED_MAX_CONCURRENCY
+        self.chunking = settings.CHUNKING
+        self.chunk_size = settings.CHUNK_SIZE
+        self.chunk_overlap = min(settings.CHUNK_OVERLAP, settings.CHUNK_SIZE // 2)
+        self.chunk_pooling = settings.CHUNK_POOLING
+        if self.chunk_pooling not in POOLING_MODES:
+            raise ValueError(f"CHUNK_POOLING invalide: {self.chunk_pooling} (attendu: {', '.join(POOLING_MODES)})")
+        self.keep_chunk_vectors = settings.CHUNK_KEEP_VECTORS
+        self.hedge = settings.EMBED_HEDGE
+        # Format demandé au service ; "auto" propose raw puis base64, le JSON restant accepté
+        self.encoding = settings.EMBED_ENCODING
+        if self.encoding not in ("auto", *EMBED_ENCODINGS):
+            raise ValueError(f"EMBED_ENCODING invalide: {self.encoding} (attendu: auto, {', '.join(EMBED_ENCODINGS)})")
+        self.transport_format = None
+        self.retries = max(1, settings.EMBED_RETRIES)
+        self.request_timeout = settings.EMBED_REQUEST_TIMEOUT_SECONDS
         self.data_dir = Path(settings.DATA_DIR)
+        self.storage_mode = settings.VECTOR_STORAGE
+        if self.storage_mode not in STORAGE_MODES:
+            raise ValueError(f"VECTOR_STORAGE invalide: {self.storage_mode} (attendu: {', '.join(STORAGE_MODES)})")
+        self.cache = EmbeddingCache() if settings.EMBEDDING_CACHE else None
+        self._client = None
+        self._client_loop = None
         print(f"🏗️ EMBEDDINGS_SERVICE: Initialized with FORCED batch_size = {self.batch_size}")
     
-    async def embed_batch(self, items: List[EmbeddingItem]) -> List[List[float]]:
-        print(f"🚀 EMBED_BATCH: Starting with {len(items)} items using REAL API")
-        
+    def _get_client(self) -> httpx.AsyncClient:
+        """Client HTTP unique et persistant (keep-alive) pour la boucle asyncio courante"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                # Plafond ; les batches d'un job ont un délai tiré des latences observées
+                timeout=self.request_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._client_loop = loop
+        return self._client
+    
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _transport_request(self, encoding: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Champs du payload et en-têtes négociant le format de transport des vecteurs"""
+        if encoding == "json":
+            return {}, {"Accept": "application/json"}
+        if encoding == "base64":
+            return {"encoding_format": "base64"}, {"Accept": "application/json"}
+        if encoding == "raw":
+            return {"encoding_format": "base64"}, {"Accept": RAW_CONTENT_TYPE}
+        return {"encoding_format": "base64"}, {"Accept": f"{RAW_CONTENT_TYPE}, application/json;q=0.9"}
+    
+    def _fall_back_to_json(self, encoding: str, status_code: int):
+        if self.encoding != "json":
+            print(f"↩️ EMBED_BATCH: Format {encoding} refusé ({status_code}), repli définitif sur JSON")
+            self.encoding = "json"
+    
+    async def embed_batch(
+        self,
+        items: List[EmbeddingItem],
+        encoding: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> np.ndarray:
         # Préparer les données pour l'API v1/embeddings (format OpenAI-compatible)
         api_items = []
         for item in items:
@@ -25,43 +430,164 @@ class EmbeddingsService:
                 "value": item.value  # Le contenu est déjà extrait et nettoyé
             })
         
+        # Format figé pour cette requête : un repli JSON peut survenir pendant qu'elle est en vol
+        encoding = encoding or self.encoding
+        encoding_fields, accept_headers = self._transport_request(encoding)
         payload = {
-            "model": "BAAI/bge-m3",
-            "input": api_items
+            "model": self.model,
+            "input": api_items,
+            **encoding_fields
         }
         
         full_url = f"{self.endpoint}/v1/embeddings"
-        print(f"🔄 EMBED_BATCH: Calling API with {len(api_items)} items")
-        print(f"🌐 EMBED_BATCH: Full URL: {full_url}")
-        print(f"📝 EMBED_BATCH: Payload: {payload}")
+        print(f"🔄 EMBED_BATCH: Calling {full_url} with {len(api_items)} items")
         
         try:
-            async with httpx.AsyncClient(timeout=3600.0) as client:  # 1h timeout
-                response = await client.post(
-                    full_url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                print(f"🔍 EMBED_BATCH: API Response status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    # Format OpenAI : result["data"][i]["embedding"]
-                    vectors = [item["embedding"] for item in result.get("data", [])]
-                    print(f"✅ EMBED_BATCH: Successfully got {len(vectors)} vectors from API")
-                    return vectors
-                else:
-                    error_text = response.text
-                    print(f"❌ EMBED_BATCH: API Error {response.status_code}: {error_text}")
-                    raise Exception(f"API Error {response.status_code}: {error_text}")
-                    
+            response = await self._get_client().post(
+                full_url,
+                json=payload,
+                headers={"Content-Type": "application/json", **accept_headers},
+                timeout=httpx.Timeout(timeout or self.request_timeout)
+            )
         except httpx.TimeoutException as e:
             print(f"⏰ EMBED_BATCH: Timeout error: {str(e)}")
-            raise Exception(f"Timeout calling embeddings API: {str(e)}")
+            raise EmbeddingTransientError(f"Timeout calling embeddings API: {str(e)}")
+        except httpx.TransportError as e:
+            print(f"📡 EMBED_BATCH: Connection error: {type(e).__name__}: {str(e)}")
+            raise EmbeddingTransientError(f"Connection error calling embeddings API: {str(e)}")
         except Exception as e:
             print(f"💥 EMBED_BATCH: Unexpected error: {type(e).__name__}: {str(e)}")
             raise Exception(f"Error calling embeddings API: {str(e)}")
+        
+        if response.status_code == 200:
+            vectors, transport_format = decode_embeddings(
+                response.content, response.headers.get("Content-Type", ""), len(items)
+            )
+            if transport_format != self.transport_format:
+                print(f"📦 EMBED_BATCH: Vecteurs reçus au format {transport_format}")
+                self.transport_format = transport_format
+            return vectors
+        
+        if response.status_code in (400, 422) and encoding != "json":
+            error_text = response.text
+            if "encoding_format" in error_text:
+                # Service qui refuse encoding_format : retour définitif au JSON
+                self._fall_back_to_json(encoding, response.status_code)
+                return await self.embed_batch(items, timeout=timeout)
+            
+            # Erreur sans rapport apparent avec le format (entrée invalide, trop longue...) :
+            # le même batch renvoyé en JSON tranche, l'erreur d'origine remonte s'il échoue aussi
+            try:
+                vectors = await self.embed_batch(items, encoding="json", timeout=timeout)
+            except EmbeddingTransientError:
+                raise
+            except Exception:
+                print(f"❌ EMBED_BATCH: API Error {response.status_code}: {error_text}")
+                raise Exception(f"API Error {response.status_code}: {error_text}")
+            self._fall_back_to_json(encoding, response.status_code)
+            return vectors
+        
+        if response.status_code in (429, 503):
+            retry_after = response.headers.get("Retry-After")
+            print(f"🐢 EMBED_BATCH: API busy ({response.status_code}), retry-after={retry_after}")
+            raise EmbeddingServiceBusy(
+                response.status_code,
+                float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        
+        error_text = response.text
+        print(f"❌ EMBED_BATCH: API Error {response.status_code}: {error_text}")
+        if response.status_code >= 500:
+            raise EmbeddingTransientError(f"API Error {response.status_code}: {error_text}")
+        raise Exception(f"API Error {response.status_code}: {error_text}")
+    
+    async def _embed_hedged(self, items: List[EmbeddingItem], tracker: LatencyTracker) -> np.ndarray:
+        """Requête dupliquée si le batch dépasse le percentile des latences observées :
+        la première réponse valide l'emporte, l'autre requête est annulée.
+        Sans réponse request_timeout secondes après le dernier envoi, le batch est abandonné
+        en erreur transitoire (backoff et nouvel essai)."""
+        deadline = tracker.deadline()
+        timeout = tracker.request_timeout()
+        primary = asyncio.create_task(self.embed_batch(items, timeout=timeout))
+        tasks = {primary}
+        give_up = time.monotonic() + timeout
+        
+        try:
+            if self.hedge and deadline < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=deadline)
+                if not done:
+                    print(f"🐇 EMBED_BATCH: {len(items)} items au-delà de {deadline:.1f}s, requête dupliquée")
+                    tasks.add(asyncio.create_task(self.embed_batch(items, timeout=timeout)))
+                    tracker.hedges += 1
+                    give_up = time.monotonic() + timeout
+            
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, give_up - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    print(f"⏰ EMBED_BATCH: {len(items)} items sans réponse en {timeout:.1f}s, batch abandonné")
+                    raise EmbeddingTransientError(f"No response within {timeout:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            tracker.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    task.exception()  # Échec de la requête perdante : déjà remplacé, pas d'alerte asyncio
+                else:
+                    task.cancel()
+    
+    def _backoff(self, attempt: int) -> float:
+        """Attente exponentielle plafonnée, avec jitter pour désynchroniser les workers"""
+        delay = min(settings.EMBED_BACKOFF_MAX_SECONDS, settings.EMBED_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def _embed_batch_limited(
+        self,
+        limiter: AdaptiveConcurrency,
+        tracker: LatencyTracker,
+        breaker: CircuitBreaker,
+        items: List[EmbeddingItem]
+    ) -> Tuple[np.ndarray, float]:
+        """Un batch sous la limite de concurrence, dupliqué s'il traîne et réessayé
+        avec backoff exponentiel sur erreur transitoire.
+        L'appelant a réservé la place de la première tentative ; chaque reprise en réserve une.
+        Renvoie les vecteurs et la latence de la requête retenue."""
+        for attempt in range(1, self.retries + 1):
+            if attempt > 1:
+                await breaker.wait()
+                await limiter.acquire()
+            start = time.perf_counter()
+            try:
+                vectors = await self._embed_hedged(items, tracker)
+            except EmbeddingTransientError as e:
+                breaker.on_failure()
+                if isinstance(e, EmbeddingServiceBusy):
+                    limiter.on_overload()
+                if attempt == self.retries:
+                    raise
+                retry_after = getattr(e, "retry_after", None)
+                delay = retry_after or self._backoff(attempt)
+                error = str(e)
+            else:
+                latency = time.perf_counter() - start
+                breaker.on_success()
+                limiter.on_success(latency)
+                tracker.record(latency)
+                return vectors, latency
+            finally:
+                await limiter.release()
+            
+            tracker.retries += 1
+            print(f"🔁 EMBED_BATCH: Tentative {attempt}/{self.retries} échouée ({error}), nouvel essai dans {delay:.1f}s")
+            await asyncio.sleep(delay)
     
     async def embed_pages_with_progress(self, project_id: str, update_callback=None) -> Dict[str, Any]:
         """Version avec callback de progression"""
@@ -79,161 +605,289 @@ class EmbeddingsService:
         df = pd.read_csv(pages_path)
         print(f"🚀 EMBED_PAGES: Loaded {len(df)} rows from CSV")
         
-        items = []
-        for idx, row in df.iterrows():
-            if row["contenu"] and str(row["contenu"]).strip():
-                item = EmbeddingItem(type="text", value=str(row["contenu"]))
-                print(f"🚀 EMBED_PAGES: Row {idx} -> text item (content length: {len(str(row['contenu']))})")
-            else:
-                item = EmbeddingItem(type="url", value=str(row["url"]))
-                print(f"🚀 EMBED_PAGES: Row {idx} -> url item: {row['url']}")
-            items.append(item)
+        # Contenu texte si présent, sinon l'URL
+        contents = df["contenu"].fillna("").astype(str)
+        has_text = contents.str.strip() != ""
+        items = [
+            EmbeddingItem(type="text", value=content) if text else EmbeddingItem(type="url", value=str(url))
+            for content, text, url in zip(contents, has_text, df["url"])
+        ]
+        print(f"🚀 EMBED_PAGES: Created {len(items)} embedding items ({int(has_text.sum())} text, {len(items) - int(has_text.sum())} url)")
         
-        print(f"🚀 EMBED_PAGES: Created {len(items)} embedding items")
+        # Mode CHUNKING : les textes longs sont découpés en fenêtres qui se recouvrent, embeddées
+        # comme des lignes ordinaires puis regroupées en un vecteur par page à la fin
+        chunk_offsets = None
+        if self.chunking:
+            chunk_texts, chunk_offsets = split_texts([item.value for item in items], self.chunk_size, self.chunk_overlap)
+            chunk_pages = np.repeat(np.arange(len(items)), np.diff(chunk_offsets))
+            items = [EmbeddingItem(type=items[page].type, value=chunk) for chunk, page in zip(chunk_texts, chunk_pages)]
+            print(f"✂️ EMBED_PAGES: {len(items)} segments de {self.chunk_size} caractères max (recouvrement {self.chunk_overlap})")
         
-        all_vectors = []
-        total_batches = (len(items) + self.batch_size - 1) // self.batch_size
-        print(f"🚀 EMBED_PAGES: Will process {total_batches} batches of size {self.batch_size}")
+        # Lignes de la matrice embeddée : pages, ou segments en mode CHUNKING
+        total_pages = len(items)
         
-        for i in range(0, len(items), self.batch_size):
-            batch_num = (i // self.batch_size) + 1
-            batch_items = items[i:i + self.batch_size]
-            
-            print(f"🔄 BATCH {batch_num}/{total_batches}: Starting with {len(batch_items)} pages (indices {i} to {i+len(batch_items)-1})")
-            
-            # Callback de progression AVANT
-            if update_callback:
-                print(f"🔄 BATCH {batch_num}: Calling progress callback BEFORE processing")
-                callback_meta = {
-                    'current': batch_num,
-                    'total': total_batches,
-                    'status': f'Traitement batch {batch_num}/{total_batches} ({len(batch_items)} pages)',
-                    'pages_processed': i,
-                    'total_pages': len(items)
-                }
-                print(f"🔄 BATCH {batch_num}: Callback meta = {callback_meta}")
-                update_callback(state='PROGRESS', meta=callback_meta)
-                print(f"🔄 BATCH {batch_num}: Progress callback BEFORE completed")
-            else:
-                print(f"🔄 BATCH {batch_num}: No update_callback provided")
+        # Textes identiques (pagination, facettes...) : un seul embedding par texte normalisé,
+        # calculé sur la première ligne qui le porte puis recopié sur les autres
+        keys = [text_key(self.model, item.value) for item in items]
+        unique_index = {}
+        representatives = []
+        inverse = np.empty(total_pages, dtype=np.int64)
+        for row, key in enumerate(keys):
+            index = unique_index.get(key)
+            if index is None:
+                index = unique_index[key] = len(representatives)
+                representatives.append(row)
+            inverse[row] = index
+        representatives = np.array(representatives, dtype=np.int64)
+        # Pages couvertes par chaque texte distinct, pour une progression exprimée en pages
+        rows_per_text = np.bincount(inverse, minlength=len(representatives))
+        duplicate_rows = total_pages - len(representatives)
+        print(f"🧬 EMBED_PAGES: {len(representatives)} textes distincts, {duplicate_rows} lignes dupliquées")
+        
+        # Matrice (n, dim) float32 écrite au fil des batches dans un .npy mappé en mémoire,
+        # avec un point de reprise par batch : un job interrompu repart des lignes manquantes
+        checkpoint = EmbeddingCheckpoint(project_dir, self.model, keys)
+        done_mask = checkpoint.resume()
+        resumed = done_mask[representatives]
+        resumed_pages = int(rows_per_text[resumed].sum())
+        pending_positions = representatives[~resumed]
+        if resumed_pages:
+            print(f"♻️ EMBED_PAGES: Reprise du checkpoint, {resumed_pages}/{total_pages} pages déjà calculées")
+        
+        # Seuls les textes absents du cache partent vers le service d'embeddings
+        hit_mask = np.zeros(len(pending_positions), dtype=bool)
+        if self.cache and len(pending_positions):
+            hit_mask, cached_vectors = self.cache.get([keys[position] for position in pending_positions])
+            if cached_vectors is not None:
+                checkpoint.write(pending_positions[hit_mask], cached_vectors)
+        
+        cache_hits = int(hit_mask.sum())
+        miss_positions = pending_positions[~hit_mask]
+        cached_pages = int(rows_per_text[inverse[pending_positions[hit_mask]]].sum())
+        print(f"💾 EMBED_PAGES: Cache {cache_hits} hits / {len(miss_positions)} misses")
+        
+        # Batches par budget de caractères, au plus batch_size éléments
+        lengths = np.fromiter((len(item.value) for item in items), dtype=np.int64, count=total_pages)
+        planner = BatchPlanner(miss_positions, lengths, self.batch_chars, self.batch_size, self.target_batch_seconds)
+        print(f"🚀 EMBED_PAGES: ~{planner.estimated_total_batches()} batches (budget {self.batch_chars} chars, max {self.batch_size} items)")
+        
+        # Callback de progression AVANT
+        if update_callback:
+            update_callback(state='PROGRESS', meta={
+                'current': 0,
+                'total': planner.estimated_total_batches(),
+                'status': f'Traitement de {len(miss_positions)} pages',
+                'pages_processed': resumed_pages + cached_pages,
+                'resumed_pages': resumed_pages,
+                'total_pages': total_pages
+            })
+        
+        # Plusieurs batches en vol ; chaque résultat est replacé à ses positions d'origine
+        limiter = AdaptiveConcurrency(self.concurrency, self.max_concurrency)
+        tracker = LatencyTracker(
+            settings.EMBED_HEDGE_PERCENTILE, settings.EMBED_HEDGE_MIN_SECONDS,
+            settings.EMBED_HEDGE_INITIAL_SECONDS, self.request_timeout
+        )
+        breaker = CircuitBreaker(settings.EMBED_BREAKER_FAILURES, settings.EMBED_BREAKER_COOLDOWN_SECONDS)
+        pages_completed = resumed_pages + cached_pages
+        
+        async def worker():
+            nonlocal pages_completed
             
-            try:
-                print(f"🔄 BATCH {batch_num}: About to call embed_batch()")
-                batch_vectors = await self.embed_batch(batch_items)
-                all_vectors.extend(batch_vectors)
-                print(f"✅ BATCH {batch_num}/{total_batches}: COMPLETED - got {len(batch_vectors)} vectors, total so far: {len(all_vectors)}")
+            while True:
+                # Place réservée avant de former le batch : il prend le budget du moment
+                await breaker.wait()
+                await limiter.acquire()
+                batch_positions = planner.next_batch()
+                if batch_positions is None:
+                    await limiter.release()
+                    return
+                
+                batch_items = [items[position] for position in batch_positions]
+                vectors, latency = await self._embed_batch_limited(limiter, tracker, breaker, batch_items)
+                batch_vectors = np.asarray(vectors, dtype=np.float32)
+                checkpoint.write(batch_positions, batch_vectors)
+                
+                if self.cache:
+                    self.cache.put([keys[position] for position in batch_positions], batch_vectors)
+                
+                planner.record(len(batch_positions), int(lengths[batch_positions].sum()), latency, int(limiter.limit))
+                pages_completed += int(rows_per_text[inverse[batch_positions]].sum())
+                completed_batches = len(planner.timings)
+                total_batches = planner.estimated_total_batches()
+                print(f"✅ BATCH {completed_batches}/~{total_batches}: {len(batch_positions)} pages in {latency:.2f}s, concurrency {int(limiter.limit)}")
                 
                 # Update de progression APRÈS completion du batch
                 if update_callback:
-                    pages_completed = i + len(batch_items)
-                    print(f"✅ BATCH {batch_num}: Calling progress callback AFTER processing - {pages_completed}/{len(items)} pages completed")
-                    callback_meta_after = {
-                        'current': batch_num,
+                    update_callback(state='PROGRESS', meta={
+                        'current': completed_batches,
                         'total': total_batches,
-                        'status': f'Batch {batch_num}/{total_batches} terminé ({pages_completed}/{len(items)} pages)',
+                        'status': f'Batch {completed_batches}/{total_batches} terminé ({pages_completed}/{total_pages} pages)',
                         'pages_processed': pages_completed,
-                        'total_pages': len(items)
-                    }
-                    print(f"✅ BATCH {batch_num}: Callback meta AFTER = {callback_meta_after}")
-                    update_callback(state='PROGRESS', meta=callback_meta_after)
-                    print(f"✅ BATCH {batch_num}: Progress callback AFTER completed")
-                    
-            except Exception as e:
-                print(f"❌ BATCH {batch_num} FAILED: {type(e).__name__}: {str(e)}")
-                import traceback
-                print(f"❌ BATCH {batch_num} TRACEBACK: {traceback.format_exc()}")
-                raise
-            
-            # Petite pause entre les batches
-            await asyncio.sleep(0.1)
-        
-        # Sauvegarder les résultats
-        embeddings_df = pd.DataFrame({
-            "node_id": df["node_id"],
-            "url": df["url"],
-            "vector": all_vectors
-        })
+                        'total_pages': total_pages
+                    })
         
-        embeddings_path = project_dir / "embeddings.parquet"
-        embeddings_df.to_parquet(embeddings_path)
+        workers = [asyncio.create_task(worker()) for _ in range(self.max_concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except Exception as e:
+            print(f"❌ EMBED_PAGES FAILED: {type(e).__name__}: {str(e)} (checkpoint conservé: {pages_completed}/{total_pages} pages)")
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        
+        # Temps par batch, pour suivre l'effet du budget et de la concurrence
+        timings_path = project_dir / "embedding_timings.csv"
+        pd.DataFrame(planner.timings).to_csv(timings_path, index=False)
+        batch_timings = planner.timing_summary()
+        latency = {**tracker.summary(), "circuit_breaker_opens": breaker.opened}
+        print(f"⏱️ EMBED_PAGES: {batch_timings}")
+        print(f"⏱️ EMBED_PAGES: {latency['hedges']} requêtes dupliquées ({latency['hedge_wins']} gagnantes), {latency['retries']} reprises, circuit ouvert {breaker.opened} fois")
+        
+        # Recopie vers les lignes dupliquées, puis publication de la matrice complète sous son nom final
+        if duplicate_rows:
+            duplicates = np.flatnonzero(representatives[inverse] != np.arange(total_pages))
+            checkpoint.fan_out(duplicates, representatives[inverse[duplicates]])
+        embeddings_path = project_dir / EMBEDDINGS_FILENAME
+        chunks_path = project_dir / EMBEDDINGS_CHUNKS_FILENAME
+        offsets_path = project_dir / EMBEDDINGS_CHUNK_OFFSETS_FILENAME
+        if self.chunking:
+            checkpoint.finalize(chunks_path)
+            self._pool_chunk_embeddings(project_dir, chunks_path, chunk_offsets, lengths, embeddings_path)
+        else:
+            checkpoint.finalize(embeddings_path)
+        
+        # Segments conservés seulement sur demande ; ceux d'un run précédent sont retirés
+        if self.chunking and self.keep_chunk_vectors:
+            np.save(offsets_path, chunk_offsets)
+        else:
+            chunks_path.unlink(missing_ok=True)
+            offsets_path.unlink(missing_ok=True)
+        self._save_ids(project_dir, df["node_id"], df["url"])
         
-        vectors_array = np.array(all_vectors, dtype=np.float32)
+        # Stockage compact optionnel (float16 / int8), réécrit bloc par bloc
+        (project_dir / EMBEDDINGS_SCALE_FILENAME).unlink(missing_ok=True)
+        if self.storage_mode != "float32":
+            quantized_path = project_dir / "embeddings.quantized.npy"
+            quantize_file(embeddings_path, quantized_path, project_dir / EMBEDDINGS_SCALE_FILENAME, self.storage_mode)
+            quantized_path.replace(embeddings_path)
+        
+        all_vectors = open_vectors(embeddings_path, project_dir / EMBEDDINGS_SCALE_FILENAME)
         
         # Détecter automatiquement le nombre de dimensions
-        dimensions = len(all_vectors[0]) if all_vectors else 384
+        dimensions = all_vectors.shape[1]
         
         return {
             "project_id": project_id,
             "total_embeddings": len(all_vectors),
             "dimensions": dimensions,
+            "storage_mode": self.storage_mode,
             "embeddings_path": str(embeddings_path),
-            "vectors_array": vectors_array,
+            "vectors_array": all_vectors,
             "node_ids": df["node_id"].tolist(),
-            "urls": df["url"].tolist()
+            "urls": df["url"].tolist(),
+            "cache": {
+                "hits": cache_hits,
+                "misses": len(miss_positions)
+            },
+            "resumed_pages": resumed_pages,
+            "dedup": {
+                "unique_texts": len(representatives),
+                "duplicate_rows": duplicate_rows,
+                "ratio": round(duplicate_rows / total_pages, 4) if total_pages else 0.0
+            },
+            "batch_timings": batch_timings,
+            "latency": latency,
+            "transport_format": self.transport_format,
+            "chunking": {
+                "chunks": total_pages,
+                "pooling": self.chunk_pooling,
+                "chunks_path": str(chunks_path) if self.keep_chunk_vectors else None
+            } if self.chunking else None,
+            "timings_path": str(timings_path)
         }
 
     async def embed_pages(self, project_id: str) -> Dict[str, Any]:
-        project_dir = self.data_dir / project_id
-        pages_path = project_dir / "pages.csv"
-        
-        if not pages_path.exists():
-            raise FileNotFoundError(f"Fichier pages.csv non trouvé pour le projet {project_id}")
-        
-        df = pd.read_csv(pages_path)
-        
-        items = []
-        for _, row in df.iterrows():
-            if row["contenu"] and str(row["contenu"]).strip():
-                items.append(EmbeddingItem(type="text", value=str(row["contenu"])))
-            else:
-                items.append(EmbeddingItem(type="url", value=str(row["url"])))
-        
-        all_vectors = []
-        
-        for i in range(0, len(items), self.batch_size):
-            batch_items = items[i:i + self.batch_size]
-            batch_vectors = await self.embed_batch(batch_items)
-            all_vectors.extend(batch_vectors)
-            
-            # Petite pause entre les batches pour éviter de surcharger le service
-            await asyncio.sleep(0.1)
+        return await self.embed_pages_with_progress(project_id)
+    
+    def _pool_chunk_embeddings(
+        self,
+        project_dir: Path,
+        chunks_path: Path,
+        offsets: np.ndarray,
+        lengths: np.ndarray,
+        target_path: Path
+    ):
+        """Matrice (pages, dim) : moyenne simple ou pondérée par la longueur des segments de chaque page"""
+        chunk_vectors = np.load(chunks_path, mmap_mode="r")
+        n_pages = len(offsets) - 1
+        pooled_path = project_dir / "embeddings.pooled.npy"
         
-        embeddings_df = pd.DataFrame({
-            "node_id": df["node_id"],
-            "url": df["url"],
-            "vector": all_vectors
-        })
+        if n_pages == 0:
+            np.save(pooled_path, np.empty((0, chunk_vectors.shape[1]), dtype=np.float32))
+        else:
+            weights = lengths if self.chunk_pooling == "weighted" else np.ones(len(lengths))
+            pooled = open_memmap(pooled_path, mode="w+", dtype=np.float32, shape=(n_pages, chunk_vectors.shape[1]))
+            pool_chunks(chunk_vectors, offsets, np.maximum(weights, 1), pooled)
+            pooled.flush()
+            del pooled
         
-        embeddings_path = project_dir / "embeddings.parquet"
-        embeddings_df.to_parquet(embeddings_path)
+        pooled_path.replace(target_path)
+        print(f"🧩 EMBED_PAGES: {len(chunk_vectors)} segments regroupés en {n_pages} vecteurs ({self.chunk_pooling})")
+    
+    def load_chunk_embeddings(self, project_id: str) -> Dict[str, Any]:
+        """Vecteurs des segments conservés (CHUNK_KEEP_VECTORS), pour la similarité entre passages"""
+        project_dir = self.data_dir / project_id
+        chunks_path = project_dir / EMBEDDINGS_CHUNKS_FILENAME
         
-        vectors_array = np.array(all_vectors, dtype=np.float32)
+        if not chunks_path.exists():
+            raise FileNotFoundError(f"Vecteurs des segments non conservés pour le projet {project_id} (CHUNK_KEEP_VECTORS)")
         
-        # Détecter automatiquement le nombre de dimensions
-        dimensions = len(all_vectors[0]) if all_vectors else 384
+        offsets = np.load(project_dir / EMBEDDINGS_CHUNK_OFFSETS_FILENAME)
         
         return {
-            "project_id": project_id,
-            "total_embeddings": len(all_vectors),
-            "dimensions": dimensions,
-            "embeddings_path": str(embeddings_path),
-            "vectors_array": vectors_array,
-            "node_ids": df["node_id"].tolist(),
-            "urls": df["url"].tolist()
+            "vectors_array": np.load(chunks_path, mmap_mode="r"),
+            "offsets": offsets,
+            # Ligne de la page (dans embeddings.npy) de chaque segment
+            "page_index": np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
         }
     
+    def _save_ids(self, project_dir: Path, node_ids: pd.Series, urls: pd.Series):
+        """Fichier compagnon des embeddings : node_id et url de chaque ligne de la matrice"""
+        pd.DataFrame({"node_id": node_ids, "url": urls}).to_parquet(project_dir / EMBEDDINGS_IDS_FILENAME, index=False)
+    
+    def _convert_parquet_embeddings(self, project_dir: Path):
+        """Migration des anciens embeddings.parquet (colonne liste) vers .npy + ids"""
+        table = pq.read_table(project_dir / "embeddings.parquet", columns=["node_id", "url", "vector"])
+        
+        # Valeurs aplaties de la colonne liste, sans passer par des objets Python
+        vectors = table.column("vector").combine_chunks()
+        values = vectors.flatten().to_numpy(zero_copy_only=False).astype(np.float32, copy=False)
+        vectors_array = values.reshape(len(vectors), -1) if len(vectors) else np.empty((0, 384), dtype=np.float32)
+        
+        partial_path = project_dir / "embeddings.partial.npy"
+        np.save(partial_path, vectors_array)
+        partial_path.replace(project_dir / EMBEDDINGS_FILENAME)
+        self._save_ids(project_dir, table.column("node_id").to_pandas(), table.column("url").to_pandas())
+        print(f"♻️ EMBEDDINGS: embeddings.parquet converti en {EMBEDDINGS_FILENAME} ({vectors_array.shape})")
+    
     def load_embeddings(self, project_id: str) -> Dict[str, Any]:
         project_dir = self.data_dir / project_id
-        embeddings_path = project_dir / "embeddings.parquet"
+        embeddings_path = project_dir / EMBEDDINGS_FILENAME
         
         if not embeddings_path.exists():
-            raise FileNotFoundError(f"Fichier embeddings.parquet non trouvé pour le projet {project_id}")
+            if not (project_dir / "embeddings.parquet").exists():
+                raise FileNotFoundError(f"Fichier {EMBEDDINGS_FILENAME} non trouvé pour le projet {project_id}")
+            self._convert_parquet_embeddings(project_dir)
         
-        df = pd.read_parquet(embeddings_path)
-        vectors_array = np.array(df["vector"].tolist(), dtype=np.float32)
+        # Lecture sans copie : les pages de la matrice sont chargées à la demande
+        vectors_array = open_vectors(embeddings_path, project_dir / EMBEDDINGS_SCALE_FILENAME)
+        ids = pd.read_parquet(project_dir / EMBEDDINGS_IDS_FILENAME)
         
         return {
             "vectors_array": vectors_array,
-            "node_ids": df["node_id"].tolist(),
-            "urls": df["url"].tolist()
+            "node_ids": ids["node_id"].tolist(),
+            "urls": ids["url"].tolist(),
+            "embeddings_path": str(embeddings_path)
         }
\ No newline at end of file
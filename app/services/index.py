@@ -1,94 +1,752 @@
 import faiss
+import hashlib
+import threading
 import numpy as np
+import pandas as pd
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 from app.core.config import settings
+from app.services.quantization import VectorStore, iter_float32_blocks, iter_rows_float32, rows_float32, storage_mode
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+# Index persistés par analyse (data/<projet>/indexes/), avec les node_id / url de leurs lignes
+INDEXES_DIRNAME = "indexes"
+# knn : KNN_K voisins par page ; range : toutes les paires au-dessus de SIM_THRESHOLD
+NEIGHBOR_SEARCH_MODES = ("knn", "range")
+# Points d'entraînement par centroïde IVF en dessous desquels FAISS avertit
+IVF_POINTS_PER_CENTROID = 39
+# Marge sous la k-ième similarité d'une page à partir de laquelle une page ajoutée peut
+# entrer dans sa liste (arrondis du produit scalaire selon la taille des lots de requêtes)
+GRAPH_UPDATE_MARGIN = 1e-5
+
+def vector_fingerprints(vectors: VectorStore) -> np.ndarray:
+    """Empreinte int64 de chaque vecteur : une page dont l'empreinte change a été ré-embeddée autrement"""
+    fingerprints = np.empty(len(vectors), dtype=np.int64)
+    for start, block in iter_float32_blocks(vectors):
+        digests = b"".join(hashlib.blake2b(row.tobytes(), digest_size=8).digest() for row in block)
+        fingerprints[start:start + len(block)] = np.frombuffer(digests, dtype="<i8")
+    return fingerprints
+
+class SemanticNeighbors:
+    """Paires de voisins sémantiques en colonnes : i, j (lignes de la matrice des vecteurs),
+    similarité cosinus et rang de j parmi les voisins de i"""
+    
+    def __init__(self, i: np.ndarray, j: np.ndarray, sim: np.ndarray, rank: np.ndarray):
+        self.i = np.asarray(i, dtype=np.int32)
+        self.j = np.asarray(j, dtype=np.int32)
+        self.sim = np.asarray(sim, dtype=np.float32)
+        self.rank = np.asarray(rank, dtype=np.int32)
+    
+    def __len__(self) -> int:
+        return len(self.i)
+    
+    def filter(self, mask: np.ndarray) -> "SemanticNeighbors":
+        return SemanticNeighbors(self.i[mask], self.j[mask], self.sim[mask], self.rank[mask])
+    
+    def canonical(self) -> "SemanticNeighbors":
+        """Paires non orientées (i < j), chacune une seule fois, triées par (i, j).
+        
+        (i, j) et (j, i) partagent la clé int64 (min << 32) | max ; tri puis unique sur les
+        clés. Une paire vue dans les deux sens garde la meilleure similarité et le meilleur rang.
+        """
+        low = np.minimum(self.i, self.j).astype(np.int64)
+        high = np.maximum(self.i, self.j).astype(np.int64)
+        keys = (low << 32) | high
+        
+        order = np.lexsort((-self.sim, keys))
+        keys = keys[order]
+        unique_keys, starts = np.unique(keys, return_index=True)
+        if len(unique_keys) == 0:
+            return self.filter(np.zeros(len(self), dtype=bool))
+        
+        return SemanticNeighbors(
+            i=unique_keys >> 32,
+            j=unique_keys & 0xFFFFFFFF,
+            sim=self.sim[order][starts],
+            rank=np.minimum.reduceat(self.rank[order], starts)
+        )
+
+class NeighborGraph:
+    """k plus proches voisins de chaque ligne (soi-même exclu), par similarité décroissante ;
+    -1 quand la ligne a moins de k voisins. Persisté avec l'index de l'analyse, accompagné des
+    empreintes des vecteurs, pour être mis à jour à l'import suivant."""
+    
+    def __init__(self, neighbors: np.ndarray, sims: np.ndarray, fingerprints: np.ndarray):
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.sims = np.asarray(sims, dtype=np.float32)
+        self.fingerprints = np.asarray(fingerprints, dtype=np.int64)
+    
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+    
+    def __len__(self) -> int:
+        return len(self.neighbors)
+    
+    def to_pairs(self, similarity_threshold: float) -> SemanticNeighbors:
+        mask = (self.neighbors >= 0) & (self.sims >= similarity_threshold)
+        rows, columns = np.nonzero(mask)
+        return SemanticNeighbors(i=rows, j=self.neighbors[mask], sim=self.sims[mask], rank=columns + 1)
+    
+    def to_umap_knn(self, n_neighbors: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Voisins au format precomputed_knn de UMAP : n_neighbors colonnes, la ligne elle-même
+        en premier (distance 0), puis distances cosinus croissantes. Faute de voisin (IVF à faible
+        nprobe) : indice -1, que UMAP ignore, et la plus grande distance réelle de la ligne. Une
+        distance infinie rendrait infini le sigma de la ligne et toutes ses arêtes de poids 1."""
+        n_neighbors = min(n_neighbors, self.k + 1)
+        valid = self.neighbors[:, :n_neighbors - 1] >= 0
+        
+        knn_indices = np.empty((len(self), n_neighbors), dtype=np.int32)
+        knn_indices[:, 0] = np.arange(len(self))
+        knn_indices[:, 1:] = np.where(valid, self.neighbors[:, :n_neighbors - 1], -1)
+        
+        knn_dists = np.zeros((len(self), n_neighbors), dtype=np.float32)
+        dists = np.maximum(1.0 - self.sims[:, :n_neighbors - 1], 0.0)
+        row_max = np.where(valid, dists, 0.0).max(axis=1, initial=0.0)
+        knn_dists[:, 1:] = np.where(valid, dists, row_max[:, np.newaxis])
+        return knn_indices, knn_dists
+    
+    def save(self, path: Path):
+        with open(path, "wb") as f:
+            np.savez(f, neighbors=self.neighbors, sims=self.sims, fingerprints=self.fingerprints)
+    
+    @classmethod
+    def load(cls, path: Path) -> "NeighborGraph":
+        with np.load(path) as data:
+            return cls(data["neighbors"], data["sims"], data["fingerprints"])
+
+class NeighborRanges:
+    """Voisins au-dessus d'un seuil au format CSR : voisins de la ligne r =
+    indices[offsets[r]:offsets[r + 1]], triés par similarité décroissante"""
+    
+    def __init__(self, offsets: np.ndarray, indices: np.ndarray, sims: np.ndarray):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.sims = np.asarray(sims, dtype=np.float32)
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+    
+    def neighbors(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, stop = self.offsets[row], self.offsets[row + 1]
+        return self.indices[start:stop], self.sims[start:stop]
+    
+    def to_pairs(self) -> SemanticNeighbors:
+        counts = self.counts()
+        rows = np.repeat(np.arange(len(self), dtype=np.int32), counts)
+        ranks = np.arange(len(self.indices)) - np.repeat(self.offsets[:-1], counts) + 1
+        return SemanticNeighbors(i=rows, j=self.indices, sim=self.sims, rank=ranks)
+
+class LoadedIndex:
+    """Index FAISS ouvert en lecture (codes mappés en mémoire) et identifiants de ses lignes"""
+    
+    def __init__(self, index: faiss.Index, node_ids: np.ndarray, urls: np.ndarray, nbytes: int):
+        self.index = index
+        self.node_ids = node_ids
+        self.urls = urls
+        self.nbytes = nbytes
+        self.row_by_url = {url: row for row, url in enumerate(urls)}
+
+class IndexCache:
+    """LRU des index chargés, commun au processus, borné en octets (taille des fichiers d'index
+    et des identifiants). Le plus récent est toujours gardé, même s'il dépasse seul la borne."""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, LoadedIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, path: str, loader) -> LoadedIndex:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                return entry
+        
+        entry = loader()
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > 1 and self.total_bytes() > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                print(f"🧹 INDEX_CACHE: {evicted} déchargé")
+        return entry
+    
+    def total_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+    
+    def discard(self, directory: Path):
+        """Oublie les index situés sous directory (projet supprimé)"""
+        with self._lock:
+            for path in [path for path in self._entries if Path(path).is_relative_to(directory)]:
+                del self._entries[path]
+
+index_cache = IndexCache(settings.INDEX_CACHE_MAX_BYTES)
 
 class VectorIndexService:
     def __init__(self):
         self.data_dir = Path(settings.DATA_DIR)
         self.k = settings.KNN_K
+        self.index_type = settings.INDEX_TYPE
+        if self.index_type not in ("auto", *INDEX_TYPES):
+            raise ValueError(f"INDEX_TYPE invalide: {self.index_type} (attendu: auto, {', '.join(INDEX_TYPES)})")
+        self.train_sample = settings.INDEX_TRAIN_SAMPLE
+        self.recall_sample = settings.INDEX_RECALL_SAMPLE
+        self.neighbor_search = settings.NEIGHBOR_SEARCH
+        if self.neighbor_search not in NEIGHBOR_SEARCH_MODES:
+            raise ValueError(f"NEIGHBOR_SEARCH invalide: {self.neighbor_search} (attendu: {', '.join(NEIGHBOR_SEARCH_MODES)})")
+        self.range_max_neighbors = settings.RANGE_MAX_NEIGHBORS
+    
+    def choose_index_type(self, n_vectors: int) -> str:
+        """Exact en dessous de INDEX_HNSW_MIN_VECTORS, puis HNSW, IVF-Flat et IVF-PQ selon la taille"""
+        if self.index_type != "auto":
+            return self.index_type
+        if n_vectors >= settings.INDEX_IVF_PQ_MIN_VECTORS:
+            return "ivf_pq"
+        if n_vectors >= settings.INDEX_IVF_MIN_VECTORS:
+            return "ivf_flat"
+        if n_vectors >= settings.INDEX_HNSW_MIN_VECTORS:
+            return "hnsw"
+        return "flat"
+    
+    def _create_index(self, index_type: str, dimensions: int, n_vectors: int, mode: str) -> Tuple[faiss.Index, Dict[str, Any]]:
+        """Index vide et ses paramètres ; le stockage float16/int8 choisit la variante à quantification scalaire"""
+        metric = faiss.METRIC_INNER_PRODUCT
+        quantizer_type = {
+            "float16": faiss.ScalarQuantizer.QT_fp16,
+            "int8": faiss.ScalarQuantizer.QT_8bit
+        }.get(mode)
+        
+        if index_type == "flat":
+            if quantizer_type is None:
+                return faiss.IndexFlatIP(dimensions), {}
+            return faiss.IndexScalarQuantizer(dimensions, quantizer_type, metric), {"scalar_quantizer": mode}
+        
+        if index_type == "hnsw":
+            m = settings.INDEX_HNSW_M
+            if quantizer_type is None:
+                index = faiss.IndexHNSWFlat(dimensions, m, metric)
+            else:
+                index = faiss.IndexHNSWSQ(dimensions, quantizer_type, m, metric)
+            index.hnsw.efConstruction = settings.INDEX_HNSW_EF_CONSTRUCTION
+            return index, {"M": m, "efConstruction": settings.INDEX_HNSW_EF_CONSTRUCTION}
+        
+        # IVF : ~4·√n listes, bornées par la taille de l'échantillon d'entraînement
+        training_points = min(n_vectors, self.train_sample)
+        nlist = settings.INDEX_IVF_NLIST or int(4 * np.sqrt(n_vectors))
+        nlist = max(1, min(nlist, training_points // IVF_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatIP(dimensions)
+        
+        if index_type == "ivf_pq":
+            # Plus grand nombre de sous-vecteurs <= INDEX_PQ_M qui divise la dimension
+            pq_m = max(m for m in range(1, min(settings.INDEX_PQ_M, dimensions) + 1) if dimensions % m == 0)
+            index = faiss.IndexIVFPQ(quantizer, dimensions, nlist, pq_m, 8, metric)
+            params = {"nlist": nlist, "pq_m": pq_m, "pq_bits": 8}
+        elif quantizer_type is None:
+            index = faiss.IndexIVFFlat(quantizer, dimensions, nlist, metric)
+            params = {"nlist": nlist}
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimensions, nlist, quantizer_type, metric)
+            params = {"nlist": nlist, "scalar_quantizer": mode}
+        
+        # L'index garde une référence au quantificateur
+        index.referenced_objects = [quantizer]
+        return index, params
     
-    def build_index(self, vectors: np.ndarray) -> faiss.Index:
+    def _apply_search_params(self, index: faiss.Index) -> Dict[str, Any]:
+        """efSearch / nprobe réglables ; appliqués à la construction et au rechargement"""
+        params = {}
+        
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = max(settings.INDEX_HNSW_EF_SEARCH, self.k + 1)
+            params["efSearch"] = index.hnsw.efSearch
+        
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = min(settings.INDEX_IVF_NPROBE, ivf.nlist)
+            params["nprobe"] = ivf.nprobe
+        
+        return params
+    
+    def build_index(self, vectors: VectorStore) -> faiss.Index:
         if len(vectors.shape) != 2:
             raise ValueError(f"Forme attendue: (n, dimensions), reçue: {vectors.shape}")
         
         # Détecter automatiquement les dimensions
         dimensions = vectors.shape[1]
+        mode = storage_mode(vectors)
+        index_type = self.choose_index_type(len(vectors))
+        index, params = self._create_index(index_type, dimensions, len(vectors), mode)
         
-        vectors = vectors.astype(np.float32)
+        if not index.is_trained:
+            # Entraînement (centroïdes IVF, codebooks PQ, bornes SQ) sur un échantillon
+            sample_rows = np.sort(np.random.default_rng(0).choice(len(vectors), min(len(vectors), self.train_sample), replace=False))
+            index.train(self._normalize(rows_float32(vectors, sample_rows)))
         
-        norms = np.linalg.norm(vectors, axis=1)
-        if not np.allclose(norms, 1.0, rtol=1e-5):
-            vectors = vectors / norms[:, np.newaxis]
+        # Identifiants = lignes de la matrice ; l'index exact passe par une table d'identifiants
+        # et IVF par une table de hachage, pour pouvoir retirer et renuméroter des pages ensuite
+        if index_type == "flat":
+            index = faiss.IndexIDMap2(index)
+        
+        # Ajout par blocs : seul un bloc float32 normalisé existe à la fois
+        ivf = faiss.try_extract_index_ivf(index)
+        for start, block in iter_float32_blocks(vectors):
+            if index_type == "hnsw":
+                index.add(self._normalize(block))
+            else:
+                index.add_with_ids(self._normalize(block), np.arange(start, start + len(block), dtype=np.int64))
+        
+        if ivf is not None:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        
+        params.update(self._apply_search_params(index))
+        print(f"🧭 INDEX: {index_type} sur {len(vectors)} vecteurs {params}")
+        
+        return index
+    
+    def describe_index(self, index: faiss.Index, vectors: VectorStore) -> Dict[str, Any]:
+        """Type et paramètres de l'index, et recall@k mesuré contre une recherche exacte sur un échantillon"""
+        inner = self._base_index(index)
+        index_type, params = self._index_type(index)
+        
+        if self._scalar_quantizer(index) != "float32":
+            params["scalar_quantizer"] = self._scalar_quantizer(index)
+        params.update(self._apply_search_params(index))
+        
+        info = {"type": index_type, "params": params, "recall_at_k": None, "recall_k": self.k}
+        if isinstance(inner, faiss.IndexFlatIP):
+            info["recall_at_k"] = 1.0
+        elif self.recall_sample > 0 and len(vectors) > 0:
+            info.update(self.measure_recall(index, vectors, self.recall_sample))
         
-        index = faiss.IndexFlatIP(dimensions)
-        index.add(vectors)
+        return info
+    
+    def _index_type(self, index: faiss.Index) -> Tuple[str, Dict[str, Any]]:
+        inner = self._base_index(index)
+        ivf = faiss.try_extract_index_ivf(index)
+        
+        if hasattr(inner, "hnsw"):
+            return "hnsw", {"M": inner.hnsw.nb_neighbors(1), "efConstruction": inner.hnsw.efConstruction}
+        if ivf is not None:
+            ivf = faiss.downcast_index(ivf)
+            if isinstance(ivf, faiss.IndexIVFPQ):
+                return "ivf_pq", {"nlist": ivf.nlist, "pq_m": ivf.pq.M, "pq_bits": ivf.pq.nbits}
+            return "ivf_flat", {"nlist": ivf.nlist}
+        return "flat", {}
+    
+    def _scalar_quantizer(self, index: faiss.Index) -> str:
+        """Stockage des vecteurs dans l'index : float32, ou float16 / int8 par quantification scalaire"""
+        inner = self._base_index(index)
+        if hasattr(inner, "hnsw"):
+            inner = faiss.downcast_index(inner.storage)
+        sq = getattr(faiss.downcast_index(inner), "sq", None)
+        if sq is None:
+            return "float32"
+        return {faiss.ScalarQuantizer.QT_fp16: "float16", faiss.ScalarQuantizer.QT_8bit: "int8"}.get(sq.qtype, "float32")
+    
+    def measure_recall(self, index: faiss.Index, vectors: VectorStore, sample_size: int) -> Dict[str, Any]:
+        """recall@k : part des k vrais voisins (hors soi-même) retrouvés par l'index, sur un échantillon de requêtes"""
+        k = min(self.k + 1, len(vectors))
+        sample_rows = np.sort(np.random.default_rng(1).choice(len(vectors), min(len(vectors), sample_size), replace=False))
+        queries = self._normalize(rows_float32(vectors, sample_rows))
+        
+        _, approx_indices = index.search(queries, k)
+        
+        # Recherche exacte bloc par bloc, fusionnée dans un tas des k meilleurs
+        heap = faiss.ResultHeap(len(queries), k, keep_max=True)
+        for start, block in iter_float32_blocks(vectors):
+            block_sims, block_indices = faiss.knn(queries, self._normalize(block), min(k, len(block)), metric=faiss.METRIC_INNER_PRODUCT)
+            heap.add_result(block_sims, block_indices + start)
+        heap.finalize()
+        
+        found = 0
+        expected = 0
+        for row, exact, approx in zip(sample_rows, heap.I, approx_indices):
+            exact_set = set(exact[exact != row]) - {-1}
+            expected += len(exact_set)
+            found += len(exact_set & set(approx))
         
+        recall = found / expected if expected else 1.0
+        print(f"🎯 INDEX: recall@{self.k} = {recall:.4f} sur {len(sample_rows)} requêtes")
+        
+        return {"recall_at_k": round(recall, 4), "recall_sample": len(sample_rows)}
+    
+    def _base_index(self, index: faiss.Index) -> faiss.Index:
+        """Index sous la table d'identifiants éventuelle"""
+        index = faiss.downcast_index(index)
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            return faiss.downcast_index(index.index)
         return index
     
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        
+        norms = np.linalg.norm(vectors, axis=1)
+        if not np.allclose(norms, 1.0, rtol=1e-5):
+            vectors = vectors / np.maximum(norms, 1e-12)[:, np.newaxis]
+        
+        return vectors
+    
     def search_similar(
         self, 
         index: faiss.Index, 
-        query_vectors: np.ndarray, 
+        query_vectors: VectorStore, 
         k: int = None
     ) -> Tuple[np.ndarray, np.ndarray]:
         if k is None:
             k = self.k
         
-        query_vectors = query_vectors.astype(np.float32)
+        similarities = np.empty((len(query_vectors), k + 1), dtype=np.float32)
+        indices = np.empty((len(query_vectors), k + 1), dtype=np.int64)
         
-        norms = np.linalg.norm(query_vectors, axis=1)
-        if not np.allclose(norms, 1.0, rtol=1e-5):
-            query_vectors = query_vectors / norms[:, np.newaxis]
-        
-        similarities, indices = index.search(query_vectors, k + 1)
+        for start, block in iter_float32_blocks(query_vectors):
+            block_sims, block_indices = index.search(self._normalize(block), k + 1)
+            similarities[start:start + len(block)] = block_sims
+            indices[start:start + len(block)] = block_indices
         
         return similarities, indices
     
+    def range_search(
+        self,
+        index: faiss.Index,
+        query_vectors: VectorStore,
+        similarity_threshold: float,
+        max_neighbors: int = 0
+    ) -> NeighborRanges:
+        """Tous les voisins de similarité >= similarity_threshold (soi-même exclu), au format CSR.
+        
+        FAISS ne renvoie que les similarités strictement supérieures au rayon : le rayon est
+        abaissé d'un ulp puis le seuil réappliqué, pour garder les paires exactement au seuil.
+        max_neighbors > 0 ne garde que les plus proches de chaque ligne. Les résultats sont
+        assemblés bloc de requêtes par bloc : la mémoire suit le nombre de paires retenues.
+        """
+        radius = float(np.nextafter(np.float32(similarity_threshold), np.float32(-np.inf)))
+        counts = np.zeros(len(query_vectors), dtype=np.int64)
+        indices_blocks = []
+        sims_blocks = []
+        
+        for start, block in iter_float32_blocks(query_vectors):
+            lims, sims, indices = index.range_search(self._normalize(block), radius)
+            rows = np.repeat(np.arange(start, start + len(block)), np.diff(lims.astype(np.int64)))
+            
+            keep = (indices != rows) & (indices >= 0) & (sims >= similarity_threshold)
+            rows, indices, sims = rows[keep], indices[keep], sims[keep]
+            
+            # Tri par ligne puis similarité décroissante
+            order = np.lexsort((-sims, rows))
+            rows, indices, sims = rows[order], indices[order], sims[order]
+            
+            if max_neighbors > 0 and len(rows):
+                row_starts = np.searchsorted(rows, rows, side="left")
+                keep = np.arange(len(rows)) - row_starts < max_neighbors
+                rows, indices, sims = rows[keep], indices[keep], sims[keep]
+            
+            counts[start:start + len(block)] = np.bincount(rows - start, minlength=len(block))
+            indices_blocks.append(indices.astype(np.int32))
+            sims_blocks.append(sims)
+        
+        offsets = np.zeros(len(query_vectors) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        
+        return NeighborRanges(
+            offsets=offsets,
+            indices=np.concatenate(indices_blocks) if indices_blocks else np.empty(0, dtype=np.int32),
+            sims=np.concatenate(sims_blocks) if sims_blocks else np.empty(0, dtype=np.float32)
+        )
+    
     def find_semantic_neighbors(
         self, 
-        vectors: np.ndarray, 
+        vectors: VectorStore, 
         node_ids: List[str],
-        similarity_threshold: float = None
-    ) -> List[Dict[str, Any]]:
+        similarity_threshold: float = None,
+        index: faiss.Index = None
+    ) -> SemanticNeighbors:
         if similarity_threshold is None:
             similarity_threshold = settings.SIM_THRESHOLD
         
-        index = self.build_index(vectors)
-        similarities, indices = self.search_similar(index, vectors)
+        if len(node_ids) != len(vectors):
+            raise ValueError(f"{len(node_ids)} node_ids pour {len(vectors)} vecteurs")
+        
+        if index is None:
+            index = self.build_index(vectors)
+        
+        if self.neighbor_search == "range":
+            ranges = self.range_search(index, vectors, similarity_threshold, self.range_max_neighbors)
+            print(f"📏 VOISINS: {len(ranges.indices)} paires >= {similarity_threshold} (max par page: {ranges.counts().max(initial=0)})")
+            return ranges.to_pairs()
+        
+        return self.build_neighbor_graph(index, vectors).to_pairs(similarity_threshold)
+    
+    def analysis_semantic_neighbors(self, index_path: Optional[str], vectors: VectorStore, node_ids: List[str]) -> SemanticNeighbors:
+        """Paires de voisins d'une analyse terminée : depuis son graphe de voisins enregistré,
+        sinon une recherche dans son index (reconstruit s'il a disparu)"""
+        index = None
+        if index_path:
+            path = Path(index_path)
+            graph_path = path.with_suffix(".neighbors.npz")
+            if graph_path.exists():
+                return NeighborGraph.load(graph_path).to_pairs(settings.SIM_THRESHOLD)
+            if path.exists():
+                index = self.read_index(path)
+        return self.find_semantic_neighbors(vectors, node_ids, index=index)
+    
+    def _neighbor_lists(self, index: faiss.Index, vectors: VectorStore, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """k plus proches voisins des lignes `rows` : soi-même exclu par égalité d'indice (pas forcément
+        en position 0 en cas d'ex æquo ou de doublons), ainsi que les cases vides (-1) des index approximatifs"""
+        neighbors = np.full((len(rows), self.k), -1, dtype=np.int32)
+        sims = np.full((len(rows), self.k), -np.inf, dtype=np.float32)
+        
+        for start, block in iter_rows_float32(vectors, rows):
+            block_sims, block_indices = index.search(self._normalize(block), self.k + 1)
+            block_rows = rows[start:start + len(block), np.newaxis]
+            valid = (block_indices != block_rows) & (block_indices >= 0)
+            # Voisins valides en tête de ligne, ordre des similarités conservé
+            order = np.argsort(~valid, axis=1, kind="stable")[:, :self.k]
+            keep = np.take_along_axis(valid, order, axis=1)
+            neighbors[start:start + len(block)] = np.where(keep, np.take_along_axis(block_indices, order, axis=1), -1)
+            sims[start:start + len(block)] = np.where(keep, np.take_along_axis(block_sims, order, axis=1), -np.inf)
         
-        neighbors = []
+        return neighbors, sims
+    
+    def build_neighbor_graph(self, index: faiss.Index, vectors: VectorStore) -> NeighborGraph:
+        neighbors, sims = self._neighbor_lists(index, vectors, np.arange(len(vectors)))
+        return NeighborGraph(neighbors, sims, vector_fingerprints(vectors))
+    
+    def update_index(
+        self,
+        index_path: str,
+        vectors: VectorStore,
+        node_ids: List[str]
+    ) -> Optional[Tuple[faiss.Index, NeighborGraph, Dict[str, Any]]]:
+        """Index et graphe de voisins d'une analyse précédente, mis à jour pour les pages actuelles.
+        
+        Les pages retirées ou dont le vecteur a changé sortent de l'index, les autres sont renumérotées
+        selon leur ligne actuelle, puis les pages nouvelles ou modifiées sont ajoutées. Seules les listes
+        de voisins touchées sont recalculées : pages ajoutées ou modifiées et pages qui avaient un voisin
+        retiré ; celles qu'une page ajoutée vient seulement compléter sont fusionnées sans recherche.
+        None si l'index précédent ne s'y prête pas (HNSW, autre type ou stockage, autre k) : il faut
+        alors tout reconstruire.
+        """
+        index_path = Path(index_path)
+        graph_path = index_path.with_suffix(".neighbors.npz")
+        if not graph_path.exists():
+            return None
+        
+        previous = NeighborGraph.load(graph_path)
+        if previous.k != self.k:
+            return None
+        
+        # Même type d'index que ce que choisirait une reconstruction, même stockage ;
+        # HNSW ne sait pas retirer de vecteurs
+        index = faiss.read_index(str(index_path))
+        index_type, _ = self._index_type(index)
+        if index_type == "hnsw" or index_type != self.choose_index_type(len(vectors)) or index.d != vectors.shape[1]:
+            return None
+        if index_type != "ivf_pq" and self._scalar_quantizer(index) != storage_mode(vectors):
+            return None
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is None and not isinstance(index, faiss.IndexIDMap2):
+            return None
+        if ivf is not None and ivf.direct_map.type != faiss.DirectMap.Hashtable:
+            return None
+        
+        previous_ids = pd.read_parquet(index_path.with_suffix(".ids.parquet"), columns=["node_id"])["node_id"]
+        current_ids = pd.Index(node_ids)
+        if not current_ids.is_unique or not pd.Index(previous_ids).is_unique:
+            return None
+        
+        fingerprints = vector_fingerprints(vectors)
+        # Ligne précédente de chaque page actuelle (-1 : nouvelle)
+        old_rows = pd.Index(previous_ids).get_indexer(current_ids)
+        matched = old_rows >= 0
+        unchanged = matched.copy()
+        unchanged[matched] = previous.fingerprints[old_rows[matched]] == fingerprints[matched]
         
-        for i, (sims, idxs) in enumerate(zip(similarities, indices)):
-            for j, (sim, idx) in enumerate(zip(sims, idxs)):
-                if j == 0:  # Skip self
+        # Nouvelle ligne de chaque ligne précédente conservée telle quelle (-1 : retirée ou modifiée)
+        new_rows = np.full(len(previous), -1, dtype=np.int64)
+        new_rows[old_rows[unchanged]] = np.flatnonzero(unchanged)
+        if not unchanged.any():
+            return None
+        
+        stale = np.flatnonzero(new_rows < 0)
+        fresh = np.flatnonzero(~unchanged)
+        stats = {
+            "mode": "incremental",
+            "added": int((~matched).sum()),
+            "changed": int((matched & ~unchanged).sum()),
+            "removed": int(len(previous) - matched.sum())
+        }
+        
+        try:
+            index.remove_ids(stale.astype(np.int64))
+            self._relabel(index, new_rows)
+        except RuntimeError as e:
+            print(f"⚠️ INDEX: mise à jour impossible ({e}), reconstruction complète")
+            return None
+        
+        for start, block in iter_rows_float32(vectors, fresh):
+            index.add_with_ids(self._normalize(block), fresh[start:start + len(block)].astype(np.int64))
+        self._apply_search_params(index)
+        
+        # Listes conservées, renumérotées ; un voisin retiré ou modifié les rend caduques
+        neighbors = np.full((len(vectors), self.k), -1, dtype=np.int32)
+        sims = np.full((len(vectors), self.k), -np.inf, dtype=np.float32)
+        kept = np.flatnonzero(unchanged)
+        kept_neighbors = previous.neighbors[old_rows[kept]]
+        remapped = np.where(kept_neighbors >= 0, new_rows[kept_neighbors], -1)
+        neighbors[kept] = remapped
+        sims[kept] = previous.sims[old_rows[kept]]
+        
+        # Recherche complète pour les pages ajoutées ou modifiées et celles qui ont perdu un voisin
+        lost_neighbor = ((kept_neighbors >= 0) & (remapped < 0)).any(axis=1)
+        recompute = np.sort(np.concatenate([fresh, kept[lost_neighbor]]))
+        
+        # Les autres listes restent exactes sur les pages conservées : il suffit d'y fusionner
+        # les pages ajoutées ou modifiées qui dépassent leur k-ième similarité
+        merged = 0
+        if len(fresh):
+            fresh_index = faiss.IndexFlatIP(vectors.shape[1])
+            for _, block in iter_rows_float32(vectors, fresh):
+                fresh_index.add(self._normalize(block))
+            
+            candidates = kept[~lost_neighbor]
+            fresh_k = min(self.k, len(fresh))
+            for start, block in iter_rows_float32(vectors, candidates):
+                rows = candidates[start:start + len(block)]
+                fresh_sims, fresh_positions = fresh_index.search(self._normalize(block), fresh_k)
+                entering = fresh_sims[:, 0] >= sims[rows, -1] - GRAPH_UPDATE_MARGIN
+                if not entering.any():
                     continue
                 
-                if sim >= similarity_threshold:
-                    neighbors.append({
-                        "node_i": node_ids[i],
-                        "node_j": node_ids[idx],
-                        "similarity": float(sim),
-                        "rank": j
-                    })
+                rows = rows[entering]
+                all_neighbors = np.concatenate([neighbors[rows], fresh[fresh_positions[entering]].astype(np.int32)], axis=1)
+                all_sims = np.concatenate([sims[rows], fresh_sims[entering]], axis=1)
+                order = np.argsort(-all_sims, axis=1, kind="stable")[:, :self.k]
+                neighbors[rows] = np.take_along_axis(all_neighbors, order, axis=1)
+                sims[rows] = np.take_along_axis(all_sims, order, axis=1)
+                merged += len(rows)
+        
+        neighbors[recompute], sims[recompute] = self._neighbor_lists(index, vectors, recompute)
+        stats["merged_rows"] = merged
+        stats["recomputed_rows"] = int(len(recompute))
+        print(f"🔁 INDEX: mise à jour incrémentale {stats}")
         
-        return neighbors
+        return index, NeighborGraph(neighbors, sims, fingerprints), stats
     
-    def save_index(self, index: faiss.Index, project_id: str) -> str:
+    def _relabel(self, index: faiss.Index, new_rows: np.ndarray):
+        """Identifiants de l'index (anciennes lignes) remplacés par les lignes actuelles"""
+        if isinstance(index, faiss.IndexIDMap2):
+            labels = faiss.vector_to_array(index.id_map)
+            faiss.copy_array_to_vector(new_rows[labels], index.id_map)
+            index.construct_rev_map()
+            return
+        
+        ivf = faiss.extract_index_ivf(index)
+        for list_no in range(ivf.nlist):
+            size = ivf.invlists.list_size(list_no)
+            if size:
+                # Vue sur les identifiants de la liste, modifiés sur place
+                labels = faiss.rev_swig_ptr(ivf.invlists.get_ids(list_no), size)
+                labels[:] = new_rows[labels]
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    
+    def save_index(
+        self,
+        index: faiss.Index,
+        project_id: str,
+        analysis_id: Optional[int] = None,
+        node_ids: Optional[List[str]] = None,
+        urls: Optional[List[str]] = None,
+        graph: Optional[NeighborGraph] = None
+    ) -> str:
+        """Index du projet, ou d'une analyse s'il y a analysis_id : avec les node_id / url de ses lignes
+        et, s'il est fourni, le graphe des voisins qui servira à la mise à jour incrémentale suivante"""
         project_dir = self.data_dir / project_id
         project_dir.mkdir(exist_ok=True)
         
-        index_path = project_dir / "faiss_index.index"
-        faiss.write_index(index, str(index_path))
+        if analysis_id is None:
+            index_path = project_dir / "faiss_index.index"
+        else:
+            index_path = self.analysis_index_path(project_id, analysis_id)
+            index_path.parent.mkdir(exist_ok=True)
+            pd.DataFrame({"node_id": node_ids, "url": urls}).to_parquet(index_path.with_suffix(".ids.parquet"), index=False)
+            if graph is not None:
+                graph.save(index_path.with_suffix(".neighbors.npz"))
+        
+        partial_path = index_path.with_suffix(".partial")
+        faiss.write_index(index, str(partial_path))
+        partial_path.replace(index_path)
         
         return str(index_path)
     
-    def load_index(self, project_id: str) -> faiss.Index:
+    def analysis_index_path(self, project_id: str, analysis_id: int) -> Path:
+        return self.data_dir / project_id / INDEXES_DIRNAME / f"analysis_{analysis_id}.index"
+    
+    def load_index(self, project_id: str, mmap: bool = False) -> faiss.Index:
         project_dir = self.data_dir / project_id
         index_path = project_dir / "faiss_index.index"
         
         if not index_path.exists():
             raise FileNotFoundError(f"Index FAISS non trouvé pour le projet {project_id}")
         
-        return faiss.read_index(str(index_path))
\ No newline at end of file
+        return self.read_index(index_path, mmap)
+    
+    def read_index(self, index_path: Path, mmap: bool = False) -> faiss.Index:
+        """mmap : codes des vecteurs lus depuis le fichier à la demande (index en lecture seule)"""
+        index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP_IFC if mmap else 0)
+        self._apply_search_params(index)
+        return index
+    
+    def open_analysis_index(self, index_path: str) -> LoadedIndex:
+        """Index d'une analyse et ses identifiants, via le cache LRU du processus"""
+        def loader():
+            path = Path(index_path)
+            if not path.exists():
+                raise FileNotFoundError(f"Index FAISS non trouvé: {path.name}")
+            ids_path = path.with_suffix(".ids.parquet")
+            ids = pd.read_parquet(ids_path)
+            print(f"📂 INDEX_CACHE: {path.name} chargé ({path.stat().st_size / 1e6:.1f} Mo)")
+            return LoadedIndex(
+                index=self.read_index(path, mmap=True),
+                node_ids=ids["node_id"].to_numpy(),
+                urls=ids["url"].to_numpy(),
+                nbytes=path.stat().st_size + int(ids.memory_usage(deep=True).sum())
+            )
+        
+        return index_cache.get(str(index_path), loader)
+    
+    def query_similar_pages(
+        self,
+        loaded: LoadedIndex,
+        k: int,
+        url: Optional[str] = None,
+        query_vector: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
+        """Les k pages les plus proches d'une page de l'index (url) ou d'un vecteur (texte libre)"""
+        exclude = None
+        if url is not None:
+            exclude = loaded.row_by_url.get(url)
+            if exclude is None:
+                raise KeyError(url)
+            query_vector = loaded.index.reconstruct(int(exclude))
+        
+        query = self._normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))
+        sims, indices = loaded.index.search(query, min(k + 1, loaded.index.ntotal))
+        
+        results = []
+        for sim, row in zip(sims[0].tolist(), indices[0].tolist()):
+            if row < 0 or row == exclude:
+                continue
+            results.append({
+                "rank": len(results) + 1,
+                "node_id": loaded.node_ids[row],
+                "url": loaded.urls[row],
+                "similarity": sim
+            })
+        
+        return results[:k]
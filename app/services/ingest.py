@@ -1,10 +1,128 @@
+import codecs
+import csv
+import io
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 import uuid
 from pathlib import Path
-from typing import Dict, List, Any
-from urllib.parse import urlparse
+from typing import Dict, List, Any, Optional
 from app.core.config import settings
 
+# Taille de l'échantillon lu pour détecter encodage et délimiteur
+SNIFF_BYTES = 64 * 1024
+CSV_DELIMITERS = [",", ";", "\t", "|"]
+# Taille des blocs lus en streaming pour les exports de liens
+EDGES_BLOCK_SIZE = 16 * 1024 * 1024
+# Liste d'arêtes binaire (n, 2) int32 : indices de ligne dans pages.csv
+EDGES_FILENAME = "edges.npy"
+# Schéma http(s) suivi d'un hôte non vide (équivalent de urlparse().netloc)
+URL_PATTERN = r"^https?://[^/?#\s]+"
+
+def sniff_csv_format(file_path: str, sample_size: int = SNIFF_BYTES) -> Dict[str, Any]:
+    """Détecter encodage, délimiteur et en-tête à partir des premiers Ko du fichier"""
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_size)
+    
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = "utf-16"
+    else:
+        try:
+            sample.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            # Un caractère multi-octets peut être coupé en fin d'échantillon
+            if len(sample) == sample_size and e.start >= len(sample) - 3:
+                encoding = "utf-8"
+            else:
+                try:
+                    sample.decode("cp1252")
+                    encoding = "cp1252"
+                except UnicodeDecodeError:
+                    encoding = "latin-1"
+    
+    text = sample.decode(encoding, errors="ignore")
+    
+    # Le délimiteur retenu est celui qui découpe l'en-tête en un maximum de colonnes
+    best_delimiter, header = CSV_DELIMITERS[0], []
+    for delimiter in CSV_DELIMITERS:
+        fields = next(csv.reader(io.StringIO(text), delimiter=delimiter), [])
+        if len(fields) > len(header):
+            best_delimiter, header = delimiter, fields
+    
+    return {
+        "encoding": encoding,
+        "delimiter": best_delimiter,
+        "header": [field.strip() for field in header]
+    }
+
+def read_csv_columns(file_path: str, csv_format: Dict[str, Any], columns: List[str]) -> pd.DataFrame:
+    """Lire uniquement les colonnes demandées, en texte, avec le lecteur colonnaire Arrow"""
+    # Arrow ignore lui-même le BOM UTF-8
+    encoding = "utf8" if csv_format["encoding"] in ("utf-8", "utf-8-sig") else csv_format["encoding"]
+    
+    try:
+        table = pa_csv.read_csv(
+            file_path,
+            read_options=pa_csv.ReadOptions(encoding=encoding),
+            parse_options=pa_csv.ParseOptions(
+                delimiter=csv_format["delimiter"],
+                newlines_in_values=True
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={col: pa.string() for col in columns}
+            )
+        )
+        return table.to_pandas()
+    except pa.ArrowInvalid as e:
+        # Lignes irrégulières : repli sur le lecteur pandas, toujours en une seule passe
+        print(f"⚠️ INGEST: Lecture Arrow impossible ({e}), repli sur pandas")
+        return pd.read_csv(
+            file_path,
+            sep=csv_format["delimiter"],
+            encoding=csv_format["encoding"],
+            usecols=columns,
+            dtype=str,
+            keep_default_na=False
+        )
+
+def open_csv_batches(file_path: str, csv_format: Dict[str, Any], columns: List[str]) -> pa_csv.CSVStreamingReader:
+    """Lecture en flux par blocs (record batches) des colonnes demandées"""
+    encoding = "utf8" if csv_format["encoding"] in ("utf-8", "utf-8-sig") else csv_format["encoding"]
+    
+    return pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(encoding=encoding, block_size=EDGES_BLOCK_SIZE),
+        parse_options=pa_csv.ParseOptions(
+            delimiter=csv_format["delimiter"],
+            newlines_in_values=True
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types={col: pa.string() for col in columns}
+        )
+    )
+
+def url_rejection_reasons(urls: pd.Series) -> Dict[str, np.ndarray]:
+    """Masques de rejet exclusifs (une ligne n'est comptée que pour son premier motif)"""
+    missing = (urls == "").to_numpy()
+    not_http = ~missing & ~urls.str.startswith("http").to_numpy(dtype=bool)
+    malformed = ~missing & ~not_http & ~urls.str.match(URL_PATTERN).to_numpy(dtype=bool)
+    # Une URL identique à une URL précédente invalide est elle-même invalide
+    duplicate = ~(missing | not_http | malformed) & urls.duplicated().to_numpy()
+    
+    return {
+        "missing_url": missing,
+        "not_http": not_http,
+        "malformed_url": malformed,
+        "duplicate_url": duplicate
+    }
+
 class IngestService:
     def __init__(self):
         self.data_dir = Path(settings.DATA_DIR)
@@ -12,71 +130,67 @@ class IngestService:
     
     def validate_pages_csv(self, file_path: str) -> Dict[str, Any]:
         try:
-            # Try comma first, then semicolon
-            try:
-                df = pd.read_csv(file_path, sep=',', encoding='utf-8')
-            except:
-                df = pd.read_csv(file_path, sep=';', encoding='utf-8')
+            # Délimiteur et encodage détectés sur les premiers Ko, une seule lecture du fichier
+            csv_format = sniff_csv_format(file_path)
+            header = csv_format["header"]
             
             # Support des différents formats de colonnes
             url_columns = ["url", "Adresse", "URL"]
             content_columns = ["contenu", "Title 1", "Meta Description 1", "H1-1", "content"]
             
             url_col = None
-            content_col = None
             
             # Trouver la colonne URL
             for col in url_columns:
-                if col in df.columns:
+                if col in header:
                     url_col = col
                     break
             
             if not url_col:
-                raise ValueError(f"Aucune colonne URL trouvée. Colonnes disponibles: {list(df.columns)}")
+                raise ValueError(f"Aucune colonne URL trouvée. Colonnes disponibles: {header}")
             
             # Construire le contenu à partir de plusieurs colonnes si nécessaire
-            if "contenu" in df.columns:
-                content_col = "contenu"
+            if "contenu" in header:
+                content_parts = ["contenu"]
             else:
                 # Combiner Title, Meta Description et H1 pour créer le contenu
-                content_parts = []
-                for col in ["Title 1", "Meta Description 1", "H1-1"]:
-                    if col in df.columns:
-                        content_parts.append(col)
+                content_parts = [col for col in ["Title 1", "Meta Description 1", "H1-1"] if col in header]
                 
-                if content_parts:
-                    df["contenu"] = df[content_parts].fillna("").agg(" ".join, axis=1)
-                    content_col = "contenu"
-                else:
+                if not content_parts:
                     raise ValueError("Aucune colonne de contenu trouvée")
             
-            # Nettoyer les données
-            df = df.dropna(subset=[url_col])
-            df["url"] = df[url_col]  # Normaliser le nom de colonne
+            # Lecture colonnaire limitée aux colonnes utiles
+            df = read_csv_columns(file_path, csv_format, [url_col] + content_parts)
+            total_rows = len(df)
             
-            valid_urls = []
-            for idx, row in df.iterrows():
-                try:
-                    url = str(row["url"]).strip()
-                    if url.startswith('http'):
-                        parsed = urlparse(url)
-                        if parsed.scheme and parsed.netloc:
-                            valid_urls.append(idx)
-                except:
-                    continue
+            contenu = df[content_parts[0]].fillna("")
+            for col in content_parts[1:]:
+                contenu = contenu + " " + df[col].fillna("")
             
-            df = df.iloc[valid_urls]
+            # Nettoyer et valider les URLs de façon vectorisée
+            urls = df[url_col].fillna("").str.strip()
+            reasons = url_rejection_reasons(urls)
             
-            if df.empty:
-                raise ValueError("Aucune URL valide trouvée")
+            rejected = {reason: int(mask.sum()) for reason, mask in reasons.items()}
+            valid_mask = ~np.logical_or.reduce(list(reasons.values()))
             
-            df["contenu"] = df["contenu"].fillna("")
+            df = pd.DataFrame({
+                "url": urls[valid_mask],
+                "contenu": contenu[valid_mask]
+            }).reset_index(drop=True)
+            
+            if df.empty:
+                raise ValueError(f"Aucune URL valide trouvée (rejets: {rejected})")
             
             return {
                 "valid": True,
                 "rows": len(df),
+                "total_rows": total_rows,
+                "rejected": rejected,
+                "delimiter": csv_format["delimiter"],
+                "encoding": csv_format["encoding"],
                 "dataframe": df,
-                "message": f"Validation réussie: {len(df)} lignes valides"
+                "message": f"Validation réussie: {len(df)} lignes valides sur {total_rows}"
             }
             
         except Exception as e:
@@ -87,9 +201,10 @@ class IngestService:
                 "message": f"Erreur de validation: {str(e)}"
             }
     
-    def validate_edges_csv(self, file_path: str) -> Dict[str, Any]:
+    def validate_edges_csv(self, file_path: str, page_urls: pd.Series) -> Dict[str, Any]:
         try:
-            df = pd.read_csv(file_path, sep=',', encoding='utf-8')
+            csv_format = sniff_csv_format(file_path)
+            header = csv_format["header"]
             
             # Support des différents formats de colonnes pour les liens
             source_columns = ["source", "Source", "from", "url_source"]
@@ -100,49 +215,73 @@ class IngestService:
             
             # Trouver les colonnes source et destination
             for col in source_columns:
-                if col in df.columns:
+                if col in header:
                     source_col = col
                     break
             
             for col in dest_columns:
-                if col in df.columns:
+                if col in header:
                     dest_col = col
                     break
             
             if not source_col or not dest_col:
-                raise ValueError(f"Colonnes source/destination non trouvées. Disponibles: {list(df.columns)}")
+                raise ValueError(f"Colonnes source/destination non trouvées. Disponibles: {header}")
             
-            # Normaliser les noms de colonnes
-            df["source"] = df[source_col].astype(str)
-            df["destination"] = df[dest_col].astype(str)
+            # Dictionnaire URL -> indice de nœud (position dans pages.csv)
+            url_dictionary = pa.array(page_urls.to_numpy(), type=pa.string())
             
-            # Filtrer les liens internes valides
-            valid_links = []
-            for idx, row in df.iterrows():
-                try:
-                    source = str(row["source"]).strip()
-                    dest = str(row["destination"]).strip()
-                    
-                    if (source.startswith('http') and dest.startswith('http') and 
-                        source != dest):  # Éviter les self-links
-                        valid_links.append(idx)
-                except:
-                    continue
+            total_rows = 0
+            external_links = 0
+            self_links = 0
+            batch_keys = []
             
-            df = df.iloc[valid_links]
+            reader = open_csv_batches(file_path, csv_format, [source_col, dest_col])
+            for batch in reader:
+                total_rows += batch.num_rows
+                
+                sources = pc.index_in(pc.utf8_trim_whitespace(batch.column(0)), value_set=url_dictionary)
+                targets = pc.index_in(pc.utf8_trim_whitespace(batch.column(1)), value_set=url_dictionary)
+                sources = sources.fill_null(-1).to_numpy()
+                targets = targets.fill_null(-1).to_numpy()
+                
+                # Liens sortant du jeu de pages (externes, ressources, URLs invalides)
+                internal = (sources >= 0) & (targets >= 0)
+                external_links += int(np.count_nonzero(~internal))
+                
+                # Éviter les self-links
+                not_self = sources != targets
+                self_links += int(np.count_nonzero(internal & ~not_self))
+                
+                keep = internal & not_self
+                keys = (sources[keep].astype(np.int64) << 32) | targets[keep].astype(np.int64)
+                batch_keys.append(np.unique(keys))
+            
+            # Dédoublonnage global sur les clés (source, destination) empaquetées en int64
+            keys = np.unique(np.concatenate(batch_keys)) if batch_keys else np.empty(0, dtype=np.int64)
+            kept_rows = total_rows - external_links - self_links
+            
+            edges = np.empty((len(keys), 2), dtype=np.int32)
+            edges[:, 0] = keys >> 32
+            edges[:, 1] = keys & 0xFFFFFFFF
             
             return {
                 "valid": True,
-                "rows": len(df),
-                "dataframe": df,
-                "message": f"Validation réussie: {len(df)} liens valides"
+                "rows": len(edges),
+                "total_rows": total_rows,
+                "rejected": {
+                    "external_link": external_links,
+                    "self_link": self_links,
+                    "duplicate_link": kept_rows - len(edges)
+                },
+                "edges": edges,
+                "message": f"Validation réussie: {len(edges)} liens internes sur {total_rows}"
             }
             
         except Exception as e:
             return {
                 "valid": False,
                 "rows": 0,
-                "dataframe": None,
+                "edges": None,
                 "message": f"Erreur de validation liens: {str(e)}"
             }
 
@@ -158,6 +297,11 @@ class IngestService:
         project_dir = self.data_dir / project_id
         project_dir.mkdir(exist_ok=True)
         
+        # Les liens d'un import précédent sont des indices de l'ancien pages.csv : à supprimer
+        # même si ce ré-import n'apporte aucun lien
+        for previous_edges in (EDGES_FILENAME, "edges.csv"):
+            (project_dir / previous_edges).unlink(missing_ok=True)
+        
         # Sauvegarder les pages
         pages_processed_path = project_dir / "pages.csv"
         pages_df[["url", "contenu", "node_id"]].to_csv(pages_processed_path, index=False)
@@ -168,42 +312,39 @@ class IngestService:
             "pages_path": str(pages_processed_path),
             "edges_rows": 0,
             "edges_path": None,
+            "rejected": validation_result["rejected"],
             "message": f"CSV traité avec succès: {len(pages_df)} pages"
         }
         
         # Traiter les liens si fournis
         if edges_path:
-            edges_validation = self.validate_edges_csv(edges_path)
+            # Les liens sont encodés par indice de ligne dans pages.csv
+            edges_validation = self.validate_edges_csv(edges_path, pages_df["url"])
             if edges_validation["valid"]:
-                edges_df = edges_validation["dataframe"]
+                edges = edges_validation["edges"]
                 
-                # Filtrer les liens pour ne garder que ceux entre pages de notre dataset
-                pages_urls = set(pages_df["url"])
-                filtered_edges = []
-                
-                for _, row in edges_df.iterrows():
-                    source = str(row["source"]).strip()
-                    dest = str(row["destination"]).strip()
-                    
-                    if source in pages_urls and dest in pages_urls:
-                        filtered_edges.append({
-                            "source": source,
-                            "target": dest
-                        })
-                
-                if filtered_edges:
-                    edges_final_df = pd.DataFrame(filtered_edges)
-                    edges_processed_path = project_dir / "edges.csv"
-                    edges_final_df.to_csv(edges_processed_path, index=False)
+                if len(edges):
+                    edges_processed_path = project_dir / EDGES_FILENAME
+                    np.save(edges_processed_path, edges)
                     
                     result.update({
-                        "edges_rows": len(edges_final_df),
+                        "edges_rows": len(edges),
                         "edges_path": str(edges_processed_path),
-                        "message": f"CSV traité avec succès: {len(pages_df)} pages, {len(edges_final_df)} liens internes"
+                        "edges_rejected": edges_validation["rejected"],
+                        "message": f"CSV traité avec succès: {len(pages_df)} pages, {len(edges)} liens internes"
                     })
         
         return result
     
+    def get_edges(self, project_id: str) -> Optional[np.ndarray]:
+        """Liste d'arêtes (source, destination) en indices int32 de pages.csv"""
+        edges_path = self.data_dir / project_id / EDGES_FILENAME
+        
+        if not edges_path.exists():
+            return None
+        
+        return np.load(edges_path, mmap_mode="r")
+    
     def get_pages(self, project_id: str) -> pd.DataFrame:
         project_dir = self.data_dir / project_id
         pages_path = project_dir / "pages.csv"
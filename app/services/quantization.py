@@ -0,0 +1,112 @@
+import numpy as np
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+from numpy.lib.format import open_memmap
+
+# Modes de stockage des embeddings : 4, 2 ou 1 octet(s) par composante
+STORAGE_MODES = ("float32", "float16", "int8")
+# Lignes déquantifiées à la fois quand un float32 est nécessaire
+DEQUANT_BLOCK_ROWS = 65536
+
+class QuantizedVectors:
+    """Vecteurs quantifiés en int8 symétrique, une échelle par dimension.
+    
+    Les composantes d'un embedding normalisé ont des amplitudes très différentes
+    d'une dimension à l'autre : une échelle par dimension garde la précision
+    des petites dimensions, contrairement à une échelle globale.
+    """
+    
+    mode = "int8"
+    
+    def __init__(self, codes: np.ndarray, scale: np.ndarray):
+        self.codes = codes
+        self.scale = scale.astype(np.float32)
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.codes.shape
+    
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scale.nbytes
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def block(self, start: int, stop: int) -> np.ndarray:
+        return self.codes[start:stop].astype(np.float32) * self.scale
+
+VectorStore = Union[np.ndarray, QuantizedVectors]
+
+def storage_mode(vectors: VectorStore) -> str:
+    if isinstance(vectors, QuantizedVectors):
+        return "int8"
+    return "float16" if vectors.dtype == np.float16 else "float32"
+
+def iter_float32_blocks(vectors: VectorStore, block_rows: int = DEQUANT_BLOCK_ROWS) -> Iterator[Tuple[int, np.ndarray]]:
+    """Parcours par blocs (offset, bloc float32) : seul un bloc est déquantifié à la fois"""
+    for start in range(0, len(vectors), block_rows):
+        stop = min(start + block_rows, len(vectors))
+        if isinstance(vectors, QuantizedVectors):
+            yield start, vectors.block(start, stop)
+        else:
+            yield start, np.asarray(vectors[start:stop], dtype=np.float32)
+
+def rows_float32(vectors: VectorStore, rows: np.ndarray) -> np.ndarray:
+    """Lignes choisies (échantillon, requêtes) déquantifiées en float32"""
+    if isinstance(vectors, QuantizedVectors):
+        return vectors.codes[rows].astype(np.float32) * vectors.scale
+    return np.asarray(vectors[rows], dtype=np.float32)
+
+def iter_rows_float32(vectors: VectorStore, rows: np.ndarray, block_rows: int = DEQUANT_BLOCK_ROWS) -> Iterator[Tuple[int, np.ndarray]]:
+    """Comme iter_float32_blocks, sur les seules lignes choisies (offset dans rows, bloc float32)"""
+    for start in range(0, len(rows), block_rows):
+        yield start, rows_float32(vectors, rows[start:start + block_rows])
+
+def to_float32(vectors: VectorStore, block_rows: int = DEQUANT_BLOCK_ROWS) -> np.ndarray:
+    """Matrice float32 complète, pour les étapes qui l'exigent (UMAP, HDBSCAN, K-means)"""
+    if storage_mode(vectors) == "float32":
+        return np.asarray(vectors, dtype=np.float32)
+    
+    result = np.empty(vectors.shape, dtype=np.float32)
+    for start, block in iter_float32_blocks(vectors, block_rows):
+        result[start:start + len(block)] = block
+    return result
+
+def quantize_file(source_path: Path, target_path: Path, scale_path: Path, mode: str, block_rows: int = DEQUANT_BLOCK_ROWS):
+    """Réécrire un .npy float32 en float16 ou int8 (+ échelles), bloc par bloc"""
+    if mode not in STORAGE_MODES[1:]:
+        raise ValueError(f"Mode de quantification non supporté: {mode}")
+    
+    source = np.load(source_path, mmap_mode="r")
+    
+    if len(source) == 0:
+        np.save(target_path, np.empty(source.shape, dtype=np.float16 if mode == "float16" else np.int8))
+        if mode == "int8":
+            np.save(scale_path, np.ones(source.shape[1], dtype=np.float32))
+        return
+    
+    if mode == "int8":
+        # Première passe : amplitude max par dimension
+        max_abs = np.zeros(source.shape[1], dtype=np.float32)
+        for start in range(0, len(source), block_rows):
+            np.maximum(max_abs, np.abs(source[start:start + block_rows]).max(axis=0), out=max_abs)
+        scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        np.save(scale_path, scale)
+    
+    target = open_memmap(target_path, mode="w+", dtype=np.float16 if mode == "float16" else np.int8, shape=source.shape)
+    for start in range(0, len(source), block_rows):
+        block = source[start:start + block_rows]
+        if mode == "int8":
+            target[start:start + len(block)] = np.clip(np.rint(block / scale), -127, 127).astype(np.int8)
+        else:
+            target[start:start + len(block)] = block.astype(np.float16)
+    target.flush()
+
+def open_vectors(vectors_path: Path, scale_path: Path) -> VectorStore:
+    """Ouvrir une matrice d'embeddings en lecture mappée, quel que soit son mode de stockage"""
+    vectors = np.load(vectors_path, mmap_mode="r")
+    
+    if vectors.dtype == np.int8:
+        return QuantizedVectors(vectors, np.load(scale_path))
+    return vectors
\ No newline at end of file
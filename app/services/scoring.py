@@ -4,6 +4,8 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple, Set
 from collections import deque
 from app.core.config import settings
+from app.services.ingest import EDGES_FILENAME
+from app.services.index import SemanticNeighbors
 
 class ScoringService:
     def __init__(self):
@@ -14,10 +16,21 @@ class ScoringService:
     
     def load_edges_data(self, project_id: str) -> Optional[pd.DataFrame]:
         project_dir = self.data_dir / project_id
-        edges_path = project_dir / "edges.csv"
+        edges_path = project_dir / EDGES_FILENAME
         
         if edges_path.exists():
-            return pd.read_csv(edges_path)
+            # Arêtes stockées en indices de ligne de pages.csv
+            edges = np.load(edges_path, mmap_mode="r")
+            urls = pd.read_csv(project_dir / "pages.csv", usecols=["url"])["url"].to_numpy()
+            return pd.DataFrame({
+                "source": urls[edges[:, 0]],
+                "target": urls[edges[:, 1]]
+            })
+        
+        # Anciens projets : edges.csv avec les URLs en clair
+        legacy_edges_path = project_dir / "edges.csv"
+        if legacy_edges_path.exists():
+            return pd.read_csv(legacy_edges_path)
         return None
 
     def build_link_graph(self, project_id: str = None, edges_data: Optional[List[Dict[str, str]]] = None) -> Dict[str, Set[str]]:
@@ -27,7 +40,10 @@ class ScoringService:
         if project_id and not edges_data:
             edges_df = self.load_edges_data(project_id)
             if edges_df is not None:
-                edges_data = edges_df.to_dict('records')
+                edges_df = edges_df.dropna(subset=["source", "target"])
+                for source, targets in edges_df.groupby("source", sort=False)["target"]:
+                    graph[source] = set(targets)
+                return graph
         
         if edges_data:
             for edge in edges_data:
@@ -77,6 +93,51 @@ class ScoringService:
         
         return None
     
+    def reverse_link_graph(self, graph: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+        """Liens entrants : reverse[target] = pages qui pointent vers target"""
+        reverse = {}
+        for source, targets in graph.items():
+            for target in targets:
+                reverse.setdefault(target, set()).add(source)
+        return reverse
+    
+    def calculate_link_distances(
+        self,
+        graph: Dict[str, Set[str]],
+        source: str,
+        targets: Set[str],
+        max_hops: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Distances depuis source vers plusieurs cibles en un seul parcours en largeur ;
+        les cibles hors d'atteinte en max_hops sont absentes du résultat"""
+        if max_hops is None:
+            max_hops = self.dmax
+        
+        distances = {source: 0} if source in targets else {}
+        remaining = len(targets) - len(distances)
+        if source not in graph or remaining == 0:
+            return distances
+        
+        visited = {source}
+        queue = deque([(source, 0)])
+        
+        while queue and remaining:
+            current, distance = queue.popleft()
+            
+            if distance >= max_hops:
+                continue
+            
+            for neighbor in graph.get(current, ()):
+                if neighbor in visited:
+                    continue
+                visited.add(neighbor)
+                if neighbor in targets:
+                    distances[neighbor] = distance + 1
+                    remaining -= 1
+                queue.append((neighbor, distance + 1))
+        
+        return distances
+    
     def anomaly_score(self, cosine: float, hops: Optional[int]) -> float:
         if hops is None:
             return 0.0
@@ -89,45 +150,63 @@ class ScoringService:
         vectors: np.ndarray,
         node_ids: List[str],
         urls: List[str],
-        semantic_neighbors: List[Dict[str, Any]],
+        semantic_neighbors: SemanticNeighbors,
         graph: Optional[Dict[str, Set[str]]] = None
     ) -> List[Dict[str, Any]]:
         proximity_items = []
         
-        node_to_url = dict(zip(node_ids, urls))
+        # Filtre de similarité sur les colonnes, avant toute recherche de chemin ; (i, j) et (j, i)
+        # ne forment qu'une paire, dont les deux sens de liens sont calculés ensemble
+        candidates = semantic_neighbors.filter(semantic_neighbors.sim >= self.sim_threshold).canonical()
+        reverse_graph = self.reverse_link_graph(graph) if graph else None
         
-        for neighbor in semantic_neighbors:
-            node_i = neighbor["node_i"]
-            node_j = neighbor["node_j"]
-            cosine_sim = neighbor["similarity"]
-            
-            if cosine_sim < self.sim_threshold:
+        # Paires triées par i : un parcours sortant et un parcours entrant par page source
+        pair_i = candidates.i
+        _, group_starts = np.unique(pair_i, return_index=True)
+        group_stops = np.append(group_starts[1:], len(pair_i))
+        
+        for start, stop in zip(group_starts.tolist(), group_stops.tolist()):
+            i = int(pair_i[start])
+            url_i = urls[i]
+            if not url_i:
                 continue
             
-            url_i = node_to_url.get(node_i)
-            url_j = node_to_url.get(node_j)
-            
-            if not url_i or not url_j:
-                continue
+            group_j = candidates.j[start:stop].tolist()
+            group_sims = candidates.sim[start:stop].tolist()
             
-            hops = None
+            outgoing, incoming = {}, {}
             if graph:
-                hops = self.calculate_link_distance(graph, url_i, url_j)
+                targets = {urls[j] for j in group_j if urls[j]}
+                outgoing = self.calculate_link_distances(graph, url_i, targets)
+                incoming = self.calculate_link_distances(reverse_graph, url_i, targets)
+            
+            for j, cosine_sim in zip(group_j, group_sims):
+                url_j = urls[j]
+                if not url_j:
+                    continue
+                
+                hops_ij = outgoing.get(url_j)
+                hops_ji = incoming.get(url_j)
+                known = [h for h in (hops_ij, hops_ji) if h is not None]
+                # Le chemin le plus court, dans un sens ou dans l'autre
+                hops = min(known) if known else None
                 
                 if hops is not None and hops < self.hops_threshold:
                     continue
-            
-            anomaly = self.anomaly_score(cosine_sim, hops)
-            
-            proximity_items.append({
-                "node_i": node_i,
-                "node_j": node_j,
-                "url_i": url_i,
-                "url_j": url_j,
-                "cosine": cosine_sim,
-                "hops": hops,
-                "anomaly_score": anomaly
-            })
+                
+                anomaly = self.anomaly_score(cosine_sim, hops)
+                
+                proximity_items.append({
+                    "node_i": node_ids[i],
+                    "node_j": node_ids[j],
+                    "url_i": url_i,
+                    "url_j": url_j,
+                    "cosine": cosine_sim,
+                    "hops": hops,
+                    "hops_ij": hops_ij,
+                    "hops_ji": hops_ji,
+                    "anomaly_score": anomaly
+                })
         
         proximity_items.sort(key=lambda x: x["anomaly_score"], reverse=True)
         
@@ -187,7 +266,7 @@ class ScoringService:
         vectors: np.ndarray,
         node_ids: List[str],
         urls: List[str],
-        semantic_neighbors: List[Dict[str, Any]],
+        semantic_neighbors: SemanticNeighbors,
         clusters: List[Dict[str, Any]],
         edges_data: Optional[List[Dict[str, str]]] = None
     ) -> Dict[str, Any]:
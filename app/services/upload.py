@@ -0,0 +1,419 @@
+import hashlib
+import json
+import math
+import os
+import zlib
+import zstandard
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+from fastapi import UploadFile
+from app.core.config import settings
+
+# Taille des blocs copiés de la requête vers le disque
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+CSV_EXTENSIONS = (".csv", ".csv.gz", ".csv.zst", ".gz", ".zst")
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+class UploadTooLarge(ValueError):
+    pass
+
+def detect_compression(head: bytes) -> Optional[str]:
+    """Compression détectée sur les premiers octets (l'extension du fichier n'est pas fiable)"""
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+class ZstdFrameTracker:
+    """Suit les frontières de trames et de blocs zstd : zstandard ne signale pas un flux tronqué"""
+    
+    SKIPPABLE_MAGIC = 0x184D2A50  # 0x184D2A50 à 0x184D2A5F
+    
+    def __init__(self):
+        self._header = b""
+        self._skip = 0
+        self._in_frame = False
+        self._checksum = False
+    
+    def _needed(self) -> int:
+        if self._in_frame:
+            return 3  # En-tête de bloc
+        if len(self._header) < 4:
+            return 4
+        magic = int.from_bytes(self._header[:4], "little")
+        if magic & 0xFFFFFFF0 == self.SKIPPABLE_MAGIC:
+            return 8
+        if self._header[:4] != ZSTD_MAGIC:
+            raise ValueError("Flux zstd invalide")
+        if len(self._header) < 5:
+            return 5
+        descriptor = self._header[4]
+        single_segment = (descriptor >> 5) & 1
+        content_size = (single_segment, 2, 4, 8)[descriptor >> 6]
+        return 5 + (1 - single_segment) + (0, 1, 2, 4)[descriptor & 3] + content_size
+    
+    def _consume_header(self):
+        if self._in_frame:
+            block = int.from_bytes(self._header, "little")
+            if (block >> 1) & 3 == 3:
+                raise ValueError("Flux zstd invalide")
+            # Bloc RLE : un seul octet répété
+            self._skip = 1 if (block >> 1) & 3 == 1 else block >> 3
+            if block & 1:
+                self._skip += 4 if self._checksum else 0
+                self._in_frame = False
+        elif self._header[:4] != ZSTD_MAGIC:
+            # Trame ignorable : taille sur 4 octets après le magic
+            self._skip = int.from_bytes(self._header[4:], "little")
+        else:
+            self._checksum = bool((self._header[4] >> 2) & 1)
+            self._in_frame = True
+        self._header = b""
+    
+    def feed(self, data: bytes):
+        pos = 0
+        while pos < len(data):
+            if self._skip:
+                step = min(self._skip, len(data) - pos)
+                self._skip -= step
+                pos += step
+                continue
+            needed = self._needed()
+            while len(self._header) < needed and pos < len(data):
+                take = needed - len(self._header)
+                self._header += data[pos:pos + take]
+                pos += take
+                needed = self._needed()
+            if len(self._header) == needed:
+                self._consume_header()
+    
+    @property
+    def complete(self) -> bool:
+        return not (self._in_frame or self._header or self._skip)
+
+class StreamDecompressor:
+    """Décompression en flux à mémoire bornée : la sortie est remise à sink par morceaux d'au plus
+    UPLOAD_BLOCK_SIZE octets, quel que soit le taux de compression (bombes gzip/zstd)"""
+    
+    def __init__(self, compression: str, sink):
+        self.compression = compression
+        self.sink = sink
+        if compression == "gzip":
+            self._gzip = self._open_gzip()
+        elif compression == "zstd":
+            self._frames = ZstdFrameTracker()
+            self._zstd = zstandard.ZstdDecompressor().stream_writer(
+                self, write_size=UPLOAD_BLOCK_SIZE, closefd=False
+            )
+        else:
+            raise ValueError(f"Compression non supportée: {compression}")
+    
+    @staticmethod
+    def _open_gzip():
+        # wbits=47 : en-tête gzip ou zlib détecté automatiquement
+        return zlib.decompressobj(wbits=47)
+    
+    def write(self, chunk: bytes) -> int:
+        """Sortie du stream_writer zstd"""
+        self.sink(chunk)
+        return len(chunk)
+    
+    def decompress(self, data: bytes):
+        if self.compression == "zstd":
+            self._frames.feed(data)
+            self._zstd.write(data)
+            return
+        
+        pending = False
+        while data or pending:
+            if self._gzip.eof:
+                # Plusieurs membres gzip concaténés (pigz, cat a.gz b.gz) : membre suivant
+                self._gzip = self._open_gzip()
+            chunk = self._gzip.decompress(data, UPLOAD_BLOCK_SIZE)
+            if chunk:
+                self.sink(chunk)
+            if self._gzip.eof:
+                data = self._gzip.unused_data
+                pending = False
+            else:
+                data = self._gzip.unconsumed_tail
+                # Sortie pleine : zlib peut encore avoir des octets à rendre sans nouvelle entrée
+                pending = len(chunk) == UPLOAD_BLOCK_SIZE
+    
+    def finish(self):
+        """Vider le décompresseur et refuser un fichier tronqué"""
+        if self.compression == "zstd":
+            self._zstd.flush()
+            complete = self._frames.complete
+        else:
+            tail = self._gzip.flush()
+            if tail:
+                self.sink(tail)
+            complete = self._gzip.eof
+        if not complete:
+            raise ValueError(f"Fichier {self.compression} tronqué : upload incomplet ou corrompu")
+
+def is_csv_filename(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(CSV_EXTENSIONS)
+
+class UploadService:
+    """Upload par chunks adressés par offset : écriture positionnelle, reprise et envoi parallèle"""
+    
+    FILE_TYPES = ("pages", "links")
+    
+    def __init__(self):
+        self.data_dir = Path(settings.DATA_DIR)
+        self.chunk_size = settings.UPLOAD_CHUNK_SIZE
+        self.max_size = settings.UPLOAD_MAX_SIZE
+    
+    async def save_upload(self, upload: UploadFile, target_path: Path) -> Dict[str, Any]:
+        """Copier un fichier uploadé vers le disque par blocs, en le décompressant à la volée"""
+        received = 0
+        written = 0
+        decompressor = None
+        compression = None
+        
+        try:
+            with open(target_path, "wb") as f:
+                def write_block(block: bytes):
+                    nonlocal written
+                    # Le plafond porte sur les octets décompressés, vérifié à chaque morceau borné
+                    # (protège aussi des bombes gzip/zstd)
+                    written += len(block)
+                    if written > self.max_size:
+                        raise UploadTooLarge(f"Fichier trop volumineux (limite: {self.max_size} octets)")
+                    f.write(block)
+                
+                while True:
+                    block = await upload.read(UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+                    
+                    if received == 0:
+                        compression = detect_compression(block)
+                        if compression is not None:
+                            decompressor = StreamDecompressor(compression, write_block)
+                    received += len(block)
+                    
+                    if decompressor is not None:
+                        decompressor.decompress(block)
+                    else:
+                        write_block(block)
+                
+                if decompressor is not None:
+                    decompressor.finish()
+        except Exception:
+            target_path.unlink(missing_ok=True)
+            raise
+        
+        print(f"💾 UPLOAD: {upload.filename} -> {target_path.name} ({received} octets reçus, {written} écrits, compression: {compression})")
+        
+        return {
+            "path": target_path,
+            "bytes_received": received,
+            "bytes_written": written,
+            "compression": compression
+        }
+    
+    def _paths(self, project_id: str, file_type: str) -> Dict[str, Path]:
+        if file_type not in self.FILE_TYPES:
+            raise ValueError(f"Type de fichier inconnu: {file_type} (attendu: {', '.join(self.FILE_TYPES)})")
+        
+        project_dir = self.data_dir / project_id
+        project_dir.mkdir(exist_ok=True)
+        
+        return {
+            "data": project_dir / f"temp_{file_type}.csv",
+            # Un octet par chunk : 1 = reçu et vérifié
+            "bitmap": project_dir / f"temp_{file_type}.chunks",
+            "manifest": project_dir / f"temp_{file_type}.json"
+        }
+    
+    def _load_manifest(self, paths: Dict[str, Path]) -> Optional[Dict[str, Any]]:
+        if not paths["manifest"].exists():
+            return None
+        
+        with open(paths["manifest"], "r") as f:
+            return json.load(f)
+    
+    def init_upload(
+        self,
+        project_id: str,
+        file_type: str,
+        file_size: int,
+        chunk_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Préallouer le fichier cible ; un upload identique déjà commencé est repris tel quel"""
+        paths = self._paths(project_id, file_type)
+        chunk_size = min(chunk_size or self.chunk_size, self.chunk_size)
+        
+        if file_size <= 0 or chunk_size <= 0:
+            raise ValueError("file_size et chunk_size doivent être positifs")
+        if file_size > self.max_size:
+            raise UploadTooLarge(f"Fichier trop volumineux (limite: {self.max_size} octets)")
+        
+        manifest = self._load_manifest(paths)
+        resumable = (
+            manifest is not None
+            and manifest["file_size"] == file_size
+            and manifest["chunk_size"] == chunk_size
+            and paths["data"].exists()
+            and paths["bitmap"].exists()
+        )
+        
+        if not resumable:
+            total_chunks = math.ceil(file_size / chunk_size)
+            manifest = {
+                "file_type": file_type,
+                "file_size": file_size,
+                "chunk_size": chunk_size,
+                "total_chunks": total_chunks
+            }
+            
+            with open(paths["data"], "wb") as f:
+                f.truncate(file_size)
+            with open(paths["bitmap"], "wb") as f:
+                f.write(bytes(total_chunks))
+            with open(paths["manifest"], "w") as f:
+                json.dump(manifest, f)
+            
+            print(f"🗂️ UPLOAD: {file_type} préalloué ({file_size} octets, {total_chunks} chunks)")
+        else:
+            print(f"♻️ UPLOAD: Reprise de l'upload {file_type}")
+        
+        return {**manifest, **self.get_status(project_id, file_type)}
+    
+    async def write_chunk(
+        self,
+        project_id: str,
+        file_type: str,
+        chunk_index: int,
+        chunk: UploadFile,
+        checksum: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Écrire un chunk à son offset par blocs, puis vérifier sa taille et, s'il est fourni,
+        son SHA-256 (les navigateurs hors HTTPS n'ont pas crypto.subtle pour le calculer)"""
+        paths = self._paths(project_id, file_type)
+        manifest = self._load_manifest(paths)
+        
+        if manifest is None:
+            raise ValueError(f"Upload {file_type} non initialisé")
+        
+        total_chunks = manifest["total_chunks"]
+        if not 0 <= chunk_index < total_chunks:
+            raise ValueError(f"Index de chunk invalide: {chunk_index} (total: {total_chunks})")
+        
+        offset = chunk_index * manifest["chunk_size"]
+        expected_size = min(manifest["chunk_size"], manifest["file_size"] - offset)
+        
+        # Écritures positionnelles : les chunks peuvent arriver dans n'importe quel ordre, en parallèle
+        digest = hashlib.sha256()
+        size = 0
+        fd = os.open(paths["data"], os.O_WRONLY)
+        try:
+            while True:
+                block = await chunk.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                if size + len(block) > expected_size:
+                    raise ValueError(f"Chunk {chunk_index} trop long: attendu {expected_size} octets")
+                
+                os.pwrite(fd, block, offset + size)
+                digest.update(block)
+                size += len(block)
+        finally:
+            os.close(fd)
+        
+        # Un chunk invalide reste marqué manquant et sera réécrit au prochain envoi
+        if size != expected_size:
+            raise ValueError(f"Taille du chunk {chunk_index} invalide: {size} octets, attendu {expected_size}")
+        
+        if checksum and digest.hexdigest() != checksum.lower():
+            raise ValueError(f"Checksum invalide pour le chunk {chunk_index}")
+        
+        fd = os.open(paths["bitmap"], os.O_WRONLY)
+        try:
+            os.pwrite(fd, b"\x01", chunk_index)
+        finally:
+            os.close(fd)
+        
+        return {
+            "chunk_index": chunk_index,
+            "offset": offset,
+            "size": size
+        }
+    
+    def missing_chunks(self, project_id: str, file_type: str) -> List[int]:
+        paths = self._paths(project_id, file_type)
+        
+        if not paths["bitmap"].exists():
+            raise ValueError(f"Upload {file_type} non initialisé")
+        
+        bitmap = paths["bitmap"].read_bytes()
+        return [i for i, received in enumerate(bitmap) if not received]
+    
+    def get_status(self, project_id: str, file_type: str) -> Dict[str, Any]:
+        paths = self._paths(project_id, file_type)
+        manifest = self._load_manifest(paths)
+        
+        if manifest is None:
+            return {"file_type": file_type, "initialized": False}
+        
+        missing = self.missing_chunks(project_id, file_type)
+        
+        return {
+            "file_type": file_type,
+            "initialized": True,
+            "total_chunks": manifest["total_chunks"],
+            "received_chunks": manifest["total_chunks"] - len(missing),
+            "missing_chunks": missing,
+            "complete": not missing
+        }
+    
+    def is_initialized(self, project_id: str, file_type: str) -> bool:
+        return self._paths(project_id, file_type)["manifest"].exists()
+    
+    def complete_upload(self, project_id: str, file_type: str, target_path: Path) -> Path:
+        """Vérifier la complétude puis déplacer le fichier assemblé vers target_path"""
+        paths = self._paths(project_id, file_type)
+        
+        if not self.is_initialized(project_id, file_type):
+            raise ValueError(f"Aucun fichier {file_type} uploadé")
+        
+        missing = self.missing_chunks(project_id, file_type)
+        if missing:
+            raise ValueError(f"Upload {file_type} incomplet: {len(missing)} chunks manquants")
+        
+        with open(paths["data"], "rb") as f:
+            compression = detect_compression(f.read(4))
+        
+        if compression is None:
+            paths["data"].replace(target_path)
+        else:
+            # Fichier compressé assemblé : décompression en flux vers le fichier final
+            written = 0
+            try:
+                with open(paths["data"], "rb") as src, open(target_path, "wb") as dst:
+                    def write_block(block: bytes):
+                        nonlocal written
+                        written += len(block)
+                        if written > self.max_size:
+                            raise UploadTooLarge(f"Fichier trop volumineux (limite: {self.max_size} octets)")
+                        dst.write(block)
+                    
+                    decompressor = StreamDecompressor(compression, write_block)
+                    for block in iter(lambda: src.read(UPLOAD_BLOCK_SIZE), b""):
+                        decompressor.decompress(block)
+                    decompressor.finish()
+            except Exception:
+                target_path.unlink(missing_ok=True)
+                raise
+            paths["data"].unlink()
+        
+        paths["bitmap"].unlink()
+        paths["manifest"].unlink()
+        
+        return target_path
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Mise à jour incrémentale de l'index et du graphe des voisins contre une reconstruction complète.
+
+Construit l'index exact d'un site synthétique, puis simule un ré-import : pages retirées, modifiées
+(nouveau vecteur) et ajoutées, dans un ordre de lignes différent. Vérifie que le graphe mis à jour
+est identique à celui d'une reconstruction (aux ex æquo près) et compare les durées.
+
+Usage : python benchmarks/bench_incremental_index.py [nb_pages] [part_modifiée]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ["INDEX_TYPE"] = "flat"
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+
+from app.services.index import GRAPH_UPDATE_MARGIN, VectorIndexService
+
+
+def synthetic_vectors(rng, n: int, dims: int, centers: np.ndarray) -> np.ndarray:
+    # Écart au centre variable d'une page à l'autre : cœur de thématique dense, bords plus lâches
+    spread = rng.uniform(0.1, 0.8, (n, 1))
+    vectors = centers[rng.integers(0, len(centers), n)] + spread * rng.standard_normal((n, dims))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def compare_graphs(updated, rebuilt) -> int:
+    """Lignes dont les listes diffèrent autrement que par l'ordre d'ex æquo"""
+    close = np.isclose(updated.sims, rebuilt.sims, atol=GRAPH_UPDATE_MARGIN, rtol=0) | (
+        np.isinf(updated.sims) & np.isinf(rebuilt.sims)
+    )
+    bad_rows = ~close.all(axis=1)
+
+    for row in np.flatnonzero(~bad_rows & (updated.neighbors != rebuilt.neighbors).any(axis=1)):
+        # Voisins différents : seulement admis parmi des similarités à égalité avec la k-ième
+        kth = rebuilt.sims[row, -1]
+        strict_updated = set(updated.neighbors[row][updated.sims[row] > kth + GRAPH_UPDATE_MARGIN])
+        strict_rebuilt = set(rebuilt.neighbors[row][rebuilt.sims[row] > kth + GRAPH_UPDATE_MARGIN])
+        bad_rows[row] = strict_updated != strict_rebuilt
+
+    return int(bad_rows.sum())
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    churn = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    dims = 256
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, n_pages // 100), dims))
+
+    service = VectorIndexService()
+    vectors = synthetic_vectors(rng, n_pages, dims, centers)
+    node_ids = [f"node-{i}" for i in range(n_pages)]
+    urls = [f"https://example.com/page-{i}" for i in range(n_pages)]
+
+    start = time.perf_counter()
+    index = service.build_index(vectors)
+    graph = service.build_neighbor_graph(index, vectors)
+    initial_seconds = time.perf_counter() - start
+    index_path = service.save_index(index, "bench", 1, node_ids, urls, graph)
+
+    # Ré-import : retraits, modifications, ajouts, lignes dans un autre ordre
+    n_churn = max(1, int(churn * n_pages))
+    removed = set(rng.choice(n_pages, n_churn, replace=False).tolist())
+    remaining = [i for i in range(n_pages) if i not in removed]
+    changed = set(rng.choice(remaining, n_churn, replace=False).tolist())
+
+    new_vectors = [vectors[i] if i not in changed else synthetic_vectors(rng, 1, dims, centers)[0] for i in remaining]
+    new_vectors += list(synthetic_vectors(rng, n_churn, dims, centers))
+    new_ids = [node_ids[i] for i in remaining] + [f"node-new-{i}" for i in range(n_churn)]
+    order = rng.permutation(len(new_ids))
+    new_vectors = np.stack(new_vectors)[order]
+    new_ids = [new_ids[i] for i in order]
+
+    start = time.perf_counter()
+    _, updated, stats = service.update_index(index_path, new_vectors, new_ids)
+    incremental_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rebuilt_index = service.build_index(new_vectors)
+    rebuilt = service.build_neighbor_graph(rebuilt_index, new_vectors)
+    rebuild_seconds = time.perf_counter() - start
+
+    mismatches = compare_graphs(updated, rebuilt)
+    threshold = service_threshold()
+    pairs_updated = updated.to_pairs(threshold)
+    pairs_rebuilt = rebuilt.to_pairs(threshold)
+
+    print(f"\n📦 {n_pages} pages, {n_churn} retirées / modifiées / ajoutées, k={service.k}")
+    print(f"  construction initiale {initial_seconds:.2f}s")
+    print(f"  mise à jour incrémentale {incremental_seconds:.2f}s ({stats['recomputed_rows']} listes recalculées, {stats['merged_rows']} complétées)")
+    print(f"  reconstruction complète {rebuild_seconds:.2f}s")
+    print(f"  paires >= {threshold} : {len(pairs_updated)} (incrémental) / {len(pairs_rebuilt)} (reconstruction)")
+    print(f"  listes divergentes : {mismatches}")
+
+    if mismatches:
+        print("❌ Le graphe incrémental diffère de la reconstruction")
+        sys.exit(1)
+    print("✅ Graphe incrémental identique à la reconstruction")
+
+
+def service_threshold() -> float:
+    from app.core.config import settings
+    return settings.SIM_THRESHOLD
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark de la validation du CSV des pages : ancien chemin (iterrows) vs lecture colonnaire.
+
+Usage : python benchmarks/bench_ingest.py [nb_lignes]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.ingest import IngestService
+
+
+def legacy_validate_pages_csv(file_path: str) -> pd.DataFrame:
+    """Reproduction de l'ancienne validation : double parsing possible + iterrows/urlparse"""
+    try:
+        df = pd.read_csv(file_path, sep=',', encoding='utf-8')
+        if "Adresse" not in df.columns:
+            raise ValueError("mauvais délimiteur")
+    except Exception:
+        df = pd.read_csv(file_path, sep=';', encoding='utf-8')
+
+    df["contenu"] = df[["Title 1", "Meta Description 1", "H1-1"]].fillna("").agg(" ".join, axis=1)
+    df = df.dropna(subset=["Adresse"])
+    df["url"] = df["Adresse"]
+
+    valid_urls = []
+    for idx, row in df.iterrows():
+        url = str(row["url"]).strip()
+        if url.startswith('http'):
+            parsed = urlparse(url)
+            if parsed.scheme and parsed.netloc:
+                valid_urls.append(idx)
+
+    return df.iloc[valid_urls]
+
+
+def write_screaming_frog_export(path: Path, n_rows: int):
+    """Export type Screaming Frog : séparateur ';', nombreuses colonnes inutiles"""
+    rng = np.random.default_rng(42)
+    urls = np.char.add("https://example.com/page-", np.arange(n_rows).astype(str))
+    # ~2% de lignes invalides
+    urls[rng.random(n_rows) < 0.02] = "mailto:contact@example.com"
+    df = pd.DataFrame({
+        "Adresse": urls,
+        "Code HTTP": 200,
+        "Type de contenu": "text/html; charset=utf-8",
+        "Title 1": np.char.add("Titre de la page ", np.arange(n_rows).astype(str)),
+        "Meta Description 1": "Une description de page assez longue pour ressembler à un vrai export",
+        "H1-1": "Titre principal",
+        "Profondeur": rng.integers(0, 10, n_rows),
+    })
+    for i in range(30):
+        df[f"Colonne {i}"] = "valeur"
+    df.to_csv(path, sep=';', index=False)
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    service = IngestService()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "pages.csv"
+        write_screaming_frog_export(path, n_rows)
+        print(f"📄 {n_rows} lignes, {path.stat().st_size / 1e6:.1f} Mo")
+
+        start = time.perf_counter()
+        legacy_rows = len(legacy_validate_pages_csv(str(path)))
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = service.validate_pages_csv(str(path))
+        new_time = time.perf_counter() - start
+
+    print(f"Ancien chemin : {legacy_time:.2f}s ({n_rows / legacy_time:,.0f} lignes/s, {legacy_rows} valides)")
+    print(f"Colonnaire    : {new_time:.2f}s ({n_rows / new_time:,.0f} lignes/s, {result['rows']} valides)")
+    print(f"Rejets        : {result['rejected']}")
+    print(f"Gain          : x{legacy_time / new_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
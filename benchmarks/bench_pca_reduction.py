@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Pré-réduction PCA avant UMAP : temps gagné sur la recherche de voisins contre voisins perdus.
+
+Pour chaque taille, compare la recherche des 15 voisins de UMAP (NNDescent, étape sans voisins
+FAISS) sur les vecteurs bruts en cosinus et sur les vecteurs réduits par PCA en euclidien.
+La préservation des voisins est le recall@14 contre les voisins exacts des vecteurs bruts,
+mesuré sur un échantillon de pages : celui de la PCA seule (voisins exacts des vecteurs réduits)
+et celui de NNDescent.
+
+Usage :
+  python benchmarks/bench_pca_reduction.py --sizes 10000,100000,500000 --dims 1024 --pca 64,128
+  python benchmarks/bench_pca_reduction.py --project <id> --pca 64,128
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+from sklearn.utils import check_random_state
+from umap.umap_ import nearest_neighbors
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.clustering import ClusteringService
+from app.services.quantization import to_float32
+
+N_NEIGHBORS = 15  # UMAP : la page elle-même et ses 14 voisins
+BLOCK_ROWS = 65_536
+
+
+def synthetic_vectors(n: int, dims: int, n_topics: int = 200) -> np.ndarray:
+    """Thèmes et bruit au spectre décroissant, comme des embeddings réels : quelques dizaines de
+    directions portent l'essentiel de la variance"""
+    rng = np.random.default_rng(42)
+    topics = rng.standard_normal((n_topics, dims)).astype(np.float32)
+    scales = (0.6 / np.sqrt(np.arange(1, dims + 1) / 8)).astype(np.float32)
+    labels = rng.integers(0, n_topics, n)
+    vectors = np.empty((n, dims), dtype=np.float32)
+    for start in range(0, n, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, n)
+        block = topics[labels[start:stop]] * 0.3 + rng.standard_normal((stop - start, dims)).astype(np.float32) * scales
+        vectors[start:stop] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, metric) -> np.ndarray:
+    """Voisins exacts des lignes queries, la page elle-même exclue"""
+    _, indices = faiss.knn(np.ascontiguousarray(vectors[queries]), np.ascontiguousarray(vectors), N_NEIGHBORS, metric=metric)
+    return indices[:, 1:]
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def nndescent(vectors: np.ndarray, metric: str):
+    start = time.perf_counter()
+    indices, _, _ = nearest_neighbors(vectors, N_NEIGHBORS, metric, {}, False, check_random_state(42), n_jobs=1)
+    return indices, time.perf_counter() - start
+
+
+def run(clustering: ClusteringService, vectors: np.ndarray, pca_dimensions, sample_size: int):
+    n = len(vectors)
+    queries = np.sort(np.random.default_rng(0).choice(n, min(sample_size, n), replace=False))
+    truth = exact_neighbors(vectors, queries, faiss.METRIC_INNER_PRODUCT)
+
+    indices, seconds = nndescent(vectors, "cosine")
+    print(f"\n📦 {n} pages x {vectors.shape[1]} dims")
+    print(f"  {'vecteurs':<12} {'PCA':>6} {'variance':>9} {'voisins':>8} {'total':>8} {'recall PCA':>11} {'recall kNN':>11}")
+    print(f"  {'bruts':<12} {'-':>6} {'-':>9} {seconds:>7.1f}s {seconds:>7.1f}s {1.0:>11.4f} {recall(indices[queries, 1:], truth):>11.4f}")
+    raw_seconds = seconds
+
+    for dimensions in pca_dimensions:
+        reduced, info = clustering.pre_reduce(vectors, dimensions)
+        pca_truth = exact_neighbors(reduced, queries, faiss.METRIC_L2)
+        indices, seconds = nndescent(reduced, "euclidean")
+        total = info["seconds"] + seconds
+        print(f"  {'PCA':<12} {dimensions:>6} {info['explained_variance']:>9.1%} {seconds:>7.1f}s {total:>7.1f}s "
+              f"{recall(pca_truth, truth):>11.4f} {recall(indices[queries, 1:], truth):>11.4f}  (x{raw_seconds / total:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--project", help="Projet dont les embeddings servent de données")
+    parser.add_argument("--sizes", default="10000,100000,500000", help="Nombres de pages synthétiques")
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--pca", default="64,128", help="Dimensions après PCA")
+    parser.add_argument("--sample", type=int, default=1000, help="Pages dont le recall est mesuré")
+    args = parser.parse_args()
+
+    clustering = ClusteringService()
+    pca_dimensions = [int(d) for d in args.pca.split(",")]
+
+    # Premier appel : compilation numba, hors mesure
+    nndescent(synthetic_vectors(2000, 32), "cosine")
+    nndescent(synthetic_vectors(2000, 32), "euclidean")
+
+    if args.project:
+        from app.services.embeddings import EmbeddingsService
+        vectors = to_float32(EmbeddingsService().load_embeddings(args.project)["vectors_array"])
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        run(clustering, vectors, pca_dimensions, args.sample)
+        return
+
+    for n in (int(size) for size in args.sizes.split(",")):
+        run(clustering, synthetic_vectors(n, args.dims), pca_dimensions, args.sample)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Rapport float16 / int8 vs float32 : mémoire, recall@k des voisins et recouvrement des anomalies.
+
+Usage :
+  python benchmarks/bench_quantization.py                  # données synthétiques
+  python benchmarks/bench_quantization.py --project <id>   # embeddings float32 d'un projet
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.index import VectorIndexService
+from app.services.quantization import open_vectors, quantize_file, to_float32
+from app.services.scoring import ScoringService
+
+
+def synthetic_vectors(n: int, dims: int, n_topics: int = 200) -> np.ndarray:
+    """Pages regroupées par thème : beaucoup de paires autour du seuil de similarité"""
+    rng = np.random.default_rng(42)
+    topics = rng.standard_normal((n_topics, dims)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + rng.standard_normal((n, dims)).astype(np.float32) * 0.6
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def anomaly_keys(scoring: ScoringService, vectors, node_ids, urls, neighbors, graph):
+    anomalies = scoring.find_proximity_anomalies(vectors, node_ids, urls, neighbors, graph)
+    return [(a["node_i"], a["node_j"]) for a in anomalies]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--project", help="Projet dont les embeddings sont en float32")
+    parser.add_argument("--n", type=int, default=20_000)
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--top", type=int, default=100, help="Taille du top des anomalies comparé")
+    args = parser.parse_args()
+
+    index_service = VectorIndexService()
+    scoring = ScoringService()
+    k = index_service.k
+
+    if args.project:
+        from app.services.embeddings import EmbeddingsService
+        data = EmbeddingsService().load_embeddings(args.project)
+        reference = to_float32(data["vectors_array"])
+        node_ids, urls = data["node_ids"], data["urls"]
+        graph = scoring.build_link_graph(args.project)
+    else:
+        reference = synthetic_vectors(args.n, args.dims)
+        node_ids = [f"node-{i}" for i in range(len(reference))]
+        urls = [f"https://example.com/page-{i}" for i in range(len(reference))]
+        graph = None
+
+    print(f"📐 {reference.shape[0]} vecteurs x {reference.shape[1]} dims, k={k}, seuil={scoring.sim_threshold}")
+
+    exact_index = index_service.build_index(reference)
+    _, exact_indices = index_service.search_similar(exact_index, reference)
+    exact_neighbors = index_service.find_semantic_neighbors(reference, node_ids)
+    exact_anomalies = anomaly_keys(scoring, reference, node_ids, urls, exact_neighbors, graph)
+
+    print(f"{'mode':<8} {'Mo':>8} {'recall@k':>9} {'paires':>8} {'anomalies':>10} {'jaccard':>8} {'top':>6} {'temps':>7}")
+    print(f"{'float32':<8} {reference.nbytes / 1e6:>8.1f} {1.0:>9.4f} {len(exact_neighbors):>8} {len(exact_anomalies):>10} {1.0:>8.3f} {1.0:>6.2f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = Path(tmp) / "float32.npy"
+        np.save(source_path, reference)
+
+        for mode in ("float16", "int8"):
+            target_path = Path(tmp) / f"{mode}.npy"
+            scale_path = Path(tmp) / f"{mode}_scale.npy"
+            quantize_file(source_path, target_path, scale_path, mode)
+            vectors = open_vectors(target_path, scale_path)
+
+            start = time.perf_counter()
+            index = index_service.build_index(vectors)
+            _, indices = index_service.search_similar(index, vectors)
+            neighbors = index_service.find_semantic_neighbors(vectors, node_ids)
+            elapsed = time.perf_counter() - start
+
+            # recall@k : voisins exacts (hors soi-même) retrouvés par l'index quantifié
+            hits = [
+                len(set(exact_indices[i, 1:]) & set(indices[i, 1:]))
+                for i in range(len(reference))
+            ]
+            recall = float(np.sum(hits)) / (len(reference) * k)
+
+            anomalies = anomaly_keys(scoring, vectors, node_ids, urls, neighbors, graph)
+            exact_set, quantized_set = set(exact_anomalies), set(anomalies)
+            union = exact_set | quantized_set
+            jaccard = len(exact_set & quantized_set) / len(union) if union else 1.0
+            top = args.top
+            top_overlap = len(set(exact_anomalies[:top]) & set(anomalies[:top])) / max(1, min(top, len(exact_anomalies)))
+
+            print(f"{mode:<8} {vectors.nbytes / 1e6:>8.1f} {recall:>9.4f} {len(neighbors):>8} {len(anomalies):>10} {jaccard:>8.3f} {top_overlap:>6.2f} {elapsed:>6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Effet de la duplication des requêtes lentes sur la durée d'un job d'embeddings.
+
+Lance le faux service d'embeddings en local (stragglers et erreurs configurables), puis
+embedde les mêmes pages avec et sans duplication.
+
+Usage : python benchmarks/bench_tail_latency.py [nb_pages] [part_de_stragglers]
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("EMBEDDING_CACHE", "false")
+os.environ.setdefault("EMBED_HEDGE_MIN_SECONDS", "0.2")
+os.environ.setdefault("EMBED_BACKOFF_SECONDS", "0.1")
+
+import uvicorn
+
+from benchmarks.fake_embedding_server import FakeServerConfig, create_app
+from app.services.embeddings import EmbeddingsService
+
+
+def start_server(config: FakeServerConfig) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    straggler_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    config = FakeServerConfig(dims=256, median=0.05, sigma=0.3, straggler_rate=straggler_rate,
+                              straggler_seconds=5.0, error_rate=0.01)
+    print(f"🧪 {n_pages} pages, stragglers {straggler_rate:.0%} ({config.straggler_seconds}s), erreurs 500 {config.error_rate:.0%}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        project_dir = Path(tmp) / "bench"
+        project_dir.mkdir()
+        pd.DataFrame({
+            "node_id": [f"node-{i}" for i in range(n_pages)],
+            "url": [f"https://example.com/page-{i}" for i in range(n_pages)],
+            "contenu": [f"Contenu de la page {i} " * 20 for i in range(n_pages)],
+        }).to_csv(project_dir / "pages.csv", index=False)
+
+        for hedge in (False, True):
+            # Un serveur par passe, même graine : mêmes tirages de latence pour les deux modes
+            service = EmbeddingsService()
+            service.endpoint = start_server(config)
+            service.data_dir = Path(tmp)
+            service.hedge = hedge
+            service.batch_chars = 10_000
+
+            start = time.perf_counter()
+            result = asyncio.run(service.embed_pages("bench"))
+            elapsed = time.perf_counter() - start
+
+            latency = result["latency"]
+            print(f"\nDuplication {'activée' if hedge else 'désactivée'} : {elapsed:.1f}s, "
+                  f"p95 batch {result['batch_timings']['p95_seconds']}s, max {result['batch_timings']['max_seconds']}s")
+            print(f"  dupliquées {latency['hedges']} (gagnantes {latency['hedge_wins']}), reprises {latency['retries']}, "
+                  f"délai {latency['deadline_seconds']}s")
+            print("  " + " ".join(f"≤{b['le']}:{b['count']}" for b in latency["histogram"] if b["count"]))
+
+
+if __name__ == "__main__":
+    main()
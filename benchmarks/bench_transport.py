@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Décodage d'une réponse /v1/embeddings selon le format de transport : JSON, base64, float32 brut.
+
+Mesure, par batch, la taille du corps, le temps de décodage et le pic d'allocations Python.
+
+Usage : python benchmarks/bench_transport.py [nb_textes] [dimensions]
+"""
+import base64
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.embeddings import RAW_CONTENT_TYPE, decode_embeddings
+
+
+def response_bodies(vectors: np.ndarray):
+    little_endian = vectors.astype("<f4")
+    as_json = json.dumps({"data": [{"index": i, "embedding": v} for i, v in enumerate(little_endian.tolist())]})
+    as_base64 = json.dumps({"data": [
+        {"index": i, "embedding": base64.b64encode(v.tobytes()).decode("ascii")} for i, v in enumerate(little_endian)
+    ]})
+    return {
+        "json": (as_json.encode(), "application/json"),
+        "base64": (as_base64.encode(), "application/json"),
+        "raw": (little_endian.tobytes(), RAW_CONTENT_TYPE),
+    }
+
+
+def main():
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    dims = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    repeats = 20
+
+    vectors = np.random.default_rng(0).standard_normal((n_items, dims)).astype(np.float32)
+    print(f"📦 Batch de {n_items} x {dims} floats ({vectors.nbytes / 1e6:.1f} Mo en float32)")
+    print(f"{'format':<8} {'corps (Mo)':>11} {'décodage (ms)':>14} {'pic alloc (Mo)':>15}")
+
+    for name, (body, content_type) in response_bodies(vectors).items():
+        decoded, _ = decode_embeddings(body, content_type, n_items)
+        assert np.array_equal(decoded, vectors)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            decode_embeddings(body, content_type, n_items)
+        elapsed = (time.perf_counter() - start) / repeats
+
+        tracemalloc.start()
+        decode_embeddings(body, content_type, n_items)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{name:<8} {len(body) / 1e6:>11.2f} {elapsed * 1000:>14.3f} {peak / 1e6:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Graphe flou de UMAP : voisins NNDescent contre voisins FAISS déjà calculés par l'index.
+
+Sur un site synthétique, construit le graphe des KNN_K voisins avec l'index exact (étape 2 du
+pipeline), puis la projection 2D de UMAP de deux façons : recherche NNDescent propre à UMAP,
+ou voisins FAISS passés tout faits. Compare les durées et la trustworthiness des deux projections
+(calculée sur un échantillon de pages).
+
+Usage : python benchmarks/bench_umap_knn.py [nb_pages] [taille_échantillon]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.manifold import trustworthiness
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ["INDEX_TYPE"] = "flat"
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+
+from app.services.clustering import ClusteringService
+from app.services.index import VectorIndexService
+
+
+def synthetic_vectors(rng, n: int, dims: int) -> np.ndarray:
+    centers = rng.standard_normal((max(1, n // 100), dims))
+    spread = rng.uniform(0.1, 0.8, (n, 1))
+    vectors = centers[rng.integers(0, len(centers), n)] + spread * rng.standard_normal((n, dims))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def project(clustering: ClusteringService, vectors: np.ndarray, knn_graph=None):
+    start = time.perf_counter()
+    graph, n_neighbors = clustering.build_fuzzy_graph(vectors, knn_graph=knn_graph)
+    graph_seconds = time.perf_counter() - start
+    projection = clustering.embed_fuzzy_graph(vectors, graph, 2)
+    return projection, graph_seconds, time.perf_counter() - start, n_neighbors
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    sample_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(rng, n_pages, 384)
+
+    index_service = VectorIndexService()
+    clustering = ClusteringService()
+
+    start = time.perf_counter()
+    index = index_service.build_index(vectors)
+    knn_graph = index_service.build_neighbor_graph(index, vectors)
+    index_seconds = time.perf_counter() - start
+
+    # Premier appel : compilation numba, hors mesure
+    project(clustering, vectors[:500])
+
+    results = {
+        "NNDescent": project(clustering, vectors),
+        "FAISS": project(clustering, vectors, knn_graph),
+    }
+
+    sample = np.sort(rng.choice(n_pages, min(sample_size, n_pages), replace=False))
+    print(f"\n📦 {n_pages} pages, graphe FAISS (k={knn_graph.k}) calculé par l'étape 2 en {index_seconds:.1f}s")
+    for name, (projection, graph_seconds, seconds, n_neighbors) in results.items():
+        trust = trustworthiness(vectors[sample], projection[sample], n_neighbors=10, metric="cosine")
+        print(f"  {name:<10} graphe flou {graph_seconds:6.1f}s  projection 2D {seconds:6.1f}s  "
+              f"({n_neighbors} voisins)  trustworthiness {trust:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Vérifie contre le faux service d'embeddings que les batches lents sont dupliqués puis abandonnés.
+
+1. Requête très lente au démarrage, avant toute latence observée : le batch doit être dupliqué
+   après EMBED_HEDGE_INITIAL_SECONDS et la copie l'emporter, sans attendre la requête lente.
+2. Toutes les requêtes bloquées : le batch doit échouer en erreur transitoire après le délai de
+   requête (duplication comprise), et non attendre la réponse.
+
+Usage : python benchmarks/check_hedging.py (se termine par ✅, code de sortie 1 sinon)
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ["EMBEDDING_CACHE"] = "false"
+os.environ["EMBED_HEDGE_INITIAL_SECONDS"] = "0.3"
+os.environ["EMBED_HEDGE_MIN_SECONDS"] = "0.1"
+
+from benchmarks.bench_tail_latency import start_server
+from benchmarks.fake_embedding_server import FakeServerConfig
+from app.services.embeddings import EmbeddingsService, EmbeddingTransientError
+
+STRAGGLER_SECONDS = 5.0
+
+
+def embed(tmp: str, config: FakeServerConfig, request_timeout: float, retries: int):
+    service = EmbeddingsService()
+    service.endpoint = start_server(config)
+    service.data_dir = Path(tmp)
+    service.batch_size = 20
+    service.request_timeout = request_timeout
+    service.retries = retries
+    return asyncio.run(service.embed_pages("check"))
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        project_dir = Path(tmp) / "check"
+        project_dir.mkdir()
+        pd.DataFrame({
+            "node_id": [f"node-{i}" for i in range(40)],
+            "url": [f"https://example.com/page-{i}" for i in range(40)],
+            "contenu": [f"Contenu de la page {i}" for i in range(40)],
+        }).to_csv(project_dir / "pages.csv", index=False)
+
+        # 1. Premier batch très lent, aucune latence encore observée
+        config = FakeServerConfig(dims=32, median=0.02, sigma=0.1, straggler_first=1, straggler_seconds=STRAGGLER_SECONDS)
+        start = time.perf_counter()
+        latency = embed(tmp, config, request_timeout=60.0, retries=3)["latency"]
+        elapsed = time.perf_counter() - start
+        print(f"1. démarrage lent : {elapsed:.2f}s, {latency['hedges']} dupliquée(s), {latency['hedge_wins']} gagnante(s)")
+        if latency["hedges"] < 1 or latency["hedge_wins"] < 1 or elapsed >= STRAGGLER_SECONDS:
+            failures.append("le batch lent du démarrage n'a pas été dupliqué")
+
+        # 2. Requête et copie bloquées : abandon après le délai de requête
+        config = FakeServerConfig(dims=32, median=0.02, sigma=0.1, straggler_rate=1.0, straggler_seconds=STRAGGLER_SECONDS)
+        start = time.perf_counter()
+        try:
+            embed(tmp, config, request_timeout=1.0, retries=1)
+            failures.append("un batch sans réponse a été accepté")
+        except EmbeddingTransientError as e:
+            elapsed = time.perf_counter() - start
+            print(f"2. service bloqué : abandon en {elapsed:.2f}s ({e})")
+            if elapsed >= STRAGGLER_SECONDS:
+                failures.append("le batch bloqué a attendu la réponse au lieu d'être abandonné")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Batches lents dupliqués, batches bloqués abandonnés")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Faux service d'embeddings (format /v1/embeddings) à latence configurable.
+
+Vecteurs déterministes (dérivés du hash du texte), latence tirée d'une loi log-normale,
+avec une part de requêtes très lentes (stragglers) et d'erreurs 503/500. Répond en
+float32 brut (Accept: application/octet-stream), en base64 (encoding_format) ou en JSON,
+selon --encodings.
+
+Usage :
+  python benchmarks/fake_embedding_server.py --port 8100 --median 0.2 --straggler-rate 0.05
+  EMBEDDINGS_ENDPOINT=http://127.0.0.1:8100 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+from dataclasses import dataclass
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+@dataclass
+class FakeServerConfig:
+    dims: int = 1024
+    median: float = 0.2  # Latence médiane (s)
+    sigma: float = 0.5  # Dispersion de la loi log-normale
+    per_item: float = 0.0  # Latence ajoutée par texte (s)
+    straggler_rate: float = 0.0  # Part des requêtes très lentes
+    straggler_seconds: float = 30.0
+    straggler_first: int = 0  # Les N premières requêtes sont très lentes (démarrage d'un job)
+    busy_rate: float = 0.0  # Part des réponses 503
+    error_rate: float = 0.0  # Part des réponses 500
+    encodings: str = "raw,base64,json"  # Formats acceptés ; sans base64, encoding_format est refusé (400)
+    seed: int = 0
+
+
+def fake_vector(text: str, dims: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dims).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def create_app(config: FakeServerConfig) -> FastAPI:
+    app = FastAPI(title="Faux service d'embeddings")
+    rng = random.Random(config.seed)
+    encodings = set(config.encodings.split(","))
+    app.state.stats = {"requests": 0, "stragglers": 0, "busy": 0, "errors": 0}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        payload = await request.json()
+        inputs = payload.get("input", [])
+        stats = app.state.stats
+        stats["requests"] += 1
+
+        encoding_format = payload.get("encoding_format", "float")
+        if encoding_format == "base64" and "base64" not in encodings:
+            return JSONResponse({"error": "encoding_format non supporté"}, status_code=400)
+
+        draw = rng.random()
+        if draw < config.busy_rate:
+            stats["busy"] += 1
+            return JSONResponse({"error": "busy"}, status_code=503, headers={"Retry-After": "1"})
+        if draw < config.busy_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "internal"}, status_code=500)
+
+        latency = config.median * rng.lognormvariate(0, config.sigma) + config.per_item * len(inputs)
+        if rng.random() < config.straggler_rate or stats["requests"] <= config.straggler_first:
+            stats["stragglers"] += 1
+            latency = config.straggler_seconds
+        await asyncio.sleep(latency)
+
+        vectors = np.stack([fake_vector(item["value"], config.dims) for item in inputs]).astype("<f4")
+        if "raw" in encodings and "application/octet-stream" in request.headers.get("accept", ""):
+            return Response(vectors.tobytes(), media_type="application/octet-stream")
+        if encoding_format == "base64":
+            embeddings = [base64.b64encode(vector.tobytes()).decode("ascii") for vector in vectors]
+        else:
+            embeddings = vectors.tolist()
+
+        return {
+            "data": [{"index": i, "embedding": embedding} for i, embedding in enumerate(embeddings)],
+            "model": payload.get("model")
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    for name, default in vars(FakeServerConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+
+    host, port = args.pop("host"), args.pop("port")
+    uvicorn.run(create_app(FakeServerConfig(**args)), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
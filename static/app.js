@@ -237,56 +237,80 @@ class CartographyApp {
         
         console.log(`📁 Upload par chunks: ${file.name} (${file.size} bytes)`);
         
-        const text = await file.text();
-        const lines = text.split('\n');
-        const header = lines[0];
-        const dataLines = lines.slice(1).filter(line => line.trim());
+        // Le serveur préalloue le fichier et fixe le découpage (reprise si upload identique en cours)
+        const initData = new FormData();
+        initData.append('file_type', fileType);
+        initData.append('file_size', file.size.toString());
         
-        const chunkSize = 1000; // 1000 lignes par chunk
-        const totalChunks = Math.ceil(dataLines.length / chunkSize);
+        const initResponse = await fetch(`${this.apiBase}/projects/${this.currentProject}/import-chunk/init`, {
+            method: 'POST',
+            body: initData
+        });
         
-        console.log(`📦 ${dataLines.length} lignes à uploader en ${totalChunks} chunks`);
+        if (!initResponse.ok) {
+            throw new Error(`Impossible d'initialiser l'upload ${fileType}`);
+        }
         
-        for (let i = 0; i < totalChunks; i++) {
-            const start = i * chunkSize;
-            const end = Math.min(start + chunkSize, dataLines.length);
-            const chunkLines = dataLines.slice(start, end);
-            
-            // Reconstituer le CSV avec header
-            const chunkCsv = header + '\n' + chunkLines.join('\n');
-            const chunkBlob = new Blob([chunkCsv], { type: 'text/csv' });
-            
-            const formData = new FormData();
-            formData.append('chunk_data', chunkBlob, `${fileType}_chunk_${i}.csv`);
-            formData.append('file_type', fileType);
-            formData.append('chunk_index', i.toString());
-            formData.append('total_chunks', totalChunks.toString());
-            formData.append('is_first_chunk', (i === 0).toString());
-            formData.append('is_last_chunk', (i === totalChunks - 1).toString());
-            
-            const response = await fetch(`${this.apiBase}/projects/${this.currentProject}/import-chunk`, {
-                method: 'POST',
-                body: formData
-            });
-            
-            if (!response.ok) {
-                throw new Error(`Erreur upload chunk ${i + 1}/${totalChunks}`);
+        const upload = await initResponse.json();
+        const chunkSize = upload.chunk_size;
+        const totalChunks = upload.total_chunks;
+        const pending = [...upload.missing_chunks];
+        let uploaded = totalChunks - pending.length;
+        
+        console.log(`📦 ${file.size} octets en ${totalChunks} chunks, ${pending.length} à envoyer`);
+        
+        const sendChunk = async (index) => {
+            // Découpage par octets : aucune lecture/réécriture du texte côté client
+            const blob = file.slice(index * chunkSize, Math.min((index + 1) * chunkSize, file.size));
+            // crypto.subtle n'existe qu'en HTTPS ou sur localhost : sans lui, chunk envoyé sans checksum
+            let checksum = null;
+            if (window.crypto && crypto.subtle) {
+                const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+                checksum = Array.from(new Uint8Array(digest))
+                    .map(b => b.toString(16).padStart(2, '0')).join('');
             }
             
-            // Mise à jour du progrès
-            const progress = Math.round((i + 1) / totalChunks * progressStep);
-            this.updateProgress({ 
-                status: `Upload ${fileType}: ${i + 1}/${totalChunks} chunks`, 
-                progress_percentage: progress,
-                step: 1,
-                total_steps: 4,
-                step_name: `Upload ${fileType}`
-            });
-            
-            console.log(`✅ Chunk ${i + 1}/${totalChunks} uploadé`);
-        }
+            for (let attempt = 1; attempt <= 3; attempt++) {
+                const formData = new FormData();
+                formData.append('chunk_data', blob, `${fileType}_chunk_${index}`);
+                formData.append('file_type', fileType);
+                formData.append('chunk_index', index.toString());
+                if (checksum) formData.append('checksum', checksum);
+                
+                try {
+                    const response = await fetch(`${this.apiBase}/projects/${this.currentProject}/import-chunk`, {
+                        method: 'POST',
+                        body: formData
+                    });
+                    if (response.ok) return;
+                } catch (error) {
+                    console.warn(`⚠️ Chunk ${index + 1}/${totalChunks}, tentative ${attempt}: ${error}`);
+                }
+            }
+            throw new Error(`Erreur upload chunk ${index + 1}/${totalChunks}`);
+        };
+        
+        // Plusieurs chunks en vol simultanément
+        const worker = async () => {
+            while (pending.length) {
+                const index = pending.shift();
+                await sendChunk(index);
+                uploaded++;
+                
+                // Mise à jour du progrès
+                const progress = Math.round(uploaded / totalChunks * progressStep);
+                this.updateProgress({ 
+                    status: `Upload ${fileType}: ${uploaded}/${totalChunks} chunks`, 
+                    progress_percentage: progress,
+                    step: 1,
+                    total_steps: 4,
+                    step_name: `Upload ${fileType}`
+                });
+            }
+        };
+        await Promise.all(Array.from({ length: 4 }, worker));
         
-        console.log(`🎉 Upload ${fileType} terminé: ${dataLines.length} lignes`);
+        console.log(`🎉 Upload ${fileType} terminé: ${file.size} octets`);
     }
     
     async startSimpleAnalysis() {
@@ -784,12 +808,12 @@ class CartographyApp {
         const proximities = this.results.proximities || [];
         
         // Créer les données CSV
-        let csvContent = "Score_Anomalie,Similarite_Semantique,Distance_Liens,URL_Page_1,URL_Page_2,Node_ID_1,Node_ID_2\n";
+        let csvContent = "Score_Anomalie,Similarite_Semantique,Distance_Liens,Distance_1_vers_2,Distance_2_vers_1,URL_Page_1,URL_Page_2,Node_ID_1,Node_ID_2\n";
         
         proximities
             .sort((a, b) => b.anomaly_score - a.anomaly_score)
             .forEach(prox => {
-                csvContent += `${prox.anomaly_score.toFixed(3)},${prox.cosine.toFixed(3)},${prox.hops},"${prox.url_i}","${prox.url_j}","${prox.node_i}","${prox.node_j}"\n`;
+                csvContent += `${prox.anomaly_score.toFixed(3)},${prox.cosine.toFixed(3)},${prox.hops ?? ''},${prox.hops_ij ?? ''},${prox.hops_ji ?? ''},"${prox.url_i}","${prox.url_j}","${prox.node_i}","${prox.node_j}"\n`;
             });
         
         // Créer et télécharger le fichier